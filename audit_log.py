@@ -0,0 +1,169 @@
+"""
+Write-behind queue for the bot audit trail (bot_user_actions / bot_admin_actions).
+
+Every bot interaction logs an action. Writing each one in its own
+transaction costs a commit (and WAL sync) per tap. AuditLogWriter instead
+buffers records in memory and a background thread inserts them with
+executemany, one transaction per batch, every ``flush_interval`` seconds or
+as soon as ``batch_size`` records are waiting.
+
+The buffer is bounded: once ``max_queued`` records are pending, new ones
+are dropped and counted rather than growing memory. ``flush()`` blocks until
+everything queued so far is committed (used before audit reads and on
+shutdown).
+"""
+
+import threading
+import time
+import logging
+from collections import deque
+from typing import Any, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+AUDIT_TABLES = {
+    "bot_user_actions": ("user_id", "name", "username", "action", "details", "created_at"),
+    "bot_admin_actions": ("admin_id", "action", "target_user_id", "details", "created_at"),
+}
+
+
+def insert_sql(table: str) -> str:
+    columns = AUDIT_TABLES[table]
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+
+class AuditLogWriter:
+    """Bounded in-memory audit queue drained by one background writer thread."""
+
+    def __init__(self, pool, flush_interval: float = 0.25, batch_size: int = 500, max_queued: int = 10000):
+        self.pool = pool
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_queued = max_queued
+
+        self._cond = threading.Condition()
+        # (sequence, enqueued_at, table, row)
+        self._queue: "deque[Tuple[int, float, str, Tuple]]" = deque()
+        self._enqueued_seq = 0
+        self._committed_seq = 0
+        self._thread = None
+        self._stopping = False
+        self._stats = {
+            "enqueued": 0,
+            "written": 0,
+            "dropped": 0,
+            "batches": 0,
+            "failed_batches": 0,
+            "max_lag_ms": 0.0,
+            "last_lag_ms": 0.0,
+        }
+
+    # --- PRODUCERS ---
+    def enqueue(self, table: str, row: Tuple) -> bool:
+        """Queue one record; False if it was dropped because the queue is full."""
+        with self._cond:
+            if len(self._queue) >= self.max_queued:
+                self._stats["dropped"] += 1
+                return False
+            self._enqueued_seq += 1
+            self._queue.append((self._enqueued_seq, time.monotonic(), table, row))
+            self._stats["enqueued"] += 1
+            if self._thread is None:
+                self._start()
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every record queued before this call is committed."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            target = self._enqueued_seq
+            if self._thread is None:
+                return self._committed_seq >= target
+            self._cond.notify_all()
+            while self._committed_seq < target:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._thread.is_alive():
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 10.0):
+        """Flush what is queued and stop the writer thread."""
+        with self._cond:
+            if self._thread is None:
+                return
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        with self._cond:
+            self._thread = None
+            self._stopping = False
+            if self._queue:
+                logger.error(f"Audit log closed with {len(self._queue)} unwritten records")
+
+    # --- WRITER ---
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._queue and not self._stopping:
+                    self._cond.wait(self.flush_interval)
+                if self._queue and len(self._queue) < self.batch_size and not self._stopping:
+                    # Let a partial batch fill up for at most flush_interval
+                    oldest = self._queue[0][1]
+                    wait = self.flush_interval - (time.monotonic() - oldest)
+                    if wait > 0:
+                        self._cond.wait(wait)
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                if not batch and self._stopping:
+                    return
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        by_table: Dict[str, list] = {}
+        for _, _, table, row in batch:
+            by_table.setdefault(table, []).append(row)
+        try:
+            with self.pool.transaction() as conn:
+                for table, rows in by_table.items():
+                    conn.executemany(insert_sql(table), rows)
+        except Exception as e:
+            logger.error(f"Audit log batch of {len(batch)} failed, requeueing: {e}")
+            with self._cond:
+                self._stats["failed_batches"] += 1
+                # Put the batch back in order; anything over capacity is lost
+                self._queue.extendleft(reversed(batch))
+                while len(self._queue) > self.max_queued:
+                    self._queue.pop()
+                    self._stats["dropped"] += 1
+            time.sleep(self.flush_interval)
+            return
+        finally:
+            self.pool.release()
+
+        now = time.monotonic()
+        lag_ms = (now - batch[0][1]) * 1000
+        with self._cond:
+            self._committed_seq = max(self._committed_seq, batch[-1][0])
+            self._stats["written"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["last_lag_ms"] = round(lag_ms, 1)
+            self._stats["max_lag_ms"] = round(max(self._stats["max_lag_ms"], lag_ms), 1)
+            self._cond.notify_all()
+
+    # --- STATS ---
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of queue counters, including the current backlog and its age."""
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot["queued"] = len(self._queue)
+            oldest = self._queue[0][1] if self._queue else None
+        snapshot["oldest_queued_ms"] = round((time.monotonic() - oldest) * 1000, 1) if oldest else 0.0
+        snapshot["rows_per_batch"] = round(snapshot["written"] / snapshot["batches"], 1) if snapshot["batches"] else 0.0
+        return snapshot
@@ -0,0 +1,150 @@
+"""
+Before/after benchmark for the paginated brain endpoints.
+
+Builds a large synthetic islamic_library.db (schema from db_migrations) and
+times the SQL each endpoint runs per request:
+    before: separate COUNT query + LIMIT/OFFSET page query
+    after:  one statement carrying the total as a COUNT(*) OVER () window
+            column, or as a once-evaluated COUNT subquery for plain tables
+
+Usage:
+    python benchmarks/bench_pagination.py [--books 50000] [--transactions 500000]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from db_migrations import run_migrations  # noqa: E402
+
+WORDS = ["history", "science", "quran", "fiqh", "hadith", "poetry", "math", "arabic",
+         "grammar", "tafsir", "stories", "biology", "physics", "ethics", "logic", "geography"]
+
+
+def build_db(path, books, members, transactions, users):
+    conn = sqlite3.connect(path)
+    run_migrations(conn)
+    rnd = random.Random(42)
+    conn.executemany(
+        "INSERT INTO books (id, title, author, category, available_copies) VALUES (?, ?, ?, ?, ?)",
+        ((f"B{i:06d}", " ".join(rnd.choices(WORDS, k=3)).title(), f"Author {i % 997}",
+          rnd.choice(WORDS), rnd.randint(0, 3)) for i in range(books)),
+    )
+    conn.executemany(
+        "INSERT INTO members (student_id, name, batch) VALUES (?, ?, ?)",
+        ((f"{1000 + i}", f"Student {i}", f"BS{i % 5 + 1}") for i in range(members)),
+    )
+    start = datetime(2020, 1, 1)
+    conn.executemany(
+        "INSERT INTO transactions (book_id, member_id, issue_date, due_date, return_date, status) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        _transactions(rnd, start, books, members, transactions),
+    )
+    conn.executemany(
+        "INSERT INTO bot_users (chat_id, name, username, joined_at, last_active) VALUES (?, ?, ?, ?, ?)",
+        ((100000 + i, f"User {i}", f"user{i}", (start + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S"),
+          None) for i in range(users)),
+    )
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def _transactions(rnd, start, books, members, count):
+    for i in range(count):
+        issued = start + timedelta(minutes=i * 3)
+        returned = rnd.random() < 0.9
+        yield (
+            f"B{int(rnd.paretovariate(1.2)) % books:06d}",
+            f"{1000 + rnd.randrange(members)}",
+            issued.strftime("%Y-%m-%d %H:%M:%S"),
+            (issued + timedelta(days=14)).strftime("%Y-%m-%d"),
+            (issued + timedelta(days=rnd.randint(1, 20))).strftime("%Y-%m-%d %H:%M:%S") if returned else None,
+            "returned" if returned else "issued",
+        )
+
+
+# (name, base query, params, order_by, page_size, count_query)
+CASES = [
+    ("search_book", """
+        SELECT b.id, b.title, b.author, b.category, b.available_copies, -1e9 AS score
+        FROM books b WHERE b.id = ?
+        UNION ALL
+        SELECT b.id, b.title, b.author, b.category, b.available_copies, f.rank AS score
+        FROM books_fts f JOIN books b ON b.rowid = f.rowid
+        WHERE books_fts MATCH ? AND b.id <> ?
+     """, ("HISTORY", '"history"*', "HISTORY"), "score, id", 5, None),
+    ("analytics_most_issued", """
+        SELECT b.id, b.title, COUNT(t.book_id) as issue_count
+        FROM transactions t JOIN books b ON t.book_id = b.id
+        GROUP BY t.book_id
+     """, (), "issue_count DESC", 10, None),
+    ("analytics_top_readers", """
+        SELECT m.name, COUNT(t.member_id) as issue_count
+        FROM transactions t JOIN members m ON t.member_id = m.student_id
+        GROUP BY t.member_id
+     """, (), "issue_count DESC", 10, None),
+    ("get_bot_users", "SELECT name, chat_id, role, joined_at FROM bot_users", (), "joined_at DESC", 5,
+     "SELECT COUNT(*) FROM bot_users"),
+]
+
+
+def before(conn, query, params, order_by, page, page_size, count_query):
+    total = conn.execute(f"SELECT COUNT(*) FROM ({query})", params).fetchone()[0]
+    rows = conn.execute(f"SELECT * FROM ({query}) ORDER BY {order_by} LIMIT ? OFFSET ?",
+                        (*params, page_size, (page - 1) * page_size)).fetchall()
+    return rows, total
+
+
+def after(conn, query, params, order_by, page, page_size, count_query):
+    total_expr = f"({count_query})" if count_query else "COUNT(*) OVER ()"
+    rows = conn.execute(f"SELECT *, {total_expr} FROM ({query}) ORDER BY {order_by} LIMIT ? OFFSET ?",
+                        (*params, page_size, (page - 1) * page_size)).fetchall()
+    return [r[:-1] for r in rows], rows[0][-1] if rows else 0
+
+
+def timed(fn, repeat, *args):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(*args)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=50000)
+    parser.add_argument("--members", type=int, default=5000)
+    parser.add_argument("--transactions", type=int, default=500000)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=15)
+    parser.add_argument("--db", help="Reuse/create the synthetic DB at this path")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench_library.db")
+    if not os.path.exists(path):
+        print(f"Building synthetic DB at {path} ...")
+        build_db(path, args.books, args.members, args.transactions, args.users)
+
+    conn = sqlite3.connect(path)
+    print(f"{'endpoint':<24}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for name, query, params, order_by, page_size, count_query in CASES:
+        page = 3
+        case = (conn, query, params, order_by, page, page_size, count_query)
+        t_before, r_before = timed(before, args.repeat, *case)
+        t_after, r_after = timed(after, args.repeat, *case)
+        assert r_before[1] == r_after[1], f"{name}: totals differ"
+        print(f"{name:<24}{t_before:>12.2f}{t_after:>12.2f}{t_before / t_after:>9.2f}x")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Throughput of brain under each serving mode (start.py's BRAIN_SERVER).
+
+For every mode the backend is started with `python start.py brain` against
+the same database, then hammered by client processes issuing a mix of read
+requests over keep-alive connections for a fixed time. Reports requests/s,
+p50/p95 latency and errors per mode.
+
+Usage:
+    python benchmarks/load_test.py [--modes dev,waitress,gunicorn,uvicorn] [--duration 15]
+                                   [--clients 32] [--db path/to/islamic_library.db]
+
+Without --db a synthetic database is built (see bench_pagination.py).
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from threading import Thread
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+from bench_pagination import build_db  # noqa: E402
+
+
+def request_mix(book_ids, member_ids):
+    """A random (method, path, body) drawn from the bot's typical traffic."""
+    roll = random.random()
+    if roll < 0.35:
+        return "POST", "/book_status", {"book_id": random.choice(book_ids)}
+    if roll < 0.55:
+        return "POST", "/search_book", {"term": random.choice(["history", "fiqh", "poetry", "math"]),
+                                        "page": random.randint(1, 20)}
+    if roll < 0.75:
+        return "POST", "/student_details", {"student_id": random.choice(member_ids)}
+    if roll < 0.85:
+        return "POST", "/book_status_bulk", {"book_ids": random.sample(book_ids, 50)}
+    if roll < 0.95:
+        return "GET", "/library_stats", None
+    return "POST", "/analytics_most_issued", {"page": random.randint(1, 5)}
+
+
+def client_process(base_url, threads, duration, book_ids, member_ids, seed):
+    """Run `threads` keep-alive clients for `duration` seconds; return (latencies, errors)."""
+    latencies, errors = [], [0]
+    deadline = time.time() + duration
+
+    def client(n):
+        random.seed(seed * 1000 + n)
+        session = requests.Session()
+        while time.time() < deadline:
+            method, path, body = request_mix(book_ids, member_ids)
+            t0 = time.perf_counter()
+            try:
+                r = session.request(method, base_url + path, json=body, timeout=30)
+                ok = r.status_code == 200
+            except requests.RequestException:
+                ok = False
+            latencies.append((time.perf_counter() - t0) * 1000)
+            if not ok:
+                errors[0] += 1
+
+    workers = [Thread(target=client, args=(n,)) for n in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return latencies, errors[0]
+
+
+def wait_healthy(base_url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(base_url + "/health", timeout=2).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def run_mode(mode, workdir, port, args, book_ids, member_ids):
+    env = dict(os.environ, BRAIN_SERVER=mode, PORT=str(port), GITHUB_TOKEN="",
+               PYTHONPATH=os.path.abspath(ROOT), BRAIN_LOG_LEVEL="warning")
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, "start.py"), "brain"], cwd=workdir, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        if not wait_healthy(base_url):
+            print(f"{mode:<10} did not start")
+            return
+        per_proc = max(1, args.clients // args.procs)
+        start = time.time()
+        with ProcessPoolExecutor(args.procs) as pool:
+            futures = [pool.submit(client_process, base_url, per_proc, args.duration, book_ids, member_ids, i)
+                       for i in range(args.procs)]
+            results = [f.result() for f in futures]
+        elapsed = time.time() - start
+    finally:
+        server.terminate()
+        server.wait(timeout=40)
+
+    latencies = sorted(l for lat, _ in results for l in lat)
+    errors = sum(e for _, e in results)
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+    print(f"{mode:<10}{len(latencies) / elapsed:>10.0f}{statistics.median(latencies):>10.1f}"
+          f"{p95:>10.1f}{errors:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="dev,waitress,gunicorn,uvicorn")
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--procs", type=int, default=4, help="client processes the clients are spread over")
+    parser.add_argument("--port", type=int, default=5077)
+    parser.add_argument("--db", help="Database to serve (copied); built synthetically if omitted")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, "islamic_library.db")
+    if args.db:
+        shutil.copy2(args.db, db_path)
+    else:
+        print("Building synthetic DB ...")
+        build_db(db_path, books=20000, members=2000, transactions=200000, users=5000)
+
+    conn = sqlite3.connect(db_path)
+    book_ids = [r[0] for r in conn.execute("SELECT id FROM books ORDER BY random() LIMIT 2000")]
+    member_ids = [r[0] for r in conn.execute("SELECT student_id FROM members ORDER BY random() LIMIT 500")]
+    conn.close()
+
+    print(f"{args.clients} clients, {args.duration:.0f}s per mode")
+    print(f"{'mode':<10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+    for mode in args.modes.split(","):
+        run_mode(mode, workdir, args.port, args, book_ids, member_ids)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
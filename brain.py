@@ -1,14 +1,48 @@
 import os
+import re
+import json
 import sqlite3
 import asyncio
 import logging
+import hashlib
 from datetime import datetime
+from functools import wraps
 import time
 from typing import Set, Dict, Any, List, Tuple
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.exceptions import MethodNotAllowed, NotFound
 from flask_cors import CORS
 import base64
+import csv
+import gzip
+import io
+import zlib
+import threading
+import atexit
 import requests as _req
+from db_pool import get_pool
+from db_migrations import (run_migrations, read_counters, read_table_versions, bump_etag_epoch, ETAG_EPOCH,
+                           overdue_sql)
+from response_cache import ResponseCache
+from photo_cache import PhotoCache, PHOTO_VARIANTS, source_version
+from audit_log import AuditLogWriter, insert_sql
+from retention import archive_path_for, attach_archive, audit_source
+from db_backup import (ENCODINGS, BackupVerificationError, asset_name, available_encodings, check_database,
+                       copy_into, create_backup, database_usable, discard_partial, download_resumable,
+                       encoding_for, file_chunks, format_manifest, parse_manifest, restore_stream, snapshot,
+                       verify_file)
+from db_shipper import shipping_paused
+
+try:
+    import brotli  # optional: preferred over gzip when clients accept br
+except ImportError:
+    brotli = None
+
+try:
+    import orjson  # optional: faster JSON encode/decode
+except ImportError:
+    orjson = None
 
 # --- CONFIGURATION ---
 DB_PATH = "islamic_library.db"
@@ -16,6 +50,15 @@ IMAGES_DIR = "images"
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN", "")
 GITHUB_REPO = "Nihal-InCode/library-system"
 DB_RELEASE_TAG = "db-backup-latest"
+AUDIT_FLUSH_MS = int(os.getenv("AUDIT_FLUSH_MS", "250"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_MAX_QUEUED = int(os.getenv("AUDIT_MAX_QUEUED", "10000"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "300"))
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+BULK_STATUS_MAX_IDS = int(os.getenv("BULK_STATUS_MAX_IDS", "5000"))
+BULK_STATUS_STREAM_THRESHOLD = int(os.getenv("BULK_STATUS_STREAM_THRESHOLD", "500"))
+COMPRESSIBLE_MIMETYPES = {"application/json", "text/plain", "text/html", "text/csv", "application/x-ndjson"}
 
 # --- LOGGING ---
 logging.basicConfig(
@@ -23,45 +66,385 @@ logging.basicConfig(
     level=logging.INFO
 )
 logger = logging.getLogger(__name__)
+
+# --- DATABASE CONNECTIONS ---
+db_pool = get_pool(DB_PATH, timeout=10)
+
 def get_db_connection():
-    """Create a new SQLite connection for each request."""
-    return sqlite3.connect(DB_PATH, timeout=10)
+    """Return the pooled SQLite connection bound to the current thread."""
+    return db_pool.connection()
+
+def db_transaction():
+    """Write transaction on the pooled connection (commit/rollback handled)."""
+    return db_pool.transaction()
+
+# Bot audit trail is written behind: see audit_log.AuditLogWriter
+audit_log = AuditLogWriter(db_pool, flush_interval=AUDIT_FLUSH_MS / 1000,
+                           batch_size=AUDIT_BATCH_SIZE, max_queued=AUDIT_MAX_QUEUED)
+atexit.register(audit_log.close)
+
+def record_audit(table: str, row: Tuple):
+    """Queue an audit row, or write it in place when a transaction is open.
+
+    Inside a /batch the row must commit or roll back with the rest of the
+    batch, so it is inserted on the batch's connection instead of queued.
+    Returns False if the queue was full and the row was dropped.
+    """
+    if get_db_connection().in_transaction:
+        with db_transaction() as conn:
+            conn.execute(insert_sql(table), row)
+        return True
+    return audit_log.enqueue(table, row)
+
+def flush_audit_log():
+    """Commit queued audit rows before an audit read.
+
+    Skipped inside a /batch: its transaction may hold the write lock the
+    writer thread needs (the flush would just time out), and the batch's
+    own audit rows are already written in place by record_audit.
+    """
+    if not get_db_connection().in_transaction:
+        audit_log.flush()
+
+def audit_read_source(table: str, columns) -> str:
+    """FROM source for an audit read, spanning the archive DB when it exists.
+
+    The archive can only be attached outside a transaction (/batch attaches
+    it before BEGIN); if that failed the read covers hot rows only.
+    """
+    conn = get_db_connection()
+    archive = archive_path_for(DB_PATH)
+    if not attach_archive(conn, archive) and os.path.exists(archive):
+        logger.warning(f"Archive not attached (transaction open); {table} read excludes archived rows")
+    return audit_source(conn, table, columns)
+
+def audit_queue_full():
+    return jsonify({"status": "error", "message": "Audit log queue is full, record dropped"}), 503
 
 def query_db(query, params=()):
     """Execute a SELECT query and return results."""
-    conn = get_db_connection()
     try:
-        cursor = conn.cursor()
-        cursor.execute(query, params)
+        cursor = get_db_connection().execute(query, params)
         return cursor.fetchall()
     except Exception as e:
         logger.error(f"Database query error: {e}")
         return []
-    finally:
-        conn.close()
 
-# --- IMAGE HANDLING ---
-def get_student_image_base64(student_id: str) -> str:
-    """Get student image as base64 string."""
-    for ext in [".jpg", ".png", ".JPG", ".PNG"]:
-        path = os.path.join(IMAGES_DIR, f"{student_id}{ext}")
-        if os.path.exists(path):
+def encode_cursor(direction: str, key: List[Any]) -> str:
+    """Opaque keyset cursor: 'n'/'p' plus the sort key of the boundary row."""
+    raw = json.dumps([direction, *key], separators=(",", ":"), ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(token: str) -> Tuple[str, List[Any]]:
+    """Inverse of encode_cursor; raises ValueError for malformed tokens."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        direction, *key = json.loads(raw)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if direction not in ("n", "p") or not key:
+        raise ValueError("Invalid cursor")
+    return direction, key
+
+def query_page(query, params=(), sort_keys=("id",), descending=False, page=None, page_size=10,
+               cursor=None, count_query=None, with_total=True):
+    """Fetch one page of ``query`` plus its total row count in a single statement.
+
+    Rows are ordered by ``sort_keys`` (output columns of ``query``; the last one
+    must be unique). With a ``cursor`` the page starts right after (or, for a
+    prev cursor, right before) the boundary row via a row-value comparison, so
+    deep pages cost the same as the first one and do not shift when new rows
+    arrive. Without one, ``page`` falls back to LIMIT/OFFSET; ``page=None``
+    returns every row.
+
+    By default the total comes from a COUNT(*) OVER () window column, so SQLite
+    walks a grouped/ranked result set once instead of once for COUNT and again
+    for the page. For plain table pages pass ``count_query`` (a parameterless
+    COUNT); it is inlined as a scalar subquery that SQLite evaluates once,
+    leaving the page free to use an index for ORDER BY ... LIMIT. Only a page
+    past the end (no rows to carry the count) costs a second query.
+
+    Returns (rows, total_count, next_cursor, prev_cursor); errors (including
+    ValueError for a bad cursor) propagate to the caller.
+    """
+    conn = get_db_connection()
+    if not with_total:
+        total_expr = "NULL"
+    else:
+        total_expr = f"({count_query})" if count_query else "COUNT(*) OVER ()"
+    sql = f"SELECT * FROM (SELECT *, {total_expr} AS _total FROM ({query}))"
+    args = list(params)
+
+    backwards = False
+    if cursor:
+        direction, key = decode_cursor(cursor)
+        if len(key) != len(sort_keys):
+            raise ValueError("Invalid cursor")
+        backwards = direction == "p"
+        op = "<" if descending != backwards else ">"
+        sql += f" WHERE ({', '.join(sort_keys)}) {op} ({', '.join('?' for _ in key)})"
+        args.extend(key)
+    order = "DESC" if descending != backwards else "ASC"
+    sql += " ORDER BY " + ", ".join(f"{k} {order}" for k in sort_keys)
+
+    limited = bool(cursor) or page is not None
+    if cursor:
+        sql += " LIMIT ?"
+        args.append(page_size + 1)
+    elif page is not None:
+        sql += " LIMIT ? OFFSET ?"
+        args.extend([page_size + 1, (page - 1) * page_size])
+
+    cur = conn.execute(sql, args)
+    columns = [d[0] for d in cur.description]
+    rows = cur.fetchall()
+    has_more = limited and len(rows) > page_size
+    if limited:
+        rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    if rows:
+        total = rows[0][-1]
+    elif with_total and page is not None and page > 1:
+        total = conn.execute(count_query or f"SELECT COUNT(*) FROM ({query})",
+                             () if count_query else tuple(params)).fetchone()[0]
+    else:
+        total = 0 if with_total else None
+
+    next_cursor = prev_cursor = None
+    if rows and limited:
+        key_idx = [columns.index(k) for k in sort_keys]
+        more_after = True if backwards else has_more
+        more_before = has_more if backwards else (bool(cursor) or (page or 1) > 1)
+        if more_after:
+            next_cursor = encode_cursor("n", [rows[-1][i] for i in key_idx])
+        if more_before:
+            prev_cursor = encode_cursor("p", [rows[0][i] for i in key_idx])
+    return [row[:-1] for row in rows], total, next_cursor, prev_cursor
+
+# --- RESPONSE CACHE ---
+response_cache = ResponseCache(max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+def reset_response_cache():
+    """Drop cached responses and invalidate every ETag handed out so far.
+
+    The ETag salt lives in the database (ETAG_EPOCH), so bumping it here
+    invalidates the tags of every server worker, not just this process.
+    """
+    response_cache.clear()
+    try:
+        with db_transaction() as conn:
+            bump_etag_epoch(conn)
+    except sqlite3.Error as e:
+        logger.error(f"Could not rotate the ETag epoch: {e}")
+
+def version_etag(path: str, body: str, tag: Tuple, salt: str, ttl=None) -> str:
+    """ETag for a read response, derived from the table versions it reflects.
+
+    ``salt`` must be the same in every worker serving the same data (see
+    etag_salt). Clock-dependent endpoints (those given a ``ttl``) also
+    change tag once per ``ttl`` window.
+    """
+    window = int(time.time() // ttl) if ttl else 0
+    raw = f"{salt}|{path}|{body}|{tag}|{window}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:24]
+
+def etag_salt(versions: Dict[str, int]) -> str:
+    """Salt shared by all workers: the DB file identity plus the stored ETag epoch.
+
+    A restored file (new inode) or an import/reset (new epoch) changes it,
+    so tags for content whose table versions repeat never match.
+    """
+    return f"{db_pool.file_id}|{versions.get(ETAG_EPOCH)}"
+
+def cached_response(*tables, ttl=None):
+    """Serve a read endpoint from response_cache with ETag revalidation.
+
+    Entries are keyed on the path plus the JSON body with sorted keys and are
+    only reused while ``tables`` keep the write versions they were built
+    from. Pass a short ``ttl`` for endpoints that also depend on the clock
+    (e.g. overdue counts). Only 200 JSON responses are stored.
+
+    The ETag is computed from the same versions before the view runs, so a
+    matching If-None-Match is answered with 304 without running any query.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
             try:
-                with open(path, "rb") as img_file:
-                    return base64.b64encode(img_file.read()).decode('utf-8')
-            except Exception as e:
-                logger.error(f"Error reading student image {student_id}: {e}")
-                break
-    return ""
+                versions = read_table_versions(get_db_connection())
+            except sqlite3.Error as e:
+                logger.error(f"Response cache bypassed for {request.path}: {e}")
+                return view(*args, **kwargs)
+            tag = tuple(versions.get(t) for t in tables)
+            body = json.dumps(request.get_json(silent=True), sort_keys=True, separators=(",", ":"))
+            key = (request.path, body)
+            etag = version_etag(request.path, body, tag, etag_salt(versions), ttl)
+
+            if request.if_none_match.contains_weak(etag):
+                rv = Response(status=304)
+            else:
+                payload = response_cache.get(key, tag)
+                if payload is not None:
+                    rv = Response(payload, mimetype="application/json")
+                else:
+                    rv = view(*args, **kwargs)
+                    if not (isinstance(rv, Response) and rv.status_code == 200 and rv.is_json):
+                        return rv
+                    response_cache.put(key, tag, rv.get_data(), ttl)
+            rv.set_etag(etag)
+            rv.headers["Cache-Control"] = "no-cache"
+            return rv
+        return wrapper
+    return decorator
+
+# --- IMAGE HANDLING ---
+# Resized variants (thumb/profile/full) rendered once into images/cache/variants
+photo_cache = PhotoCache(IMAGES_DIR)
+# Versioned photo URLs never change content, so clients may keep them for a year.
+STUDENT_PHOTO_MAX_AGE = 365 * 24 * 3600
+STUDENT_PHOTO_DEFAULT_SIZE = "full"
+
+def student_photo_urls(student_id: str, version: str) -> Dict[str, str]:
+    """Versioned /student_photo URL for every size, original included."""
+    return {
+        size: f"/student_photo/{student_id}?size={size}&v={version}"
+        for size in (*PHOTO_VARIANTS, "original")
+    }
+
+# --- JSON ---
+class FastJSONProvider(DefaultJSONProvider):
+    """flask.json provider that uses orjson when it is installed.
+
+    jsonify(), request.get_json() and the error handlers all go through it.
+    Without orjson it is the stdlib provider minus key sorting and ASCII
+    escaping, which only cost time and bytes. Tuples (e.g. sqlite rows)
+    encode as arrays on both paths.
+    """
+    sort_keys = False
+    ensure_ascii = False
+    # Datetimes etc. go through self.default, so both encoders agree.
+    _orjson_options = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+    def _orjson_dumps(self, obj) -> bytes:
+        return orjson.dumps(obj, default=self.default, option=self._orjson_options)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs.get("indent"):
+            return super().dumps(obj, **kwargs)
+        try:
+            return self._orjson_dumps(obj).decode("utf-8")
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None or self._app.debug:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        try:
+            body = self._orjson_dumps(obj)
+        except orjson.JSONEncodeError:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+def wants_rows(data) -> bool:
+    """True when the request asked for {"format": "rows"} (column list + row arrays)."""
+    return bool(data) and data.get("format") == "rows"
+
+def rows_data(columns, rows, **extra) -> Dict[str, Any]:
+    """The "data" object of every {"format": "rows"} response."""
+    return {"columns": list(columns), "rows": rows, **extra}
 
 # --- FLASK APP ---
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
+@app.before_request
+def detect_replaced_database():
+    """Pick up a database file swapped in by another process (e.g. a bot import).
+
+    With several server workers only the importing process resets its pool
+    and caches directly; the others notice the new file here.
+    """
+    if db_pool.check_replaced():
+        logger.info("Database file was replaced; pool and response cache reset")
+        reset_response_cache()
+
+@app.teardown_request
+def release_db_connection(exc):
+    """Hand the request's pooled connection back for the next request."""
+    db_pool.release()
+
+# --- RESPONSE COMPRESSION ---
+_compression_lock = threading.Lock()
+compression_stats: Dict[str, Dict[str, int]] = {}
+
+def _record_compression(endpoint: str, raw_size: int, sent_size: int):
+    with _compression_lock:
+        entry = compression_stats.setdefault(
+            endpoint, {"responses": 0, "compressed": 0, "bytes_in": 0, "bytes_out": 0})
+        entry["responses"] += 1
+        entry["compressed"] += sent_size < raw_size
+        entry["bytes_in"] += raw_size
+        entry["bytes_out"] += sent_size
+
+def compression_report() -> Dict[str, Dict[str, Any]]:
+    """Per-endpoint bytes before/after compression, for /health."""
+    with _compression_lock:
+        report = {k: dict(v) for k, v in compression_stats.items()}
+    for entry in report.values():
+        entry["bytes_saved"] = entry["bytes_in"] - entry["bytes_out"]
+        entry["ratio"] = round(entry["bytes_out"] / entry["bytes_in"], 4) if entry["bytes_in"] else 1.0
+    return report
+
+@app.after_request
+def compress_response(response):
+    """Negotiated br/gzip encoding for text responses above COMPRESS_MIN_SIZE.
+
+    Streamed and file responses are left alone. A compressed body gets a weak
+    ETag, since the bytes now differ from the identity representation.
+    """
+    if (response.mimetype not in COMPRESSIBLE_MIMETYPES or response.is_streamed
+            or response.direct_passthrough or "Content-Encoding" in response.headers):
+        return response
+    response.vary.add("Accept-Encoding")
+    if response.status_code != 200:
+        return response
+    endpoint = request.url_rule.rule if request.url_rule else request.path
+    data = response.get_data()
+    coding = request.accept_encodings.best_match(["br", "gzip"] if brotli else ["gzip"])
+    if len(data) < COMPRESS_MIN_SIZE or not coding:
+        _record_compression(endpoint, len(data), len(data))
+        return response
+
+    if coding == "br":
+        body = brotli.compress(data, quality=5)
+    else:
+        body = gzip.compress(data, compresslevel=6)
+    response.set_data(body)
+    response.headers["Content-Encoding"] = coding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    _record_compression(endpoint, len(data), len(body))
+    return response
+
 # --- GITHUB RELEASES BACKUP / RESTORE ---
 
 def backup_db_to_github():
-    """Push the current DB to a GitHub Release (does NOT trigger Railway webhooks)."""
+    """Push a consistent, compressed DB snapshot to a GitHub Release (does NOT trigger Railway webhooks).
+
+    The snapshot (and one of the audit archive, if any) is built before the
+    old release is touched, uploaded as a streamed body, and described in the
+    release body's manifest (sizes and sha256) so restores can verify it.
+    """
     if not GITHUB_TOKEN:
         logger.warning("GITHUB_TOKEN not set — DB backup to GitHub skipped")
         return False
@@ -75,15 +458,25 @@ def backup_db_to_github():
     }
     api = f"https://api.github.com/repos/{GITHUB_REPO}"
 
+    uploads = []  # (temp file, asset name)
     try:
-        # 1. Get HEAD sha (needed to create a lightweight tag)
+        # 1. Snapshot + compress the DB and the audit archive
+        manifest = {}
+        archive_path = archive_path_for(DB_PATH)
+        for path in [DB_PATH] + ([archive_path] if os.path.exists(archive_path) else []):
+            packed_path, entry = create_backup(path)
+            name = asset_name(path, entry["encoding"])
+            uploads.append((packed_path, name))
+            manifest[name] = entry
+
+        # 2. Get HEAD sha (needed to create a lightweight tag)
         r = _req.get(f"{api}/git/refs/heads/main", headers=headers, timeout=10)
         if r.status_code != 200:
             logger.error(f"backup_db: can't get HEAD sha: {r.status_code}")
             return False
         head_sha = r.json()["object"]["sha"]
 
-        # 2. Delete old release + tag if they exist
+        # 3. Delete old release + tag if they exist
         r = _req.get(f"{api}/releases/tags/{DB_RELEASE_TAG}", headers=headers, timeout=10)
         if r.status_code == 200:
             rel = r.json()
@@ -92,17 +485,17 @@ def backup_db_to_github():
             _req.delete(f"{api}/releases/{rel['id']}", headers=headers, timeout=10)
         _req.delete(f"{api}/git/refs/tags/{DB_RELEASE_TAG}", headers=headers, timeout=10)
 
-        # 3. Create lightweight tag pointing to HEAD
+        # 4. Create lightweight tag pointing to HEAD
         _req.post(f"{api}/git/refs", json={
             "ref": f"refs/tags/{DB_RELEASE_TAG}",
             "sha": head_sha,
         }, headers=headers, timeout=10)
 
-        # 4. Create a new release
+        # 5. Create a new release carrying the manifest
         r = _req.post(f"{api}/releases", json={
             "tag_name": DB_RELEASE_TAG,
             "name": "Database Backup",
-            "body": f"Auto-backup at {datetime.now().isoformat()}",
+            "body": format_manifest(f"Auto-backup at {datetime.now().isoformat()}", manifest),
             "draft": False,
             "prerelease": False,
         }, headers=headers, timeout=10)
@@ -113,35 +506,113 @@ def backup_db_to_github():
         release = r.json()
         upload_tpl = release["upload_url"]  # {...?name,label}
 
-        # 5. Upload the .db file as a release asset
-        with open(DB_PATH, "rb") as fh:
-            db_bytes = fh.read()
+        # 6. Upload the compressed snapshots as release assets
+        for packed_path, name in uploads:
+            if not _upload_release_asset(upload_tpl, packed_path, name, manifest[name]):
+                return False
+        return True
+    except Exception as e:
+        logger.error(f"backup_db exception: {e}")
+        return False
+    finally:
+        for packed_path, _ in uploads:
+            if os.path.exists(packed_path):
+                os.remove(packed_path)
+
 
-        asset_url = upload_tpl.replace("{?name,label}", f"?name={DB_PATH}")
+def _upload_release_asset(upload_tpl: str, path: str, name: str, entry: Dict[str, Any]) -> bool:
+    """Upload one file to a release as ``name``, streaming it from disk."""
+    asset_url = upload_tpl.replace("{?name,label}", f"?name={name}")
+    with open(path, "rb") as fh:
         r = _req.post(
             asset_url,
-            data=db_bytes,
+            data=fh,
             headers={
                 "Authorization": f"token {GITHUB_TOKEN}",
                 "Content-Type": "application/octet-stream",
+                "Content-Length": str(entry["compressed_size"]),
             },
             timeout=120,
         )
-        if r.status_code in (200, 201):
-            logger.info(f"Database backed up to GitHub Release ({len(db_bytes)} bytes)")
-            return True
-        logger.error(f"backup_db: upload failed: {r.status_code}")
-        return False
+    if r.status_code in (200, 201):
+        logger.info(f"{name} backed up to GitHub Release "
+                    f"({entry['size']} bytes, {entry['compressed_size']} compressed)")
+        return True
+    logger.error(f"backup_db: upload of {name} failed: {r.status_code}")
+    return False
+
+def _pick_backup_asset(by_name: Dict[str, Any], path: str):
+    """Release asset for ``path``: compressed if restorable here, else the plain file."""
+    for encoding in available_encodings():
+        asset = by_name.get(asset_name(path, encoding))
+        if asset:
+            return asset
+    return None
+
+def _restore_release_asset(asset: Dict[str, Any], path: str, manifest: Dict[str, Any], headers) -> int:
+    """Restore one release asset into ``path``; returns the restored size.
+
+    The asset is downloaded (resumably) to ``<path><suffix>.part``, checked
+    against the manifest, decompressed to a temp file, checked again
+    (sha256, size, integrity_check) and only then renamed over ``path``.
+    """
+    encoding = encoding_for(asset["name"])
+    entry = manifest.get(asset["name"])
+    part_path = f"{path}{ENCODINGS[encoding]}.part"
+    download_resumable(
+        _req, asset["browser_download_url"], part_path, headers=headers,
+        expected_size=entry["compressed_size"] if entry else asset.get("size"),
+        identity={"id": asset.get("id"), "size": asset.get("size"), "updated_at": asset.get("updated_at")},
+    )
+    try:
+        if entry:
+            verify_file(part_path, entry["compressed_size"], entry["compressed_sha256"])
+        size = restore_stream(file_chunks(part_path), path, encoding, entry, check=True)
+    except BackupVerificationError:
+        # A bad download must not be resumed next time
+        discard_partial(part_path)
+        raise
+    discard_partial(part_path)
+    return size
+
+# Cleared while the audit archive is being restored in the background;
+# retention must not create/fill an archive that is about to be replaced
+archive_restored = threading.Event()
+archive_restored.set()
+
+def _restore_archive(asset: Dict[str, Any], archive_path: str, manifest: Dict[str, Any], headers):
+    try:
+        size = _restore_release_asset(asset, archive_path, manifest, headers)
+        logger.info(f"Audit archive restored from GitHub Release ({size} bytes)")
     except Exception as e:
-        logger.error(f"backup_db exception: {e}")
-        return False
+        logger.error(f"restore_db: archive restore failed: {e}")
+    finally:
+        archive_restored.set()
 
+def _set_aside(path: str):
+    """Move an unusable DB (and its -wal/-shm) out of the way, keeping it for inspection."""
+    stamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.replace(path + suffix, f"{path}.corrupt-{stamp}{suffix}")
 
-def restore_db_from_github():
-    """Download the DB from GitHub Releases if the local file is missing/empty."""
-    if os.path.exists(DB_PATH) and os.path.getsize(DB_PATH) > 1024:
-        logger.info("Database already exists locally — skipping restore")
-        return True
+def restore_db_from_github(wait_for_archive: bool = False):
+    """Download the DB from GitHub Releases if the local file is missing or unusable.
+
+    The audit archive is restored in the background unless
+    ``wait_for_archive``: the app only needs the main DB to start.
+    """
+    if os.path.exists(DB_PATH) and os.path.getsize(DB_PATH) > 0:
+        if database_usable(DB_PATH):
+            logger.info("Database already exists locally — skipping restore")
+            for suffix in ENCODINGS.values():
+                if os.path.exists(f"{DB_PATH}{suffix}.part"):
+                    logger.warning(f"An interrupted restore left {DB_PATH}{suffix}.part; the local database "
+                                   f"was kept. Move it away and restart to finish restoring from GitHub.")
+            return True
+        logger.error("Local database is truncated or corrupt — setting it aside and restoring")
+        with shipping_paused(DB_PATH):
+            _set_aside(DB_PATH)
     if not GITHUB_TOKEN:
         logger.warning("GITHUB_TOKEN not set — cannot restore DB from GitHub")
         return False
@@ -158,27 +629,83 @@ def restore_db_from_github():
             logger.warning(f"No DB backup found on GitHub (status {r.status_code})")
             return False
 
-        assets = r.json().get("assets", [])
+        release = r.json()
+        assets = release.get("assets", [])
         if not assets:
             logger.warning("DB backup release has no assets")
             return False
+        by_name = {a["name"]: a for a in assets}
+        manifest = parse_manifest(release.get("body"))
+        if not manifest:
+            logger.warning("DB backup release has no manifest — verifying the restore with integrity_check only")
+        # Older backups hold a single, possibly differently named, asset
+        db_asset = _pick_backup_asset(by_name, DB_PATH) or assets[0]
 
-        dl_url = assets[0]["browser_download_url"]
-        r = _req.get(dl_url, headers=headers, timeout=120)
-        if r.status_code == 200:
-            with open(DB_PATH, "wb") as fh:
-                fh.write(r.content)
-            logger.info(f"Database restored from GitHub Release ({len(r.content)} bytes)")
-            return True
-        logger.error(f"restore_db: download failed: {r.status_code}")
-        return False
+        start = time.perf_counter()
+        # A WAL shipper in this process must not pin the file being replaced
+        with shipping_paused(DB_PATH):
+            size = _restore_release_asset(db_asset, DB_PATH, manifest, headers)
+        logger.info(f"Database restored from GitHub Release {db_asset['name']} "
+                    f"({size} bytes, {time.perf_counter() - start:.1f}s)")
+
+        archive_path = archive_path_for(DB_PATH)
+        archive_asset = _pick_backup_asset(by_name, archive_path)
+        if archive_asset and not os.path.exists(archive_path):
+            args = (archive_asset, archive_path, manifest, headers)
+            archive_restored.clear()
+            if wait_for_archive:
+                _restore_archive(*args)
+            else:
+                threading.Thread(target=_restore_archive, args=args, name="restore-archive", daemon=True).start()
+        return True
     except Exception as e:
         logger.error(f"restore_db exception: {e}")
         return False
 
+def import_database(src_path: str, backup_path: str):
+    """Replace the library's content with the database at ``src_path`` (a bot upload).
+
+    The current content is saved to ``backup_path`` first. Both copies use
+    SQLite's backup API, so the live file keeps its WAL and every connection,
+    pooled here or in a server worker, moves to the new content through
+    normal locking. The import is one transaction: if it raises, the live
+    database is unchanged.
+    """
+    check_database(src_path)
+    try:
+        old_versions = read_table_versions(get_db_connection())
+    except sqlite3.Error:
+        old_versions = {}
+    finally:
+        db_pool.release()
+    audit_log.flush()
+    snapshot(DB_PATH, backup_path)
+    with shipping_paused(DB_PATH):
+        copy_into(src_path, DB_PATH)
+    init_db()
+    # The imported table versions may repeat the old ones; server workers in
+    # other processes would then keep serving responses cached before the import
+    try:
+        with db_transaction() as conn:
+            for name, version in old_versions.items():
+                conn.execute("UPDATE table_versions SET version = MAX(version, ?) + 1 WHERE name = ?",
+                             (version, name))
+    except sqlite3.Error as e:
+        logger.error(f"Could not advance table versions after import: {e}")
+    finally:
+        db_pool.release()
+
 # --- ENDPOINTS ---
 
+def _fts_match_expr(term: str) -> str:
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    words = [w.replace('"', '""') for w in term.split() if re.search(r"\w", w)]
+    return " ".join(f'"{w}"*' for w in words)
+
+SEARCH_COLUMNS = ("id", "title", "author", "category", "available_copies")
+
 @app.route('/search_book', methods=['POST'])
+@cached_response("books")
 def search_book():
     """Search for books by code or name with optional pagination."""
     try:
@@ -187,24 +714,59 @@ def search_book():
         page = data.get('page')  # Optional
         page_size = data.get('page_size', 5)
         norm_term = term.upper()
+        match_expr = _fts_match_expr(term)
         
-        # 1. Get total count for pagination
-        count_query = "SELECT COUNT(*) FROM books WHERE id = ? OR title LIKE ?"
-        total_count = query_db(count_query, (norm_term, f"%{term}%"))[0][0]
-        
-        # 2. Build search query
-        query = "SELECT id, title, author, category, available_copies FROM books WHERE id = ? OR title LIKE ?"
-        params = [norm_term, f"%{term}%"]
+        # Exact code match first, then full-text hits ranked by bm25
+        ranked = """
+            SELECT b.id, b.title, b.author, b.category, b.available_copies, -1e9 AS score
+            FROM books b WHERE b.id = ?
+            UNION ALL
+            SELECT b.id, b.title, b.author, b.category, b.available_copies, f.rank AS score
+            FROM books_fts f JOIN books b ON b.rowid = f.rowid
+            WHERE books_fts MATCH ? AND b.id <> ?
+        """
+        params = [norm_term, match_expr, norm_term]
+        sort_keys, count_query = ("score", "id"), None
+        if not term:
+            # Empty search lists every book, as the old LIKE '%%' did
+            ranked = "SELECT id, title, author, category, available_copies, 0 AS score FROM books"
+            params = []
+            sort_keys, count_query = ("id",), "SELECT COUNT(*) FROM books"
+        elif not match_expr:
+            # Punctuation-only terms have no FTS tokens; keep the substring match
+            ranked = "SELECT id, title, author, category, available_copies, 0 AS score FROM books WHERE id = ? OR title LIKE ?"
+            params = [norm_term, f"%{term}%"]
         
-        if page is not None:
-            query += " LIMIT ? OFFSET ?"
-            params.extend([page_size, (page - 1) * page_size])
-            
-        results = query_db(query, tuple(params))
+        cursor = data.get('cursor')  # Optional, takes precedence over page
+        try:
+            results, total_count, next_cursor, prev_cursor = query_page(
+                ranked, params, sort_keys, False, page, page_size, cursor, count_query)
+        except sqlite3.OperationalError as e:
+            # No books_fts table (SQLite without FTS5): fall back to a LIKE scan
+            logger.warning(f"search_book falling back to LIKE: {e}")
+            ranked = "SELECT id, title, author, category, available_copies, 0 AS score FROM books WHERE id = ? OR title LIKE ?"
+            params = [norm_term, f"%{term}%"]
+            results, total_count, next_cursor, prev_cursor = query_page(
+                ranked, params, ("score", "id"), False, page, page_size, cursor)
         
+        total_pages = (total_count + page_size - 1) // page_size if total_count > 0 else 1
+        if wants_rows(data):
+            return jsonify({
+                "status": "ok",
+                "data": rows_data(
+                    SEARCH_COLUMNS, [r[:-1] for r in results],
+                    count=len(results),
+                    total_count=total_count,
+                    total_pages=total_pages,
+                    current_page=page or 1,
+                    next_cursor=next_cursor,
+                    prev_cursor=prev_cursor
+                )
+            })
+
         books = []
         for res in results:
-            id_val, title, author, category, available = res
+            id_val, title, author, category, available, _score = res
             books.append({
                 "id": id_val,
                 "title": title,
@@ -214,8 +776,6 @@ def search_book():
                 "status": "Available" if available > 0 else "Issued"
             })
         
-        total_pages = (total_count + page_size - 1) // page_size if total_count > 0 else 1
-        
         return jsonify({
             "status": "ok",
             "data": {
@@ -223,7 +783,9 @@ def search_book():
                 "count": len(books),
                 "total_count": total_count,
                 "total_pages": total_pages,
-                "current_page": page or 1
+                "current_page": page or 1,
+                "next_cursor": next_cursor,
+                "prev_cursor": prev_cursor
             }
         })
     except Exception as e:
@@ -231,6 +793,7 @@ def search_book():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 @app.route('/book_status', methods=['POST'])
+@cached_response("books", "members", "transactions")
 def book_status():
     """Get book status and current issuer."""
     try:
@@ -261,7 +824,7 @@ def book_status():
                 FROM transactions t 
                 JOIN members m ON t.member_id = m.student_id 
                 WHERE t.book_id = ? AND t.status = 'issued' 
-                ORDER BY t.issue_date DESC LIMIT 1
+                ORDER BY t.issue_ts DESC LIMIT 1
             """
             issued_info = query_db(t_query, (book_id,))
             if issued_info:
@@ -278,6 +841,108 @@ def book_status():
         logger.error(f"Error in book_status: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+# {"format": "rows"} output: the issuer is flattened so no row needs a dict
+BULK_STATUS_COLUMNS = ("id", "title", "available", "status", "issued_name", "issued_batch", "issue_date", "due_date")
+
+# One pass over the requested IDs (json_each keeps their order). The current
+# issuer is looked up only for books with no copy left, through the
+# (book_id, issue_ts) index, exactly as /book_status does for a single book.
+BULK_STATUS_QUERY = """
+    SELECT ids.book_id, b.title, b.available_copies, m.name, m.batch, t.issue_date, t.due_date
+    FROM (SELECT MIN(key) AS pos, value AS book_id FROM json_each(?) GROUP BY value) ids
+    LEFT JOIN books b ON b.id = ids.book_id
+    LEFT JOIN transactions t ON b.available_copies = 0 AND t.id = (
+        SELECT t2.id FROM transactions t2
+        WHERE t2.book_id = ids.book_id AND t2.status = 'issued'
+        ORDER BY t2.issue_ts DESC LIMIT 1
+    )
+    LEFT JOIN members m ON m.student_id = t.member_id
+    ORDER BY ids.pos
+"""
+
+def bulk_status_item(row) -> Dict[str, Any]:
+    """Shape one BULK_STATUS_QUERY row like /book_status's "data"."""
+    book_id, title, available, name, batch, issue_date, due_date = row
+    if title is None and available is None:
+        return {"id": book_id, "title": None, "available": 0, "status": "Not Found", "issued_to": None}
+    issued_to = None
+    if available == 0 and issue_date is not None:
+        issued_to = {"name": name, "batch": batch or "N/A", "issue_date": issue_date, "due_date": due_date}
+    return {
+        "id": book_id,
+        "title": title,
+        "available": available,
+        "status": "Available" if available > 0 else "Issued",
+        "issued_to": issued_to
+    }
+
+def bulk_status_row(row) -> Tuple:
+    """Shape one BULK_STATUS_QUERY row as a BULK_STATUS_COLUMNS tuple."""
+    book_id, title, available, name, batch, issue_date, due_date = row
+    if title is None and available is None:
+        return (book_id, None, 0, "Not Found", None, None, None, None)
+    if available == 0 and issue_date is not None:
+        return (book_id, title, available, "Issued", name, batch or "N/A", issue_date, due_date)
+    return (book_id, title, available, "Available" if available > 0 else "Issued", None, None, None, None)
+
+@app.route('/book_status_bulk', methods=['POST'])
+@cached_response("books", "members", "transactions")
+def book_status_bulk():
+    """Availability and current issuer for a list of book IDs.
+
+    Body: {"book_ids": [...], "stream": bool, "format": "rows"}. Duplicate IDs
+    are answered once. Lists above BULK_STATUS_STREAM_THRESHOLD (or any list
+    with "stream": true) are streamed as NDJSON, one book per line followed
+    by a {"status": "ok", "count": n, "not_found": k} trailer.
+    """
+    try:
+        data = request.get_json() or {}
+        book_ids = data.get('book_ids')
+        if not isinstance(book_ids, list) or not book_ids:
+            return jsonify({"status": "error", "message": "book_ids must be a non-empty list"}), 400
+        if len(book_ids) > BULK_STATUS_MAX_IDS:
+            return jsonify({
+                "status": "error",
+                "message": f"At most {BULK_STATUS_MAX_IDS} book_ids per request"
+            }), 400
+        bad = next((i for i, b in enumerate(book_ids) if not isinstance(b, str) or not b.strip()), None)
+        if bad is not None:
+            return jsonify({"status": "error", "message": f"book_ids[{bad}] must be a non-empty string"}), 400
+        ids_json = json.dumps([b.strip().upper() for b in book_ids])
+
+        if data.get('stream') or len(book_ids) > BULK_STATUS_STREAM_THRESHOLD:
+            def generate():
+                cursor = get_db_connection().execute(BULK_STATUS_QUERY, (ids_json,))
+                count = not_found = 0
+                while True:
+                    rows = cursor.fetchmany(200)
+                    if not rows:
+                        break
+                    lines = []
+                    for row in rows:
+                        item = bulk_status_item(row)
+                        count += 1
+                        not_found += item["status"] == "Not Found"
+                        lines.append(app.json.dumps(item))
+                    yield "\n".join(lines) + "\n"
+                yield app.json.dumps({"status": "ok", "count": count, "not_found": not_found}) + "\n"
+            return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+        cursor = get_db_connection().execute(BULK_STATUS_QUERY, (ids_json,))
+        if wants_rows(data):
+            rows = [bulk_status_row(r) for r in cursor]
+            return jsonify({
+                "status": "ok",
+                "data": rows_data(BULK_STATUS_COLUMNS, rows),
+                "not_found": [r[0] for r in rows if r[3] == "Not Found"]
+            })
+        items = [bulk_status_item(r) for r in cursor]
+        not_found = [i["id"] for i in items if i["status"] == "Not Found"]
+        return jsonify({"status": "ok", "data": items, "not_found": not_found})
+    except Exception as e:
+        logger.error(f"Error in book_status_bulk: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 @app.route('/student_details', methods=['POST'])
 def student_details():
     """Get complete student profile with history."""
@@ -294,8 +959,10 @@ def student_details():
         
         name, batch = member[0]
         
-        # Get photo
-        photo_base64 = get_student_image_base64(student_id)
+        # Photo is served separately by /student_photo; only point at it here
+        photo_path, photo_stat = photo_cache.find_source(student_id)
+        photo_version = source_version(photo_stat) if photo_path else None
+        photo_urls = student_photo_urls(student_id, photo_version) if photo_path else {}
         
         # Currently Issued (return_date IS NULL)
         issued_query = """
@@ -327,17 +994,55 @@ def student_details():
                 "student_id": student_id,
                 "name": name,
                 "batch": batch or "N/A",
-                "photo": photo_base64,
+                "photo_url": photo_urls.get("profile"),
+                "photo_urls": photo_urls,
+                "photo_version": photo_version,
                 "issued": issued,
                 "returned": returned,
-                "has_photo": bool(photo_base64)
+                "has_photo": bool(photo_path)
             }
         })
     except Exception as e:
         logger.error(f"Error in student_details: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route('/student_photo/<student_id>', methods=['GET'])
+def student_photo(student_id):
+    """Student photo at ?size=thumb|profile|full|original (default full).
+
+    Resized sizes come from photo_cache, rendered on first request. The file
+    is handed to the WSGI server's file wrapper (sendfile where available)
+    with ETag/Last-Modified revalidation and Range support. Requests carrying
+    the current ?v= version may be cached for a year; anything else must
+    revalidate.
+    """
+    try:
+        size = request.args.get("size", STUDENT_PHOTO_DEFAULT_SIZE)
+        if size != "original" and size not in PHOTO_VARIANTS:
+            return jsonify({"status": "error", "message": f"Unknown size: {size}"}), 400
+        path, version = photo_cache.get(student_id, size)
+        if not path:
+            return jsonify({"status": "error", "message": "Photo not found"}), 404
+        immutable = request.args.get("v") == version
+        response = send_file(
+            os.path.abspath(path),
+            etag=f"{version}-{size}",
+            last_modified=os.path.getmtime(path),
+            max_age=STUDENT_PHOTO_MAX_AGE if immutable else 0,
+            conditional=True
+        )
+        if immutable:
+            response.cache_control.public = True
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        return response
+    except Exception as e:
+        logger.error(f"Error in student_photo: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 @app.route('/issue_history', methods=['POST'])
+@cached_response("members", "transactions")
 def issue_history():
     """Get transaction history for a book."""
     try:
@@ -349,7 +1054,7 @@ def issue_history():
             FROM transactions t 
             JOIN members m ON t.member_id = m.student_id 
             WHERE t.book_id = ? 
-            ORDER BY t.issue_date DESC LIMIT 5
+            ORDER BY t.issue_ts DESC, t.id DESC LIMIT 5
         """
         history = query_db(query, (book_id,))
         
@@ -374,56 +1079,48 @@ def issue_history():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 @app.route('/library_stats', methods=['GET'])
+@cached_response("books", "members", "transactions", ttl=60)
 def library_stats():
     """Get library statistics."""
     try:
-        query = """
-            SELECT 
-                (SELECT COUNT(*) FROM books) as total,
-                (SELECT SUM(available_copies) FROM books) as available,
-                (SELECT COUNT(*) FROM transactions WHERE status = 'issued') as issued
-        """
-        counts = query_db(query)
-        
-        if counts:
-            total, available, issued = counts[0]
-            return jsonify({
-                "status": "ok",
-                "data": {
-                    "total_books": total,
-                    "available_copies": available or 0,
-                    "issued_books": issued or 0,
-                    "timestamp": datetime.now().strftime("%d-%m-%Y %I:%M %p")
-                }
-            })
-        else:
-            return jsonify({"status": "error", "message": "Failed to fetch stats"})
+        counters = read_counters(get_db_connection())
+        return jsonify({
+            "status": "ok",
+            "data": {
+                "total_books": counters["total_books"],
+                "available_copies": counters["available_copies"],
+                "issued_books": counters["issued"],
+                "overdue_books": counters["overdue"],
+                "total_members": counters["total_members"],
+                "active_members": counters["active_members"],
+                "timestamp": datetime.now().strftime("%d-%m-%Y %I:%M %p")
+            }
+        })
     except Exception as e:
         logger.error(f"Error in library_stats: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
 @app.route('/analytics_most_issued', methods=['POST'])
+@cached_response("books", "transactions")
 def analytics_most_issued():
     """Get most issued books with pagination."""
     try:
         data = request.get_json() or {}
         page = data.get('page', 1)
         page_size = data.get('page_size', 10)
-        offset = (page - 1) * page_size
-
-        # Get total count
-        count_query = "SELECT COUNT(DISTINCT book_id) FROM transactions"
-        total_count = query_db(count_query)[0][0]
 
+        # book_issue_counts is kept current by triggers (db_migrations). CROSS
+        # JOIN pins it as the outer loop, so each page is a range scan over
+        # its (issue_count, book_id) index instead of a sort over all books.
+        # The total uses the same join: rollup rows of deleted books are skipped.
         query = """
-            SELECT b.id, b.title, COUNT(t.book_id) as issue_count 
-            FROM transactions t 
-            JOIN books b ON t.book_id = b.id 
-            GROUP BY t.book_id 
-            ORDER BY issue_count DESC 
-            LIMIT ? OFFSET ?
+            SELECT r.book_id as id, b.title, r.issue_count 
+            FROM book_issue_counts r 
+            CROSS JOIN books b ON b.id = r.book_id 
         """
-        results = query_db(query, (page_size, offset))
+        results, total_count, next_cursor, prev_cursor = query_page(
+            query, (), ("issue_count", "id"), True, page, page_size, data.get('cursor'),
+            count_query="SELECT COUNT(*) FROM book_issue_counts r JOIN books b ON b.id = r.book_id")
         books = [{"id": r[0], "title": r[1], "count": r[2]} for r in results]
         
         total_pages = (total_count + page_size - 1) // page_size if total_count > 0 else 1
@@ -434,7 +1131,9 @@ def analytics_most_issued():
                 "items": books,
                 "total_count": total_count,
                 "total_pages": total_pages,
-                "current_page": page
+                "current_page": page,
+                "next_cursor": next_cursor,
+                "prev_cursor": prev_cursor
             }
         })
     except Exception as e:
@@ -442,27 +1141,22 @@ def analytics_most_issued():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 @app.route('/analytics_top_readers', methods=['POST'])
+@cached_response("members", "transactions")
 def analytics_top_readers():
     """Get top members by issue count with pagination."""
     try:
         data = request.get_json() or {}
         page = data.get('page', 1)
         page_size = data.get('page_size', 10)
-        offset = (page - 1) * page_size
-
-        # Get total count
-        count_query = "SELECT COUNT(DISTINCT member_id) FROM transactions"
-        total_count = query_db(count_query)[0][0]
 
         query = """
-            SELECT m.name, COUNT(t.member_id) as issue_count 
-            FROM transactions t 
-            JOIN members m ON t.member_id = m.student_id 
-            GROUP BY t.member_id 
-            ORDER BY issue_count DESC 
-            LIMIT ? OFFSET ?
+            SELECT m.name, r.issue_count, r.member_id 
+            FROM member_issue_counts r 
+            CROSS JOIN members m ON m.student_id = r.member_id 
         """
-        results = query_db(query, (page_size, offset))
+        results, total_count, next_cursor, prev_cursor = query_page(
+            query, (), ("issue_count", "member_id"), True, page, page_size, data.get('cursor'),
+            count_query="SELECT COUNT(*) FROM member_issue_counts r JOIN members m ON m.student_id = r.member_id")
         readers = [{"name": r[0], "count": r[1]} for r in results]
         
         total_pages = (total_count + page_size - 1) // page_size if total_count > 0 else 1
@@ -473,7 +1167,9 @@ def analytics_top_readers():
                 "items": readers,
                 "total_count": total_count,
                 "total_pages": total_pages,
-                "current_page": page
+                "current_page": page,
+                "next_cursor": next_cursor,
+                "prev_cursor": prev_cursor
             }
         })
     except Exception as e:
@@ -481,6 +1177,7 @@ def analytics_top_readers():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 @app.route('/analytics_overdue', methods=['POST'])
+@cached_response("books", "members", "transactions", ttl=60)
 def analytics_overdue():
     """Get list of overdue transactions with pagination."""
     try:
@@ -488,46 +1185,28 @@ def analytics_overdue():
         page = data.get('page', 1)
         page_size = data.get('page_size', 10)
         
-        query = """
-            SELECT b.title, m.name, t.due_date 
+        query = f"""
+            SELECT b.title, m.name, t.due_date, t.due_ts, t.id
             FROM transactions t 
             JOIN books b ON t.book_id = b.id 
             JOIN members m ON t.member_id = m.student_id 
-            WHERE t.return_date IS NULL AND t.status = 'issued'
-            ORDER BY t.due_date ASC
+            WHERE {overdue_sql("t")}
         """
-        results = query_db(query)
-        
-        overdue_all = []
-        now = datetime.now()
-        for title, name, due_str in results:
-            try:
-                for fmt in ("%d-%m-%Y", "%Y-%m-%d"):
-                    try:
-                        due_date = datetime.strptime(due_str, fmt)
-                        if due_date < now:
-                            overdue_all.append({"title": title, "name": name, "due_date": due_str})
-                        break
-                    except ValueError:
-                        continue
-            except Exception:
-                continue
-        
-        total_count = len(overdue_all)
+        results, total_count, next_cursor, prev_cursor = query_page(
+            query, (), ("due_ts", "id"), False, page, page_size, data.get('cursor'))
+        items = [{"title": r[0], "name": r[1], "due_date": r[2]} for r in results]
+
         total_pages = (total_count + page_size - 1) // page_size if total_count > 0 else 1
-        
-        # Paginate the list
-        start_idx = (page - 1) * page_size
-        end_idx = start_idx + page_size
-        paginated_items = overdue_all[start_idx:end_idx]
                 
         return jsonify({
             "status": "ok", 
             "data": {
-                "items": paginated_items,
+                "items": items,
                 "total_count": total_count,
                 "total_pages": total_pages,
-                "current_page": page
+                "current_page": page,
+                "next_cursor": next_cursor,
+                "prev_cursor": prev_cursor
             }
         })
     except Exception as e:
@@ -536,77 +1215,20 @@ def analytics_overdue():
 
 # --- DATABASE INITIALIZATION ---
 def init_db():
-    """Create all required tables if they don't exist."""
-    conn = get_db_connection()
+    """Bring the database schema up to date (see db_migrations).
+
+    Also runs after a .db import, whose table versions may collide with the
+    replaced file's, so cached responses and issued ETags are dropped too
+    (after migrating, so the ETag epoch row exists).
+    """
     try:
-        cursor = conn.cursor()
-        # Core library tables
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS books (
-                id TEXT PRIMARY KEY,
-                title TEXT NOT NULL,
-                author TEXT,
-                category TEXT,
-                available_copies INTEGER DEFAULT 1
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS members (
-                student_id TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                batch TEXT
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS transactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                book_id TEXT,
-                member_id TEXT,
-                issue_date TEXT,
-                due_date TEXT,
-                return_date TEXT,
-                status TEXT DEFAULT 'issued'
-            )
-        """)
-        # Bot user tables
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS bot_users (
-                chat_id INTEGER PRIMARY KEY,
-                name TEXT,
-                username TEXT,
-                role TEXT DEFAULT 'Basic',
-                joined_at TEXT,
-                last_active TEXT,
-                approved_by INTEGER
-            )
-        """)
-        # Audit tables
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS bot_user_actions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                name TEXT,
-                username TEXT,
-                action TEXT,
-                details TEXT,
-                created_at TEXT
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS bot_admin_actions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                admin_id INTEGER,
-                action TEXT,
-                target_user_id INTEGER,
-                details TEXT,
-                created_at TEXT
-            )
-        """)
-        conn.commit()
+        version = run_migrations(db_pool.connection())
+        logger.info(f"Database schema at version {version}")
     except Exception as e:
         logger.error(f"Error initializing database: {e}")
     finally:
-        conn.close()
+        reset_response_cache()
+        db_pool.release()
 
 # --- BOT USER ENDPOINTS ---
 
@@ -620,27 +1242,16 @@ def upsert_user():
         username = data.get('username')
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Check if user exists
-        cursor.execute("SELECT chat_id FROM bot_users WHERE chat_id = ?", (chat_id,))
-        user = cursor.fetchone()
-        
-        if user:
-            cursor.execute("""
-                UPDATE bot_users 
-                SET name = ?, username = ?, last_active = ? 
-                WHERE chat_id = ?
-            """, (name, username, now, chat_id))
-        else:
-            cursor.execute("""
+        # One statement: new users get role/joined_at, existing ones keep them
+        with db_transaction() as conn:
+            conn.execute("""
                 INSERT INTO bot_users (chat_id, name, username, role, joined_at, last_active)
                 VALUES (?, ?, ?, 'Basic', ?, ?)
+                ON CONFLICT(chat_id) DO UPDATE SET
+                    name = excluded.name,
+                    username = excluded.username,
+                    last_active = excluded.last_active
             """, (chat_id, name, username, now, now))
-            
-        conn.commit()
-        conn.close()
         return jsonify({"status": "ok"})
     except Exception as e:
         logger.error(f"Error in upsert_user: {e}")
@@ -654,16 +1265,11 @@ def get_bot_users():
         page = data.get('page', 1)
         page_size = data.get('page_size', 5)
         
-        count_query = "SELECT COUNT(*) FROM bot_users"
-        total_count = query_db(count_query)[0][0]
-        
-        query = """
-            SELECT name, chat_id, role, joined_at 
-            FROM bot_users 
-            ORDER BY joined_at DESC 
-            LIMIT ? OFFSET ?
-        """
-        results = query_db(query, (page_size, (page - 1) * page_size))
+        # Keyed on COALESCE so users without joined_at stay in cursor pages (last)
+        query = "SELECT name, chat_id, role, joined_at, COALESCE(joined_at, '') AS joined_key FROM bot_users"
+        results, total_count, next_cursor, prev_cursor = query_page(
+            query, (), ("joined_key", "chat_id"), True, page, page_size, data.get('cursor'),
+            count_query="SELECT COUNT(*) FROM bot_users")
         
         users = []
         for r in results:
@@ -682,7 +1288,9 @@ def get_bot_users():
                 "users": users,
                 "total_count": total_count,
                 "total_pages": total_pages,
-                "current_page": page
+                "current_page": page,
+                "next_cursor": next_cursor,
+                "prev_cursor": prev_cursor
             }
         })
     except Exception as e:
@@ -728,15 +1336,12 @@ def update_user_role():
         new_role = data.get('role')
         admin_id = data.get('admin_id')
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE bot_users 
-            SET role = ?, approved_by = ? 
-            WHERE chat_id = ?
-        """, (new_role, admin_id if new_role == 'Approved' else None, chat_id))
-        conn.commit()
-        conn.close()
+        with db_transaction() as conn:
+            conn.execute("""
+                UPDATE bot_users 
+                SET role = ?, approved_by = ? 
+                WHERE chat_id = ?
+            """, (new_role, admin_id if new_role == 'Approved' else None, chat_id))
         
         return jsonify({"status": "ok"})
     except Exception as e:
@@ -751,6 +1356,12 @@ def health():
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "database_present": os.path.exists(DB_PATH),
         "db_path": DB_PATH,
+        "db_pool": db_pool.stats(),
+        "response_cache": response_cache.stats(),
+        "compression": compression_report(),
+        "photo_cache": photo_cache.stats(),
+        "audit_log": audit_log.stats(),
+        "asgi": request.environ.get("brain.asgi"),
         "port": int(os.environ.get("PORT", 5000))
     })
 
@@ -766,19 +1377,15 @@ def log_user_action():
         details = data.get('details', '')
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO bot_user_actions (user_id, name, username, action, details, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (user_id, name, username, action, details, now))
-        conn.commit()
-        conn.close()
+        if not record_audit("bot_user_actions", (user_id, name, username, action, details, now)):
+            return audit_queue_full()
         return jsonify({"status": "ok"})
     except Exception as e:
         logger.error(f"Error logging user action: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+USER_ACTION_COLUMNS = ("id", "user_id", "name", "username", "action", "details", "created_at")
+
 @app.route('/get_user_actions', methods=['POST'])
 def get_user_actions():
     """Retrieve paginated user actions."""
@@ -787,30 +1394,25 @@ def get_user_actions():
         page = data.get('page', 1)
         page_size = data.get('page_size', 10)
         user_id = data.get('user_id') # Optional filter
+        flush_audit_log()
         
-        query = "SELECT * FROM bot_user_actions"
+        # Continues into archived rows (retention.py) once the hot ones run out
+        source = audit_read_source("bot_user_actions", USER_ACTION_COLUMNS)
+        query = f"SELECT {', '.join(USER_ACTION_COLUMNS)} FROM {source}"
         params = []
         if user_id:
             query += " WHERE user_id = ?"
             params.append(user_id)
         
-        query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
-        params.extend([page_size, (page - 1) * page_size])
-        
-        results = query_db(query, tuple(params))
-        actions = []
-        for r in results:
-            actions.append({
-                "id": r[0],
-                "user_id": r[1],
-                "name": r[2],
-                "username": r[3],
-                "action": r[4],
-                "details": r[5],
-                "created_at": r[6]
-            })
+        results, _, next_cursor, prev_cursor = query_page(
+            query, params, ("created_at", "id"), True, page, page_size, data.get('cursor'),
+            with_total=False)
+        if wants_rows(data):
+            return jsonify({"status": "ok", "data": rows_data(USER_ACTION_COLUMNS, results),
+                            "next_cursor": next_cursor, "prev_cursor": prev_cursor})
+        actions = [dict(zip(USER_ACTION_COLUMNS, r)) for r in results]
             
-        return jsonify({"status": "ok", "data": actions})
+        return jsonify({"status": "ok", "data": actions, "next_cursor": next_cursor, "prev_cursor": prev_cursor})
     except Exception as e:
         logger.error(f"Error getting user actions: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -826,19 +1428,15 @@ def log_admin_action():
         details = data.get('details', '')
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO bot_admin_actions (admin_id, action, target_user_id, details, created_at)
-            VALUES (?, ?, ?, ?, ?)
-        """, (admin_id, action, target_user_id, details, now))
-        conn.commit()
-        conn.close()
+        if not record_audit("bot_admin_actions", (admin_id, action, target_user_id, details, now)):
+            return audit_queue_full()
         return jsonify({"status": "ok"})
     except Exception as e:
         logger.error(f"Error logging admin action: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+ADMIN_ACTION_COLUMNS = ("id", "admin_id", "action", "target_user_id", "details", "created_at")
+
 @app.route('/get_admin_actions', methods=['POST'])
 def get_admin_actions():
     """Retrieve paginated admin actions."""
@@ -847,34 +1445,273 @@ def get_admin_actions():
         page = data.get('page', 1)
         page_size = data.get('page_size', 10)
         filter_type = data.get('filter') # Optional filter
+        flush_audit_log()
         
-        query = "SELECT * FROM bot_admin_actions"
-        params = []
+        source = audit_read_source("bot_admin_actions", ADMIN_ACTION_COLUMNS)
+        query = f"SELECT {', '.join(ADMIN_ACTION_COLUMNS)} FROM {source}"
         if filter_type == 'access':
             query += " WHERE action IN ('Approve User', 'Decline User', 'Change Role')"
         elif filter_type == 'reset':
             query += " WHERE action = 'Reset User Session'"
             
-        query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
-        params.extend([page_size, (page - 1) * page_size])
-        
-        results = query_db(query, tuple(params))
-        actions = []
-        for r in results:
-            actions.append({
-                "id": r[0],
-                "admin_id": r[1],
-                "action": r[2],
-                "target_user_id": r[3],
-                "details": r[4],
-                "created_at": r[5]
-            })
+        results, _, next_cursor, prev_cursor = query_page(
+            query, (), ("created_at", "id"), True, page, page_size, data.get('cursor'),
+            with_total=False)
+        if wants_rows(data):
+            return jsonify({"status": "ok", "data": rows_data(ADMIN_ACTION_COLUMNS, results),
+                            "next_cursor": next_cursor, "prev_cursor": prev_cursor})
+        actions = [dict(zip(ADMIN_ACTION_COLUMNS, r)) for r in results]
             
-        return jsonify({"status": "ok", "data": actions})
+        return jsonify({"status": "ok", "data": actions, "next_cursor": next_cursor, "prev_cursor": prev_cursor})
     except Exception as e:
         logger.error(f"Error getting admin actions: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+# --- EXPORTS ---
+EXPORT_CHUNK_ROWS = 1000
+
+# table -> (keyset column, its type, date filter column, SQL turning a
+# 'from'/'to' value into that column's representation)
+EXPORT_TABLES = {
+    "transactions": ("id", int, "issue_ts", "CAST(strftime('%s', ?) AS INTEGER)"),
+    "members": ("student_id", str, None, None),
+    "books": ("id", str, None, None),
+    "bot_user_actions": ("id", int, "created_at", "?"),
+    "bot_admin_actions": ("id", int, "created_at", "?"),
+}
+
+def parse_export_date(value: str) -> str:
+    """Normalise a from/to argument to 'YYYY-MM-DD HH:MM:SS'; ValueError if unparseable.
+
+    The audit tables compare created_at as text, so the bound has to be in
+    the stored format; strftime() for transactions reads it too.
+    """
+    parsed = datetime.fromisoformat(value.strip())
+    if parsed.tzinfo is not None:
+        raise ValueError("timezone offsets are not supported")
+    return parsed.strftime("%Y-%m-%d %H:%M:%S")
+
+def export_rows(table: str, after=None, date_from=None, date_to=None, limit=None):
+    """Yield (column names, row chunks...) for an export, EXPORT_CHUNK_ROWS at a time.
+
+    Rows come in key order from one statement read with fetchmany, so memory
+    stays constant however large the table is.
+    """
+    key, _, date_col, date_sql = EXPORT_TABLES[table]
+    where, params = [], []
+    if after is not None:
+        where.append(f"{key} > ?")
+        params.append(after)
+    if date_from:
+        where.append(f"{date_col} >= {date_sql}")
+        params.append(date_from)
+    if date_to:
+        where.append(f"{date_col} < {date_sql}")
+        params.append(date_to)
+    query = f"SELECT * FROM {table}"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += f" ORDER BY {key}"
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    cursor = get_db_connection().execute(query, params)
+    yield [d[0] for d in cursor.description]
+    while True:
+        rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+        if not rows:
+            return
+        yield rows
+
+def encode_ndjson(columns, chunks):
+    for rows in chunks:
+        yield "".join(app.json.dumps(dict(zip(columns, r))) + "\n" for r in rows).encode("utf-8")
+
+def encode_csv(columns, chunks):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+def gzip_stream(chunks):
+    """gzip-encode a byte stream incrementally (one compressor for the whole body)."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+@app.route('/export/<table>', methods=['GET'])
+def export_table(table):
+    """Stream a whole table as NDJSON (default) or CSV.
+
+    Query args: format=ndjson|csv, after=<key> (resume after the last key
+    received: id, or student_id for members), from/to (date range on
+    issue date for transactions or created_at for audit logs; 'from' is
+    inclusive, 'to' exclusive), limit=<rows>. Rows are ordered by key, so a
+    download cut short can continue with after=<last key>.
+    """
+    try:
+        if table not in EXPORT_TABLES:
+            return jsonify({"status": "error", "message": f"Unknown export table: {table}"}), 404
+        fmt = request.args.get("format", "ndjson")
+        if fmt not in ("ndjson", "csv"):
+            return jsonify({"status": "error", "message": "format must be ndjson or csv"}), 400
+        date_from, date_to = request.args.get("from"), request.args.get("to")
+        key, key_type, date_col, _ = EXPORT_TABLES[table]
+        if (date_from or date_to) and date_col is None:
+            return jsonify({"status": "error", "message": f"{table} has no date to filter on"}), 400
+        try:
+            date_from = parse_export_date(date_from) if date_from else None
+            date_to = parse_export_date(date_to) if date_to else None
+        except ValueError:
+            return jsonify({"status": "error", "message": "from/to must be dates like YYYY-MM-DD or YYYY-MM-DD HH:MM:SS"}), 400
+        limit = request.args.get("limit", type=int)
+        after = request.args.get("after", type=key_type)
+        if "after" in request.args and after is None:
+            return jsonify({"status": "error", "message": f"after must be a valid {key}"}), 400
+
+        def generate():
+            rows = export_rows(table, after, date_from, date_to, limit)
+            columns = next(rows)
+            body = encode_csv(columns, rows) if fmt == "csv" else encode_ndjson(columns, rows)
+            yield from (gzip_stream(body) if gzipped else body)
+
+        gzipped = request.accept_encodings["gzip"] > 0
+        response = Response(
+            stream_with_context(generate()),
+            mimetype="text/csv" if fmt == "csv" else "application/x-ndjson"
+        )
+        response.headers["Content-Disposition"] = f"attachment; filename={table}.{fmt}"
+        response.vary.add("Accept-Encoding")
+        if gzipped:
+            response.headers["Content-Encoding"] = "gzip"
+        return response
+    except Exception as e:
+        logger.error(f"Error in export_table: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+# --- BATCH ---
+BATCH_MAX_REQUESTS = 20
+# Sub-requests to these paths write; a batch containing one takes the write
+# lock up front instead of failing to upgrade a read snapshot later.
+BATCH_WRITE_PATHS = {"/upsert_user", "/update_user_role", "/log_user_action", "/log_admin_action"}
+# Audit reads page into the archive DB, which cannot be attached once the
+# batch's transaction has begun.
+BATCH_AUDIT_READ_PATHS = {"/get_user_actions", "/get_admin_actions"}
+# Responses from these are streamed or binary and cannot be embedded in the
+# batch result (the stream would also outlive the batch's transaction).
+BATCH_STREAMING_PREFIXES = ("/export/", "/student_photo/")
+
+def _batch_streams(path: str, body: Dict[str, Any]) -> bool:
+    if path.startswith(BATCH_STREAMING_PREFIXES):
+        return True
+    if path == "/book_status_bulk":
+        ids = body.get("book_ids")
+        return bool(body.get("stream")) or (isinstance(ids, list) and len(ids) > BULK_STATUS_STREAM_THRESHOLD)
+    return False
+
+def _batch_method(path: str) -> str:
+    """POST unless the route only accepts GET (e.g. /library_stats, /health)."""
+    adapter = app.url_map.bind("")
+    try:
+        adapter.match(path, method="POST")
+    except MethodNotAllowed:
+        return "GET"
+    except NotFound:
+        pass
+    return "POST"
+
+@app.route('/batch', methods=['POST'])
+def batch():
+    """Run several endpoint calls in one HTTP request.
+
+    Body: {"requests": [{"path": "/get_user_details", "body": {...}}, ...],
+           "atomic": false}
+
+    Sub-requests run in order through the normal routing (decorators, cache,
+    error handlers) on one pinned connection inside one transaction, so reads
+    share a snapshot and writes (savepoints) commit together at the end. With
+    "atomic": true the first failing sub-request rolls everything back and
+    stops the batch. Results come back in request order as
+    {"path", "status_code", "body"}. Malformed entries and streaming
+    endpoints (exports, photos, streamed bulk status) are rejected with a
+    400 before anything runs.
+    """
+    try:
+        data = request.get_json() or {}
+        subs = data.get('requests')
+        atomic = bool(data.get('atomic'))
+        if not isinstance(subs, list) or not subs:
+            return jsonify({"status": "error", "message": "requests must be a non-empty list"}), 400
+        if len(subs) > BATCH_MAX_REQUESTS:
+            return jsonify({"status": "error", "message": f"At most {BATCH_MAX_REQUESTS} requests per batch"}), 400
+
+        calls = []
+        for i, sub in enumerate(subs):
+            if not isinstance(sub, dict) or not isinstance(sub.get('path'), str):
+                return jsonify({"status": "error", "message": f"Request {i} must be an object with a string path"}), 400
+            body = sub.get('body') or {}
+            if not isinstance(body, dict):
+                return jsonify({"status": "error", "message": f"Request {i} body must be an object"}), 400
+            path = "/" + sub['path'].lstrip("/")
+            if path == "/batch":
+                return jsonify({"status": "error", "message": "Nested /batch is not allowed"}), 400
+            if _batch_streams(path, body):
+                return jsonify({"status": "error", "message": f"Request {i} ({path}) streams its response and cannot be batched"}), 400
+            calls.append((path, _batch_method(path), body))
+        writes = any(path in BATCH_WRITE_PATHS for path, _, _ in calls)
+
+        results = []
+        failed_at = None
+        with db_pool.pinned() as conn:
+            if any(path in BATCH_AUDIT_READ_PATHS for path, _, _ in calls):
+                attach_archive(conn, archive_path_for(DB_PATH))
+            conn.execute("BEGIN IMMEDIATE" if writes else "BEGIN")
+            rolled_back = True
+            try:
+                for i, (path, method, body) in enumerate(calls):
+                    with app.test_request_context(path, method=method,
+                                                  json=body if method == "POST" else None):
+                        resp = app.full_dispatch_request()
+                    payload = resp.get_json(silent=True)
+                    results.append({"path": path, "status_code": resp.status_code, "body": payload})
+                    if atomic and (resp.status_code >= 400
+                                   or (isinstance(payload, dict) and payload.get("status") == "error")):
+                        failed_at = i
+                        break
+                if failed_at is None:
+                    conn.commit()
+                    rolled_back = False
+                else:
+                    conn.rollback()
+            except Exception:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+            finally:
+                if rolled_back and writes:
+                    # Entries cached after a rolled-back write carry table
+                    # versions that later commits will reuse.
+                    response_cache.clear()
+
+        if failed_at is not None:
+            return jsonify({"status": "error",
+                            "message": f"Request {failed_at} ({calls[failed_at][0]}) failed; batch rolled back",
+                            "results": results})
+        return jsonify({"status": "ok", "results": results})
+    except Exception as e:
+        logger.error(f"Error in batch: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 # --- ERROR HANDLERS ---
 @app.errorhandler(404)
 def not_found(error):
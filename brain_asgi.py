@@ -0,0 +1,182 @@
+"""
+ASGI entry point for the brain API (``uvicorn brain_asgi:app``).
+
+Serves exactly the routes and JSON contracts of ``brain.app``: every request
+is dispatched to the same Flask handlers, but connections are held by the
+event loop rather than by threads. Handlers run on a small dedicated pool of
+DB threads (each keeps its pooled SQLite connection), so thousands of bot
+requests can be in flight while only BRAIN_DB_THREADS of them touch the
+database at once. Requests beyond BRAIN_ASGI_MAX_PENDING are answered with
+503 instead of queueing without bound.
+
+A request's handler and its response body (including streamed NDJSON and
+files) are produced on one DB thread, so thread-bound state such as the
+pooled connection behaves exactly as under a WSGI server.
+"""
+
+import asyncio
+import io
+import os
+import sys
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+
+from brain import app as flask_app, audit_log, db_pool, init_db, restore_db_from_github
+
+logger = logging.getLogger(__name__)
+
+BRAIN_DB_THREADS = int(os.environ.get("BRAIN_DB_THREADS", 8))
+BRAIN_ASGI_MAX_PENDING = int(os.environ.get("BRAIN_ASGI_MAX_PENDING", 2000))
+
+_executor = ThreadPoolExecutor(max_workers=BRAIN_DB_THREADS, thread_name_prefix="brain-db")
+_stats = {"in_flight": 0, "peak_in_flight": 0, "served": 0, "rejected": 0}
+
+OVERLOADED_BODY = b'{"status":"error","message":"Server busy, retry shortly"}'
+
+
+def asgi_stats() -> Dict[str, Any]:
+    """Dispatcher counters (only touched from the event loop thread)."""
+    return dict(_stats, db_threads=BRAIN_DB_THREADS, max_pending=BRAIN_ASGI_MAX_PENDING)
+
+
+# --- WSGI BRIDGE ---
+def build_environ(scope, body: bytes) -> Dict[str, Any]:
+    """WSGI environ for an ASGI http scope (PEP 3333 string conventions)."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+            continue
+        if name == "CONTENT_LENGTH":
+            continue
+        key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def run_wsgi(environ, send, loop):
+    """Run the Flask app on this DB thread and push its response through ``send``."""
+    response_start = {}
+
+    def start_response(status, headers, exc_info=None):
+        response_start["status"] = int(status.split(" ", 1)[0])
+        response_start["headers"] = [
+            (name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers
+        ]
+
+    async def send_all(messages):
+        for message in messages:
+            await send(message)
+
+    def push(*messages):
+        asyncio.run_coroutine_threadsafe(send_all(messages), loop).result()
+
+    body = flask_app(environ, start_response)
+    try:
+        # One chunk of lookahead, so a plain JSON body goes out (headers,
+        # body and end of response) in a single hop to the event loop.
+        started = False
+        previous = None
+        for chunk in body:
+            if not chunk:
+                continue
+            if previous is not None:
+                head = [] if started else [{"type": "http.response.start", **response_start}]
+                push(*head, {"type": "http.response.body", "body": previous, "more_body": True})
+                started = True
+            previous = chunk
+        head = [] if started else [{"type": "http.response.start", **response_start}]
+        push(*head, {"type": "http.response.body", "body": previous or b"", "more_body": False})
+    finally:
+        if hasattr(body, "close"):
+            body.close()
+
+
+# --- ASGI APP ---
+async def read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise ConnectionError("Client disconnected")
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def lifespan(receive, send):
+    loop = asyncio.get_running_loop()
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            if os.environ.get("BRAIN_DB_READY") != "1":
+                # Standalone `uvicorn brain_asgi:app`: prepare the DB like start.py does
+                await loop.run_in_executor(_executor, restore_db_from_github)
+                await loop.run_in_executor(_executor, init_db)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await loop.run_in_executor(None, _executor.shutdown)
+            await loop.run_in_executor(None, audit_log.close)
+            db_pool.invalidate()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI callable serving brain's Flask routes off the event loop."""
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    if _stats["in_flight"] >= BRAIN_ASGI_MAX_PENDING:
+        _stats["rejected"] += 1
+        await send({"type": "http.response.start", "status": 503, "headers": [
+            (b"content-type", b"application/json"), (b"retry-after", b"1"),
+            (b"content-length", str(len(OVERLOADED_BODY)).encode("latin-1")),
+        ]})
+        await send({"type": "http.response.body", "body": OVERLOADED_BODY})
+        return
+
+    _stats["in_flight"] += 1
+    _stats["peak_in_flight"] = max(_stats["peak_in_flight"], _stats["in_flight"])
+    try:
+        try:
+            body = await read_body(receive)
+        except ConnectionError:
+            return
+        environ = build_environ(scope, body)
+        if scope["path"] == "/health":
+            environ["brain.asgi"] = asgi_stats()
+        await asyncio.get_running_loop().run_in_executor(
+            _executor, run_wsgi, environ, send, asyncio.get_running_loop()
+        )
+        _stats["served"] += 1
+    except Exception as e:
+        logger.error(f"Error serving {scope.get('path')} over ASGI: {e}")
+    finally:
+        _stats["in_flight"] -= 1
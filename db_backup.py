@@ -0,0 +1,409 @@
+"""
+Consistent, compressed database backups for the GitHub release copy.
+
+A backup is never read from the live file: ``create_backup`` first takes a
+snapshot through SQLite's online backup API (one read transaction, so the
+copy is consistent while the app keeps writing), then compresses it chunk by
+chunk into a temp file next to the database. Memory use stays at one chunk
+whatever the DB size, and the compressed file can be uploaded as a streamed
+body.
+
+Each backup carries a manifest entry: uncompressed size and sha256 of the
+snapshot, plus size and sha256 of the compressed asset. The release body
+holds the manifest as a JSON block, so a restore can verify what it
+downloaded before swapping it in (``restore_stream``). Restores download
+to a ``.part`` file with resumable Range requests and only replace the
+database once checksums and ``PRAGMA integrity_check`` pass.
+
+zstd is used when the optional ``zstandard`` package is installed, gzip
+otherwise; restores read both, as well as old uncompressed assets.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import time
+import zlib
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+try:
+    import zstandard  # optional: smaller and faster than gzip
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+BACKUP_CHUNK = 1024 * 1024
+BACKUP_COMPRESSION = os.environ.get("DB_BACKUP_COMPRESSION", "auto").lower()
+GZIP_LEVEL = int(os.environ.get("DB_BACKUP_GZIP_LEVEL", 6))
+ZSTD_LEVEL = int(os.environ.get("DB_BACKUP_ZSTD_LEVEL", 10))
+DOWNLOAD_RETRIES = int(os.environ.get("DB_RESTORE_RETRIES", 5))
+RESTORE_CHECK = os.environ.get("DB_RESTORE_CHECK", "integrity").lower()  # or "quick"
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+# encoding -> asset name suffix
+ENCODINGS = {"zstd": ".zst", "gzip": ".gz", "identity": ""}
+
+MANIFEST_RE = re.compile(r"```json\s*(\{.*?\})\s*```", re.S)
+
+
+class BackupVerificationError(Exception):
+    """A restored file does not match the size/checksum in the manifest."""
+
+
+def default_encoding() -> str:
+    if BACKUP_COMPRESSION in ("zstd", "auto") and zstandard is not None:
+        return "zstd"
+    if BACKUP_COMPRESSION == "identity":
+        return "identity"
+    return "gzip"
+
+
+def available_encodings() -> Tuple[str, ...]:
+    """Encodings this process can restore, preferred first."""
+    return tuple(e for e in ENCODINGS if e != "zstd" or zstandard is not None)
+
+
+def asset_name(path: str, encoding: str) -> str:
+    return os.path.basename(path) + ENCODINGS[encoding]
+
+
+def encoding_for(name: str) -> Optional[str]:
+    """Encoding of a release asset from its name (identity when no suffix matches)."""
+    for encoding, suffix in ENCODINGS.items():
+        if suffix and name.endswith(suffix):
+            return encoding
+    return "identity"
+
+
+# --- SNAPSHOT ---
+def snapshot(db_path: str, dest_path: str):
+    """Copy ``db_path`` to ``dest_path`` through the online backup API.
+
+    The copy is done in one step, under a single read transaction, so it is a
+    consistent point-in-time image; in WAL mode writers are not blocked.
+    """
+    src = sqlite3.connect(db_path, timeout=30)
+    try:
+        dst = sqlite3.connect(dest_path)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+    finally:
+        src.close()
+
+
+def copy_into(src_path: str, db_path: str, timeout: float = 30):
+    """Overwrite the content of the live database ``db_path`` with ``src_path``.
+
+    Unlike swapping the file, the pages go through SQLite as one write
+    transaction in ``db_path``'s own WAL, so every open connection, in any
+    process, sees either the old content or the new. A WAL database cannot
+    change page size, so a source with a different one is first rebuilt in
+    place (``src_path`` should be a scratch copy).
+    """
+    dst = sqlite3.connect(db_path, timeout=timeout)
+    try:
+        src = sqlite3.connect(src_path)
+        try:
+            page_size = dst.execute("PRAGMA page_size").fetchone()[0]
+            if src.execute("PRAGMA page_size").fetchone()[0] != page_size:
+                src.execute("PRAGMA journal_mode=DELETE")
+                src.execute(f"PRAGMA page_size={int(page_size)}")
+                src.execute("VACUUM")
+            src.backup(dst)
+        finally:
+            src.close()
+    finally:
+        dst.close()
+
+
+# --- COMPRESSION ---
+def _compressor(encoding: str):
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    if encoding == "gzip":
+        return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return None
+
+
+def _decompressor(encoding: str):
+    if encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is not installed; cannot restore a .zst backup")
+        return zstandard.ZstdDecompressor().decompressobj()
+    if encoding == "gzip":
+        return zlib.decompressobj(31)
+    return None
+
+
+def compress_file(src_path: str, dest_path: str, encoding: str) -> Dict[str, Any]:
+    """Compress ``src_path`` into ``dest_path`` chunk by chunk; return its manifest entry."""
+    raw_hash, packed_hash = hashlib.sha256(), hashlib.sha256()
+    size = packed_size = 0
+    comp = _compressor(encoding)
+    with open(src_path, "rb") as src, open(dest_path, "wb") as dst:
+        while True:
+            chunk = src.read(BACKUP_CHUNK)
+            if not chunk:
+                break
+            size += len(chunk)
+            raw_hash.update(chunk)
+            out = comp.compress(chunk) if comp else chunk
+            if out:
+                packed_hash.update(out)
+                packed_size += len(out)
+                dst.write(out)
+        tail = comp.flush() if comp else b""
+        if tail:
+            packed_hash.update(tail)
+            packed_size += len(tail)
+            dst.write(tail)
+    return {
+        "encoding": encoding,
+        "size": size,
+        "sha256": raw_hash.hexdigest(),
+        "compressed_size": packed_size,
+        "compressed_sha256": packed_hash.hexdigest(),
+    }
+
+
+def create_backup(db_path: str, encoding: str = None) -> Tuple[str, Dict[str, Any]]:
+    """Snapshot and compress ``db_path``; return (temp file to upload, manifest entry).
+
+    The caller uploads the file and removes it. Temp files live next to the
+    database, where there is room for a copy of it.
+    """
+    encoding = encoding or default_encoding()
+    workdir = os.path.dirname(os.path.abspath(db_path))
+    fd, snap_path = tempfile.mkstemp(prefix=".snapshot-", suffix=".db", dir=workdir)
+    os.close(fd)
+    fd, packed_path = tempfile.mkstemp(prefix=".backup-", suffix=ENCODINGS[encoding], dir=workdir)
+    os.close(fd)
+    try:
+        snapshot(db_path, snap_path)
+        entry = compress_file(snap_path, packed_path, encoding)
+    except Exception:
+        os.remove(packed_path)
+        raise
+    finally:
+        os.remove(snap_path)
+    entry["file"] = os.path.basename(db_path)
+    return packed_path, entry
+
+
+# --- MANIFEST ---
+def format_manifest(header: str, entries: Dict[str, Dict[str, Any]]) -> str:
+    """Release body: a human header followed by the manifest as a JSON block."""
+    return f"{header}\n\n```json\n{json.dumps(entries, indent=2, sort_keys=True)}\n```\n"
+
+
+def parse_manifest(body: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    """Manifest entries by asset name; empty for releases made before manifests."""
+    match = MANIFEST_RE.search(body or "")
+    if not match:
+        return {}
+    try:
+        return json.loads(match.group(1))
+    except ValueError:
+        logger.warning("Backup release has an unreadable manifest")
+        return {}
+
+
+# --- VALIDATION ---
+def _header_ok(header: bytes, file_size: Optional[int]) -> bool:
+    """SQLite magic present and, when the header's page count is current, the file not short of it."""
+    if len(header) < 100 or header[:16] != SQLITE_HEADER:
+        return False
+    page_size = int.from_bytes(header[16:18], "big")
+    page_size = 65536 if page_size == 1 else page_size
+    change_counter, page_count = int.from_bytes(header[24:28], "big"), int.from_bytes(header[28:32], "big")
+    if file_size is not None and page_count and change_counter == int.from_bytes(header[92:96], "big"):
+        return file_size >= page_count * page_size
+    return True
+
+
+def database_usable(path: str) -> bool:
+    """Cheap startup check: a SQLite file that is not truncated and whose schema reads.
+
+    Catches empty files, non-SQLite files and files cut short by an
+    interrupted copy without scanning the whole database.
+    """
+    try:
+        with open(path, "rb") as fh:
+            header = fh.read(100)
+        # A non-empty WAL may still hold pages the main file lacks after a
+        # crash mid-checkpoint; SQLite recovers that on open, so skip the size test
+        wal_path = path + "-wal"
+        wal_pending = os.path.exists(wal_path) and os.path.getsize(wal_path) > 0
+        if not _header_ok(header, None if wal_pending else os.path.getsize(path)):
+            return False
+        conn = sqlite3.connect(path, timeout=10)
+        try:
+            conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        finally:
+            conn.close()
+        return True
+    except (OSError, sqlite3.Error):
+        return False
+
+
+def check_database(path: str, mode: str = RESTORE_CHECK):
+    """Raise BackupVerificationError unless ``path`` is a SQLite file passing ``PRAGMA <mode>``.
+
+    Opened as immutable: the file is checked as it stands and no -wal/-shm
+    is created next to it.
+    """
+    with open(path, "rb") as fh:
+        header = fh.read(100)
+    if not _header_ok(header, os.path.getsize(path)):
+        raise BackupVerificationError(f"{os.path.basename(path)} is not a complete SQLite database")
+    pragma = "quick_check" if mode == "quick" else "integrity_check"
+    conn = sqlite3.connect(f"file:{path}?immutable=1", uri=True)
+    try:
+        result = conn.execute(f"PRAGMA {pragma}").fetchone()[0]
+    except sqlite3.Error as e:
+        raise BackupVerificationError(f"{os.path.basename(path)} failed {pragma}: {e}")
+    finally:
+        conn.close()
+    if result != "ok":
+        raise BackupVerificationError(f"{os.path.basename(path)} failed {pragma}: {result}")
+
+
+def verify_file(path: str, size: int, sha256: str):
+    """Raise BackupVerificationError unless ``path`` has this size and sha256."""
+    digest = hashlib.sha256()
+    for chunk in file_chunks(path):
+        digest.update(chunk)
+    actual = os.path.getsize(path)
+    if actual != size or digest.hexdigest() != sha256:
+        raise BackupVerificationError(
+            f"{os.path.basename(path)}: got {actual} bytes sha256 {digest.hexdigest()[:12]}, "
+            f"expected {size} bytes sha256 {str(sha256)[:12]}"
+        )
+
+
+def file_chunks(path: str) -> Iterator[bytes]:
+    with open(path, "rb") as fh:
+        while True:
+            chunk = fh.read(BACKUP_CHUNK)
+            if not chunk:
+                return
+            yield chunk
+
+
+# --- DOWNLOAD ---
+def download_resumable(http, url: str, part_path: str, headers: Dict[str, str] = None,
+                       expected_size: int = None, identity: Dict[str, Any] = None,
+                       retries: int = DOWNLOAD_RETRIES) -> int:
+    """Download ``url`` into ``part_path``, resuming with Range requests; returns its size.
+
+    ``http`` is the requests module or a Session. Interrupted transfers are
+    retried from where they stopped, and a ``.part`` left by an earlier run
+    is continued if ``identity`` (e.g. the release asset's id, size and
+    update time) still matches, otherwise started over.
+    """
+    meta_path = part_path + ".json"
+    identity = identity or {"url": url}
+    try:
+        with open(meta_path) as fh:
+            resumable = json.load(fh) == identity
+    except (OSError, ValueError):
+        resumable = False
+    if not resumable:
+        discard_partial(part_path)
+        with open(meta_path, "w") as fh:
+            json.dump(identity, fh)
+
+    for attempt in range(retries + 1):
+        have = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if expected_size is not None and have >= expected_size:
+            if have == expected_size:
+                return have
+            os.remove(part_path)
+            have = 0
+        request_headers = dict(headers or {})
+        if have:
+            request_headers["Range"] = f"bytes={have}-"
+        try:
+            with http.get(url, headers=request_headers, stream=True, timeout=(10, 60)) as r:
+                resumed = r.status_code == 206 and r.headers.get("Content-Range", "").startswith(f"bytes {have}-")
+                if r.status_code == 416 and expected_size is None:
+                    return have
+                if r.status_code not in (200, 206):
+                    raise RuntimeError(f"HTTP {r.status_code}")
+                with open(part_path, "ab" if resumed else "wb") as fh:
+                    for chunk in r.iter_content(BACKUP_CHUNK):
+                        fh.write(chunk)
+            size = os.path.getsize(part_path)
+            if expected_size is None or size == expected_size:
+                return size
+            raise RuntimeError(f"connection closed at {size} of {expected_size} bytes")
+        except Exception as e:
+            if attempt == retries:
+                raise RuntimeError(f"download of {os.path.basename(part_path)} failed: {e}")
+            delay = min(2 ** attempt, 30)
+            logger.warning(f"Download of {os.path.basename(part_path)} interrupted ({e}); resuming in {delay}s")
+            time.sleep(delay)
+
+
+def discard_partial(part_path: str):
+    for path in (part_path, part_path + ".json"):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+# --- RESTORE ---
+def restore_stream(chunks: Iterable[bytes], dest_path: str, encoding: str,
+                   expected: Optional[Dict[str, Any]] = None, check: bool = False) -> int:
+    """Decompress ``chunks`` into ``dest_path`` via a temp file; return bytes written.
+
+    When ``expected`` (a manifest entry) is given, size and sha256 must match
+    before the file replaces ``dest_path``; with ``check`` it must also pass
+    check_database. Otherwise BackupVerificationError is raised and
+    ``dest_path`` is left untouched. A restored database replaces any stale
+    -wal/-shm of ``dest_path``, which would otherwise be replayed into it.
+    """
+    workdir = os.path.dirname(os.path.abspath(dest_path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".restore-", dir=workdir)
+    digest = hashlib.sha256()
+    size = 0
+    decomp = _decompressor(encoding)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in chunks:
+                data = decomp.decompress(chunk) if decomp else chunk
+                if data:
+                    digest.update(data)
+                    size += len(data)
+                    out.write(data)
+            if decomp is not None:
+                tail = decomp.flush()
+                if tail:
+                    digest.update(tail)
+                    size += len(tail)
+                    out.write(tail)
+            out.flush()
+            os.fsync(out.fileno())
+        if expected:
+            if size != expected.get("size") or digest.hexdigest() != expected.get("sha256"):
+                raise BackupVerificationError(
+                    f"{os.path.basename(dest_path)}: got {size} bytes sha256 {digest.hexdigest()[:12]}, "
+                    f"expected {expected.get('size')} bytes sha256 {str(expected.get('sha256'))[:12]}"
+                )
+        if check:
+            check_database(tmp_path)
+            for suffix in ("-wal", "-shm"):
+                if os.path.exists(dest_path + suffix):
+                    os.remove(dest_path + suffix)
+        os.replace(tmp_path, dest_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return size
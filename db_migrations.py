@@ -0,0 +1,679 @@
+"""
+Versioned schema migrations for islamic_library.db.
+
+Both the brain backend (brain.init_db) and the desktop app
+(revanced.IslamicLibraryApp.init_db) run these steps, so the two entry
+points always agree on the shape of the shared tables. Each step runs in its
+own transaction and is recorded in the schema_version table; existing
+databases are upgraded in place.
+
+Usage:
+    python db_migrations.py migrate [--db islamic_library.db]
+    python db_migrations.py rebuild-fts [--db islamic_library.db]
+    python db_migrations.py reconcile-counters [--db islamic_library.db]
+    python db_migrations.py rebuild-rollups [--db islamic_library.db]
+"""
+
+import argparse
+import logging
+import sqlite3
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = "islamic_library.db"
+
+# (version, description, step)
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = []
+
+
+def migration(version: int, description: str):
+    """Register a migration step. Versions must be strictly increasing."""
+    def register(step):
+        if MIGRATIONS and MIGRATIONS[-1][0] >= version:
+            raise ValueError(f"Migration {version} registered out of order")
+        MIGRATIONS.append((version, description, step))
+        return step
+    return register
+
+
+# --- HELPERS ---
+def _columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _add_column(conn: sqlite3.Connection, table: str, column: str, decl: str):
+    """ALTER TABLE ... ADD COLUMN unless the column already exists."""
+    if column not in _columns(conn, table):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def fts5_available(conn: sqlite3.Connection) -> bool:
+    """True if this SQLite build ships the FTS5 extension."""
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp._fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    """Highest applied migration version (0 for an unversioned database)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TEXT
+        )
+    """)
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+# --- MIGRATIONS ---
+@migration(1, "Unified core, desktop and bot tables")
+def _baseline_schema(conn: sqlite3.Connection):
+    # Core library tables (superset of the desktop and brain shapes)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS books (
+            id TEXT PRIMARY KEY,
+            title TEXT NOT NULL,
+            author TEXT,
+            category TEXT,
+            total_copies INTEGER DEFAULT 1,
+            available_copies INTEGER DEFAULT 1,
+            shelf TEXT,
+            row TEXT,
+            area TEXT,
+            added_date TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS members (
+            student_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            batch TEXT,
+            join_date TEXT DEFAULT CURRENT_TIMESTAMP,
+            type TEXT DEFAULT 'student'
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            book_id TEXT,
+            member_id TEXT,
+            issue_date TEXT,
+            due_date TEXT,
+            return_date TEXT,
+            status TEXT DEFAULT 'issued',
+            librarian TEXT,
+            FOREIGN KEY(book_id) REFERENCES books(id),
+            FOREIGN KEY(member_id) REFERENCES members(student_id)
+        )
+    """)
+
+    # Databases first created by brain.py lack the desktop columns.
+    # ADD COLUMN only accepts constant defaults, hence no CURRENT_TIMESTAMP.
+    _add_column(conn, "books", "total_copies", "INTEGER DEFAULT 1")
+    _add_column(conn, "books", "shelf", "TEXT")
+    _add_column(conn, "books", "row", "TEXT")
+    _add_column(conn, "books", "area", "TEXT")
+    _add_column(conn, "books", "added_date", "TEXT")
+    _add_column(conn, "members", "join_date", "TEXT")
+    _add_column(conn, "members", "type", "TEXT DEFAULT 'student'")
+    _add_column(conn, "transactions", "librarian", "TEXT")
+
+    # Desktop tables
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS librarians (
+            username TEXT PRIMARY KEY,
+            password TEXT NOT NULL,
+            full_name TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS attendance (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            librarian_id TEXT NOT NULL,
+            login_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+            logout_time DATETIME,
+            duration REAL,
+            books_issued INTEGER DEFAULT 0,
+            FOREIGN KEY(librarian_id) REFERENCES librarians(username)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ratings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            book_id TEXT NOT NULL,
+            member_id TEXT NOT NULL,
+            rating INTEGER,
+            timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(book_id) REFERENCES books(id),
+            FOREIGN KEY(member_id) REFERENCES members(student_id)
+        )
+    """)
+
+    # Bot user tables
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS bot_users (
+            chat_id INTEGER PRIMARY KEY,
+            name TEXT,
+            username TEXT,
+            role TEXT DEFAULT 'Basic',
+            joined_at TEXT,
+            last_active TEXT,
+            approved_by INTEGER
+        )
+    """)
+    # Audit tables
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS bot_user_actions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            name TEXT,
+            username TEXT,
+            action TEXT,
+            details TEXT,
+            created_at TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS bot_admin_actions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_id INTEGER,
+            action TEXT,
+            target_user_id INTEGER,
+            details TEXT,
+            created_at TEXT
+        )
+    """)
+
+
+@migration(2, "Covering indexes for transaction and audit lookups")
+def _transaction_indexes(conn: sqlite3.Connection):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_book_status ON transactions(book_id, status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_member_return ON transactions(member_id, return_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_due_date ON transactions(due_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bot_user_actions_user_created ON bot_user_actions(user_id, created_at)")
+    conn.execute("ANALYZE")
+
+
+@migration(3, "FTS5 search index over books")
+def _books_fts(conn: sqlite3.Connection):
+    if not fts5_available(conn):
+        logger.warning("SQLite built without FTS5 — /search_book will use LIKE scans")
+        return
+    _create_books_fts(conn)
+    conn.execute("INSERT INTO books_fts(books_fts) VALUES ('rebuild')")
+
+
+def _create_books_fts(conn: sqlite3.Connection):
+    """External-content FTS table over books, kept in sync by triggers."""
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+            title, author, category,
+            content='books', content_rowid='rowid',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts(rowid, title, author, category)
+            VALUES (new.rowid, new.title, new.author, new.category);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts(books_fts, rowid, title, author, category)
+            VALUES ('delete', old.rowid, old.title, old.author, old.category);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF title, author, category ON books BEGIN
+            INSERT INTO books_fts(books_fts, rowid, title, author, category)
+            VALUES ('delete', old.rowid, old.title, old.author, old.category);
+            INSERT INTO books_fts(rowid, title, author, category)
+            VALUES (new.rowid, new.title, new.author, new.category);
+        END
+    """)
+
+
+def rebuild_books_fts(conn: sqlite3.Connection) -> int:
+    """(Re)create the books search index from the books table.
+
+    Needed for databases that predate migration 3 on an FTS5-less build, and
+    after a plain VACUUM, which may renumber the rowids the index points at.
+    Returns the number of indexed books.
+    """
+    if not fts5_available(conn):
+        raise RuntimeError("This SQLite build does not include FTS5")
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _create_books_fts(conn)
+        conn.execute("INSERT INTO books_fts(books_fts) VALUES ('rebuild')")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return conn.execute("SELECT COUNT(*) FROM books").fetchone()[0]
+
+
+@migration(4, "Index for newest-first bot user listing")
+def _bot_users_joined_index(conn: sqlite3.Connection):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bot_users_joined_at ON bot_users(joined_at)")
+
+
+@migration(5, "Indexes for newest-first audit log paging")
+def _audit_created_indexes(conn: sqlite3.Connection):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bot_user_actions_created ON bot_user_actions(created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bot_admin_actions_created ON bot_admin_actions(created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bot_admin_actions_action_created ON bot_admin_actions(action, created_at)")
+
+
+def local_epoch_sql(*modifiers: str) -> str:
+    """Local wall-clock 'now' (plus date modifiers) on the *_ts scale."""
+    mods = "".join(f", '{m}'" for m in modifiers)
+    return f"CAST(strftime('%s', 'now', 'localtime'{mods}) AS INTEGER)"
+
+
+NOW_EPOCH_SQL = local_epoch_sql()
+
+
+def overdue_sql(alias: str = "") -> str:
+    """Condition for an overdue loan, shared by the KPI count and /analytics_overdue."""
+    t = f"{alias}." if alias else ""
+    return f"{t}status = 'issued' AND {t}return_date IS NULL AND {t}due_ts < {NOW_EPOCH_SQL}"
+
+
+def epoch_sql(col: str) -> str:
+    """SQL expression turning a stored date string into seconds since 1970.
+
+    Understands every format the apps have written: 'YYYY-MM-DD hh:mm:ss AM'
+    (desktop issue/return), 'DD-MM-YYYY[...]' (older bot data) and ISO
+    'YYYY-MM-DD[ HH:MM:SS]'. Values are local wall-clock time read as UTC, so
+    compare them with NOW_EPOCH_SQL, not strftime('%s', 'now'). Anything
+    unparseable yields NULL.
+    """
+    ampm = "'[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9] [0-9][0-9]:[0-9][0-9]:[0-9][0-9] [AaPp][Mm]'"
+    dmy = "'[0-9][0-9]-[0-9][0-9]-[0-9][0-9][0-9][0-9]*'"
+    return f"""CAST(strftime('%s', CASE
+        WHEN {col} GLOB {ampm} THEN
+            substr({col}, 1, 11)
+            || printf('%02d', CAST(substr({col}, 12, 2) AS INTEGER) % 12
+                              + CASE WHEN upper(substr({col}, 21, 1)) = 'P' THEN 12 ELSE 0 END)
+            || substr({col}, 14, 6)
+        WHEN {col} GLOB {dmy} THEN
+            substr({col}, 7, 4) || '-' || substr({col}, 4, 2) || '-' || substr({col}, 1, 2) || substr({col}, 11)
+        ELSE {col}
+    END) AS INTEGER)"""
+
+
+@migration(6, "Canonical epoch timestamps on transactions")
+def _transaction_timestamps(conn: sqlite3.Connection):
+    _add_column(conn, "transactions", "issue_ts", "INTEGER")
+    _add_column(conn, "transactions", "due_ts", "INTEGER")
+    _add_column(conn, "transactions", "return_ts", "INTEGER")
+    conn.execute(f"""
+        UPDATE transactions SET
+            issue_ts = {epoch_sql('issue_date')},
+            due_ts = {epoch_sql('due_date')},
+            return_ts = {epoch_sql('return_date')}
+    """)
+    # Both apps keep writing the text columns; the triggers keep the epoch
+    # columns in step whichever app (or an imported .db) wrote the row.
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS transactions_ts_ai AFTER INSERT ON transactions BEGIN
+            UPDATE transactions SET
+                issue_ts = {epoch_sql('new.issue_date')},
+                due_ts = {epoch_sql('new.due_date')},
+                return_ts = {epoch_sql('new.return_date')}
+            WHERE id = new.id;
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS transactions_ts_au
+        AFTER UPDATE OF issue_date, due_date, return_date ON transactions BEGIN
+            UPDATE transactions SET
+                issue_ts = {epoch_sql('new.issue_date')},
+                due_ts = {epoch_sql('new.due_date')},
+                return_ts = {epoch_sql('new.return_date')}
+            WHERE id = new.id;
+        END
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_status_due_ts ON transactions(status, due_ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_issue_ts ON transactions(issue_ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_book_issue_ts ON transactions(book_id, issue_ts)")
+    conn.execute("ANALYZE transactions")
+
+
+# Exact from-scratch value of every trigger-maintained counter.
+COUNTER_QUERIES = {
+    "total_books": "SELECT COUNT(*) FROM books",
+    "available_copies": "SELECT COALESCE(SUM(available_copies), 0) FROM books",
+    "total_members": "SELECT COUNT(*) FROM members",
+    "issued": "SELECT COUNT(*) FROM transactions WHERE status = 'issued'",
+    "active_members": "SELECT COUNT(DISTINCT member_id) FROM transactions",
+}
+
+
+@migration(7, "Trigger-maintained library counters")
+def _library_counters(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS library_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    _create_counter_triggers(conn)
+    _fill_counters(conn)
+
+
+def _create_counter_triggers(conn: sqlite3.Connection):
+    # Comparisons use IS so a NULL status/copies never turns a counter NULL.
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS counters_books_ai AFTER INSERT ON books BEGIN
+            UPDATE library_counters SET value = value + CASE name
+                WHEN 'total_books' THEN 1
+                ELSE COALESCE(new.available_copies, 0) END
+            WHERE name IN ('total_books', 'available_copies');
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS counters_books_ad AFTER DELETE ON books BEGIN
+            UPDATE library_counters SET value = value - CASE name
+                WHEN 'total_books' THEN 1
+                ELSE COALESCE(old.available_copies, 0) END
+            WHERE name IN ('total_books', 'available_copies');
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS counters_books_au AFTER UPDATE OF available_copies ON books
+        WHEN old.available_copies IS NOT new.available_copies BEGIN
+            UPDATE library_counters
+            SET value = value + COALESCE(new.available_copies, 0) - COALESCE(old.available_copies, 0)
+            WHERE name = 'available_copies';
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS counters_members_ai AFTER INSERT ON members BEGIN
+            UPDATE library_counters SET value = value + 1 WHERE name = 'total_members';
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS counters_members_ad AFTER DELETE ON members BEGIN
+            UPDATE library_counters SET value = value - 1 WHERE name = 'total_members';
+        END
+    """)
+    # A member becomes active with their first transaction and inactive when
+    # their last one is deleted; the member_id index keeps the probe cheap.
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS counters_transactions_ai AFTER INSERT ON transactions BEGIN
+            UPDATE library_counters SET value = value + CASE name
+                WHEN 'issued' THEN new.status IS 'issued'
+                ELSE new.member_id IS NOT NULL AND NOT EXISTS (
+                    SELECT 1 FROM transactions WHERE member_id = new.member_id AND id <> new.id) END
+            WHERE name IN ('issued', 'active_members');
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS counters_transactions_ad AFTER DELETE ON transactions BEGIN
+            UPDATE library_counters SET value = value - CASE name
+                WHEN 'issued' THEN old.status IS 'issued'
+                ELSE old.member_id IS NOT NULL AND NOT EXISTS (
+                    SELECT 1 FROM transactions WHERE member_id = old.member_id) END
+            WHERE name IN ('issued', 'active_members');
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS counters_transactions_au_status AFTER UPDATE OF status ON transactions
+        WHEN old.status IS NOT new.status BEGIN
+            UPDATE library_counters
+            SET value = value + (new.status IS 'issued') - (old.status IS 'issued')
+            WHERE name = 'issued';
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS counters_transactions_au_member AFTER UPDATE OF member_id ON transactions
+        WHEN old.member_id IS NOT new.member_id BEGIN
+            UPDATE library_counters SET value = value
+                + (new.member_id IS NOT NULL AND NOT EXISTS (
+                    SELECT 1 FROM transactions WHERE member_id = new.member_id AND id <> new.id))
+                - (old.member_id IS NOT NULL AND NOT EXISTS (
+                    SELECT 1 FROM transactions WHERE member_id = old.member_id))
+            WHERE name = 'active_members';
+        END
+    """)
+
+
+def _fill_counters(conn: sqlite3.Connection) -> Dict[str, Tuple[int, int]]:
+    """Recompute every counter; returns {name: (stored, actual)}."""
+    stored = dict(conn.execute("SELECT name, value FROM library_counters"))
+    result = {}
+    for name, query in COUNTER_QUERIES.items():
+        actual = conn.execute(query).fetchone()[0]
+        conn.execute(
+            "INSERT INTO library_counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+            (name, actual),
+        )
+        result[name] = (stored.get(name), actual)
+    return result
+
+
+def reconcile_counters(conn: sqlite3.Connection) -> Dict[str, Tuple[int, int]]:
+    """Rebuild library_counters from the base tables in one transaction.
+
+    Returns {name: (stored, actual)} so callers can report any drift, e.g.
+    after rows were edited with triggers missing (an older schema_version).
+    """
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _create_counter_triggers(conn)
+        result = _fill_counters(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return result
+
+
+def read_counters(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Dashboard KPIs: the stored counters plus the live overdue count.
+
+    "Overdue" changes with the clock, not with writes, so no trigger can keep
+    it exact; it is counted per read as a (status, due_ts) index range scan.
+    """
+    counters = {name: 0 for name in COUNTER_QUERIES}
+    counters.update(conn.execute("SELECT name, value FROM library_counters"))
+    counters["overdue"] = conn.execute(f"SELECT COUNT(*) FROM transactions WHERE {overdue_sql()}").fetchone()[0]
+    return counters
+
+
+# rollup table -> transactions column it counts
+ISSUE_ROLLUPS = {
+    "book_issue_counts": "book_id",
+    "member_issue_counts": "member_id",
+}
+
+
+@migration(8, "Issue-count rollups for the leaderboards")
+def _issue_rollups(conn: sqlite3.Connection):
+    for table, column in ISSUE_ROLLUPS.items():
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                {column} TEXT PRIMARY KEY NOT NULL,
+                issue_count INTEGER NOT NULL
+            ) WITHOUT ROWID
+        """)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_rank ON {table}(issue_count, {column})")
+        _create_rollup_triggers(conn, table, column)
+        _fill_rollup(conn, table, column)
+
+
+def _create_rollup_triggers(conn: sqlite3.Connection, table: str, column: str):
+    """Keep ``table`` equal to COUNT(*) ... GROUP BY ``column`` over transactions.
+
+    Rows drop out when their count reaches zero, matching the GROUP BY.
+    """
+    bump = f"""
+            INSERT INTO {table} ({column}, issue_count) SELECT new.{column}, 1 WHERE new.{column} IS NOT NULL
+            ON CONFLICT({column}) DO UPDATE SET issue_count = issue_count + 1;"""
+    drop = f"""
+            UPDATE {table} SET issue_count = issue_count - 1 WHERE {column} = old.{column};
+            DELETE FROM {table} WHERE {column} = old.{column} AND issue_count <= 0;"""
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON transactions BEGIN{bump}\n        END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON transactions BEGIN{drop}\n        END")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE OF {column} ON transactions
+        WHEN old.{column} IS NOT new.{column} BEGIN{drop}{bump}
+        END""")
+
+
+def _fill_rollup(conn: sqlite3.Connection, table: str, column: str):
+    conn.execute(f"DELETE FROM {table}")
+    conn.execute(f"""
+        INSERT INTO {table} ({column}, issue_count)
+        SELECT {column}, COUNT(*) FROM transactions WHERE {column} IS NOT NULL GROUP BY {column}
+    """)
+
+
+def rebuild_issue_rollups(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Recompute the issue-count rollups from transactions.
+
+    Returns the number of rows in each rollup table.
+    """
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for table, column in ISSUE_ROLLUPS.items():
+            _create_rollup_triggers(conn, table, column)
+            _fill_rollup(conn, table, column)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in ISSUE_ROLLUPS}
+
+
+# Tables whose writes are tracked in table_versions
+VERSIONED_TABLES = ("books", "members", "transactions")
+
+
+@migration(9, "Per-table write versions for response caching")
+def _table_versions(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS table_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    for table in VERSIONED_TABLES:
+        conn.execute("INSERT OR IGNORE INTO table_versions (name, version) VALUES (?, 0)", (table,))
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS versions_{table}_{event.lower()} AFTER {event} ON {table} BEGIN
+                    UPDATE table_versions SET version = version + 1 WHERE name = '{table}';
+                END
+            """)
+
+
+# table_versions row that no table write touches: bumped to invalidate every
+# cached response and ETag at once, in every process sharing the file.
+ETAG_EPOCH = "etag_epoch"
+
+
+@migration(10, "Shared ETag epoch")
+def _etag_epoch(conn: sqlite3.Connection):
+    conn.execute("INSERT OR IGNORE INTO table_versions (name, version) VALUES (?, 0)", (ETAG_EPOCH,))
+
+
+@migration(11, "NULL-safe keyset index for the bot user listing")
+def _bot_users_joined_key_index(conn: sqlite3.Connection):
+    # /get_bot_users pages on COALESCE(joined_at, ''): a NULL would fail the
+    # cursor's row-value comparison and drop out of cursor pages
+    conn.execute("DROP INDEX IF EXISTS idx_bot_users_joined_at")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bot_users_joined_key ON bot_users(COALESCE(joined_at, ''), chat_id)")
+
+
+def read_table_versions(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Current write version of every tracked table (plus ETAG_EPOCH)."""
+    return dict(conn.execute("SELECT name, version FROM table_versions"))
+
+
+def bump_etag_epoch(conn: sqlite3.Connection):
+    conn.execute("UPDATE table_versions SET version = version + 1 WHERE name = ?", (ETAG_EPOCH,))
+
+
+# --- RUNNER ---
+def run_migrations(conn: sqlite3.Connection) -> int:
+    """Apply every pending migration and return the resulting version.
+
+    Each step runs in its own BEGIN IMMEDIATE transaction, so a second
+    process migrating the same file waits and then sees the step as applied.
+    """
+    if conn.in_transaction:
+        conn.commit()
+    version = current_version(conn)
+    for step_version, description, step in MIGRATIONS:
+        if step_version <= version:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if current_version(conn) >= step_version:
+                conn.rollback()
+                continue
+            step(conn)
+            conn.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                (step_version, description, datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logger.error(f"Migration {step_version} ({description}) failed")
+            raise
+        logger.info(f"Applied migration {step_version}: {description}")
+        version = step_version
+    return version
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Islamic Library database maintenance")
+    parser.add_argument("--db", default=DB_PATH, help="Path to the SQLite database")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("migrate", help="Apply pending schema migrations")
+    sub.add_parser("rebuild-fts", help="Rebuild the books full-text search index")
+    sub.add_parser("reconcile-counters", help="Rebuild library_counters from the base tables")
+    sub.add_parser("rebuild-rollups", help="Rebuild the per-book and per-member issue counts")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    conn = sqlite3.connect(args.db, timeout=10)
+    try:
+        if args.command == "migrate":
+            print(f"Schema version: {run_migrations(conn)}")
+        elif args.command == "rebuild-fts":
+            run_migrations(conn)
+            print(f"Indexed {rebuild_books_fts(conn)} books")
+        elif args.command == "reconcile-counters":
+            run_migrations(conn)
+            for name, (stored, actual) in reconcile_counters(conn).items():
+                note = "" if stored == actual else f" (was {stored})"
+                print(f"{name}: {actual}{note}")
+        elif args.command == "rebuild-rollups":
+            run_migrations(conn)
+            for table, rows in rebuild_issue_rollups(conn).items():
+                print(f"{table}: {rows} rows")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Pooled SQLite connections for the Islamic Library backend.
+
+Connections are opened once with tuned pragmas and a large prepared-statement
+cache, then handed out per thread. A thread keeps the same connection until it
+releases it (the Flask app does this at the end of every request), after which
+the connection goes back to an idle list for the next thread to reuse.
+"""
+
+import os
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Pragmas applied to every new connection. journal_mode=WAL is persistent in
+# the database file; the rest are per-connection settings.
+DEFAULT_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("temp_store", "MEMORY"),
+    ("cache_size", "-8000"),      # ~8 MB page cache per connection
+    ("mmap_size", "67108864"),    # 64 MB memory-mapped reads
+)
+
+
+class ConnectionPool:
+    """Thread-local SQLite connections backed by a bounded idle list."""
+
+    def __init__(
+        self,
+        db_path: str,
+        timeout: float = 10,
+        max_idle: int = 8,
+        cached_statements: int = 256,
+        pragmas=DEFAULT_PRAGMAS,
+    ):
+        self.db_path = db_path
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.cached_statements = cached_statements
+        self.pragmas = pragmas
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._idle: List[sqlite3.Connection] = []
+        self._generation = 0
+        self._conn_generation: Dict[int, int] = {}
+        self._file_id = self._stat_file_id()
+        self._stats = {
+            "opened": 0,
+            "closed": 0,
+            "checkouts": 0,
+            "reused": 0,
+            "in_use": 0,
+        }
+
+    # --- CONNECTION LIFECYCLE ---
+    def _open(self) -> sqlite3.Connection:
+        """Open a new autocommit connection with the pool's pragmas applied."""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=self.cached_statements,
+        )
+        for name, value in self.pragmas:
+            try:
+                conn.execute(f"PRAGMA {name}={value}")
+            except sqlite3.Error as e:
+                logger.warning(f"Could not apply PRAGMA {name}={value}: {e}")
+        with self._lock:
+            self._stats["opened"] += 1
+            self._conn_generation[id(conn)] = self._generation
+        return conn
+
+    def _discard(self, conn: sqlite3.Connection):
+        """Close a connection and forget about it."""
+        with self._lock:
+            self._conn_generation.pop(id(conn), None)
+            self._stats["closed"] += 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _is_stale(self, conn: sqlite3.Connection) -> bool:
+        return self._conn_generation.get(id(conn)) != self._generation
+
+    def connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, checking one out if needed."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and not self._is_stale(conn):
+            return conn
+        if conn is not None:
+            # The database file was replaced since this thread checked out.
+            self._local.conn = None
+            with self._lock:
+                self._stats["in_use"] -= 1
+            self._discard(conn)
+
+        conn = None
+        with self._lock:
+            self._stats["checkouts"] += 1
+            while self._idle:
+                candidate = self._idle.pop()
+                if self._is_stale(candidate):
+                    self._conn_generation.pop(id(candidate), None)
+                    self._stats["closed"] += 1
+                    candidate.close()
+                    continue
+                conn = candidate
+                self._stats["reused"] += 1
+                break
+            self._stats["in_use"] += 1
+        if conn is None:
+            try:
+                conn = self._open()
+            except Exception:
+                with self._lock:
+                    self._stats["in_use"] -= 1
+                raise
+        self._local.conn = conn
+        self._local.pins = 0
+        return conn
+
+    def release(self):
+        """Return this thread's connection to the idle list."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pins", 0) > 0:
+            return
+        self._local.conn = None
+        if conn.in_transaction:
+            # Never hand an open transaction to the next thread.
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                pass
+        with self._lock:
+            self._stats["in_use"] -= 1
+            keep = not self._is_stale(conn) and len(self._idle) < self.max_idle
+            if keep:
+                self._idle.append(conn)
+        if not keep:
+            self._discard(conn)
+
+    @contextmanager
+    def pinned(self):
+        """Keep this thread's connection checked out until the block exits.
+
+        Nested ``release()`` calls (e.g. from inner request teardowns) are
+        ignored while pinned.
+        """
+        conn = self.connection()
+        self._local.pins = getattr(self._local, "pins", 0) + 1
+        try:
+            yield conn
+        finally:
+            self._local.pins -= 1
+            if self._local.pins == 0:
+                self.release()
+
+    @contextmanager
+    def transaction(self, immediate: bool = True):
+        """Run a block in a write transaction on this thread's connection.
+
+        Commits on success and rolls back on error. When a transaction is
+        already open (e.g. inside a batch), a savepoint is used instead.
+        """
+        conn = self.connection()
+        if conn.in_transaction:
+            conn.execute("SAVEPOINT pool_tx")
+            try:
+                yield conn
+            except Exception:
+                conn.execute("ROLLBACK TO pool_tx")
+                conn.execute("RELEASE pool_tx")
+                raise
+            conn.execute("RELEASE pool_tx")
+            return
+
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    def _stat_file_id(self):
+        try:
+            st = os.stat(self.db_path)
+        except OSError:
+            return None
+        return (st.st_dev, st.st_ino)
+
+    @property
+    def file_id(self):
+        """(st_dev, st_ino) of the database file as of the last check_replaced()."""
+        return self._file_id
+
+    def check_replaced(self) -> bool:
+        """Invalidate the pool if the database file was swapped for a new one.
+
+        Lets processes that did not do the swap themselves (e.g. brain's
+        server workers after a bot import) notice it. Returns True if the
+        file changed since the last check.
+        """
+        file_id = self._stat_file_id()
+        with self._lock:
+            if file_id is None or file_id == self._file_id:
+                return False
+            replaced = self._file_id is not None
+            self._file_id = file_id
+        if replaced:
+            self.invalidate()
+        return replaced
+
+    def invalidate(self):
+        """Drop every pooled connection, e.g. after the DB file was replaced.
+
+        Idle connections are closed now; connections held by other threads
+        are closed by their owner on its next checkout.
+        """
+        with self._lock:
+            self._generation += 1
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+        logger.info("Database connection pool invalidated")
+
+    def close_all(self):
+        """Close idle connections and this thread's connection."""
+        self.release()
+        self.invalidate()
+
+    # --- STATS ---
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of pool counters, including the connection reuse rate."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["idle"] = len(self._idle)
+        checkouts = snapshot["checkouts"]
+        snapshot["reuse_rate"] = round(snapshot["reused"] / checkouts, 4) if checkouts else 0.0
+        snapshot["cached_statements"] = self.cached_statements
+        return snapshot
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str, **kwargs) -> ConnectionPool:
+    """Return the process-wide pool for ``db_path``, creating it on first use."""
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = ConnectionPool(db_path, **kwargs)
+            _pools[db_path] = pool
+        return pool
+
+
+def invalidate_pool(db_path: str):
+    """Invalidate the pool for ``db_path`` if one has been created."""
+    with _pools_lock:
+        pool: Optional[ConnectionPool] = _pools.get(db_path)
+    if pool is not None:
+        pool.invalidate()
@@ -0,0 +1,799 @@
+"""
+Continuous WAL shipping and point-in-time restore for islamic_library.db.
+
+The full backup (brain.backup_db_to_github) only runs on demand, so anything
+written since the last one is at risk. The shipper closes that gap cheaply:
+every DB_SHIP_INTERVAL seconds it copies the WAL frames committed since its
+last pass into a small compressed segment and uploads it to a storage target
+(a local directory by default, or GitHub Releases). Only changed pages travel,
+instead of the whole file.
+
+A *generation* is one base snapshot (taken with the online backup API, see
+db_backup) followed by numbered segments. Restoring to a time T takes the
+newest generation whose snapshot is older than T and replays its segments
+observed up to T onto the snapshot, page by page. Restore precision is
+therefore one shipping interval.
+
+Keeping the stream complete means no frame may be overwritten before it is
+shipped. SQLite only reuses the WAL from its start ("restart") once every
+frame is checkpointed and no reader is still using the WAL, so the shipper
+always holds a read transaction, handed over between two connections so it
+is never dropped. Checkpoints by the app can then only copy frames the
+shipper has already seen, and the WAL is only allowed to restart from the
+shipper's own checkpoint, which runs under the write lock after shipping
+everything. A new WAL (new salts) simply continues the stream from frame 0.
+
+Frames are copied only up to the last commit frame whose salts and running
+checksum are valid, exactly as SQLite's own recovery reads the WAL, and the
+restore re-checks the chain and the continuity between segments.
+
+Code that replaces the live database (a bot .db import, a restore from
+GitHub) wraps the swap in ``shipping_paused(db_path)``: running shippers
+ship their tail, drop the read hold and, once the block exits, start a new
+generation from a snapshot of the new content.
+
+Usage:
+    python db_shipper.py run      [--db islamic_library.db] [--storage local|github] [--dir backups/wal]
+    python db_shipper.py list     [--storage ...]
+    python db_shipper.py restore  [--to "2026-01-31 18:00:00"] [--output islamic_library.restored.db]
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import requests
+
+from db_backup import (ENCODINGS, check_database, compress_file, create_backup, default_encoding, encoding_for,
+                       restore_stream)
+
+logger = logging.getLogger(__name__)
+
+DB_SHIP_STORAGE = os.environ.get("DB_SHIP_STORAGE", "local").lower()
+DB_SHIP_DIR = os.environ.get("DB_SHIP_DIR", os.path.join("backups", "wal"))
+DB_SHIP_INTERVAL = float(os.environ.get("DB_SHIP_INTERVAL", 10))
+DB_SHIP_CHECKPOINT_FRAMES = int(os.environ.get("DB_SHIP_CHECKPOINT_FRAMES", 1000))
+DB_SHIP_GENERATION_HOURS = float(os.environ.get("DB_SHIP_GENERATION_HOURS", 24))
+DB_SHIP_MAX_SEGMENTS = int(os.environ.get("DB_SHIP_MAX_SEGMENTS", 900))  # GitHub allows 1000 assets a release
+DB_SHIP_RETAIN_GENERATIONS = int(os.environ.get("DB_SHIP_RETAIN_GENERATIONS", 3))
+DB_SHIP_TAG_PREFIX = "db-wal-"
+GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN", "")
+GITHUB_REPO = os.environ.get("GITHUB_REPO", "Nihal-InCode/library-system")
+
+# --- WAL FORMAT ---
+# Header: magic, version, page size, checkpoint seq, salt-1, salt-2, checksum-1, checksum-2
+WAL_HEADER = struct.Struct(">8I")
+# Frame header: page number, db size in pages (commit frames only, else 0), salts, checksums
+FRAME_HEADER = struct.Struct(">6I")
+WAL_MAGIC = (0x377F0682, 0x377F0683)  # low bit set: checksums use big-endian words
+
+# Segment: magic, the WAL header the frames come from, start frame and running checksum, then frames
+SEGMENT_MAGIC = b"LIBWAL01"
+SEGMENT_HEADER = struct.Struct(">8s32sIII")
+SEGMENT_RE = re.compile(r"^(\d{8})-(\d+)\.wal(\.gz|\.zst)?$")
+SNAPSHOT_META = "snapshot.json"
+
+
+class WalPosition(NamedTuple):
+    """Point in a WAL: its salts, the next frame index and the running checksum there."""
+    salt: Tuple[int, int]
+    index: int
+    cksum: Tuple[int, int]
+
+
+class WalHeader(NamedTuple):
+    raw: bytes
+    page_size: int
+    salt: Tuple[int, int]
+    cksum: Tuple[int, int]
+    big_endian: bool
+
+
+def wal_checksum(data: bytes, s0: int, s1: int, big_endian: bool) -> Tuple[int, int]:
+    """SQLite's WAL checksum over ``data`` (a multiple of 8 bytes), continuing from (s0, s1)."""
+    words = struct.unpack(f"{'>' if big_endian else '<'}{len(data) // 4}I", data)
+    for i in range(0, len(words), 2):
+        s0 = (s0 + words[i] + s1) & 0xFFFFFFFF
+        s1 = (s1 + words[i + 1] + s0) & 0xFFFFFFFF
+    return s0, s1
+
+
+def parse_wal_header(raw: bytes) -> Optional[WalHeader]:
+    """Validated WAL header, or None for a missing/partial/invalid one."""
+    if len(raw) < WAL_HEADER.size:
+        return None
+    magic, _, page_size, _, salt1, salt2, c1, c2 = WAL_HEADER.unpack_from(raw)
+    if magic not in WAL_MAGIC:
+        return None
+    big_endian = bool(magic & 1)
+    if wal_checksum(raw[:24], 0, 0, big_endian) != (c1, c2):
+        return None
+    page_size = 65536 if page_size == 1 else page_size
+    return WalHeader(bytes(raw[:WAL_HEADER.size]), page_size, (salt1, salt2), (c1, c2), big_endian)
+
+
+def read_wal_header(wal_path: str) -> Optional[WalHeader]:
+    try:
+        with open(wal_path, "rb") as fh:
+            return parse_wal_header(fh.read(WAL_HEADER.size))
+    except FileNotFoundError:
+        return None
+
+
+def copy_committed_frames(src, header: WalHeader, start: WalPosition, sink, max_frames: int) -> WalPosition:
+    """Copy valid frames after ``start`` from ``src`` into ``sink``, up to the last commit.
+
+    ``src`` is positioned at frame ``start.index``; at most ``max_frames``
+    are read, so a pass ends even while writers keep appending. Frames of a
+    transaction that is not (yet) committed are written and then cut off
+    again, so ``sink`` never holds a partial transaction. Returns the
+    position after the last commit frame copied.
+    """
+    frame_size = FRAME_HEADER.size + header.page_size
+    committed = start
+    commit_offset = sink.tell()
+    index, cksum = start.index, start.cksum
+    while index - start.index < max_frames:
+        frame = src.read(frame_size)
+        if len(frame) < frame_size:
+            break
+        _, commit, salt1, salt2, c1, c2 = FRAME_HEADER.unpack_from(frame)
+        if (salt1, salt2) != header.salt:
+            break
+        cksum = wal_checksum(frame[:8] + frame[FRAME_HEADER.size:], *cksum, header.big_endian)
+        if cksum != (c1, c2):
+            break
+        sink.write(frame)
+        index += 1
+        if commit:
+            committed = WalPosition(header.salt, index, cksum)
+            commit_offset = sink.tell()
+    sink.seek(commit_offset)
+    sink.truncate()
+    return committed
+
+
+def _file_id(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_dev, st.st_ino
+
+
+def generation_time(generation: str) -> float:
+    return datetime.strptime(generation, "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc).timestamp()
+
+
+def segment_names(names) -> List[Tuple[int, float, str]]:
+    """(sequence, observed-at unix time, name) of the segments among ``names``, in order."""
+    segments = []
+    for name in names:
+        match = SEGMENT_RE.match(name)
+        if match:
+            segments.append((int(match.group(1)), int(match.group(2)) / 1000, name))
+    return sorted(segments)
+
+
+# --- STORAGE ---
+class LocalStorage:
+    """Shipping target in a local directory: <root>/<generation>/<name>."""
+
+    def __init__(self, root: str = DB_SHIP_DIR):
+        self.root = root
+
+    def generations(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(g for g in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, g)))
+
+    def names(self, generation: str) -> List[str]:
+        return sorted(n for n in os.listdir(os.path.join(self.root, generation)) if not n.startswith("."))
+
+    def put(self, generation: str, name: str, fh, size: int):
+        directory = os.path.join(self.root, generation)
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = os.path.join(directory, f".{name}.part")
+        with open(tmp_path, "wb") as out:
+            shutil.copyfileobj(fh, out, 1024 * 1024)
+        os.replace(tmp_path, os.path.join(directory, name))
+
+    def get(self, generation: str, name: str) -> Iterator[bytes]:
+        with open(os.path.join(self.root, generation, name), "rb") as fh:
+            while True:
+                chunk = fh.read(1024 * 1024)
+                if not chunk:
+                    return
+                yield chunk
+
+    def delete(self, generation: str):
+        shutil.rmtree(os.path.join(self.root, generation), ignore_errors=True)
+
+
+class GitHubReleaseStorage:
+    """Shipping target in GitHub Releases: one prerelease per generation, segments as assets."""
+
+    def __init__(self, repo: str = GITHUB_REPO, token: str = GITHUB_TOKEN, tag_prefix: str = DB_SHIP_TAG_PREFIX):
+        self.api = f"https://api.github.com/repos/{repo}"
+        self.tag_prefix = tag_prefix
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"token {token}",
+            "Accept": "application/vnd.github.v3+json",
+        })
+        self._releases: Dict[str, Dict[str, Any]] = {}
+
+    def _paged(self, url: str) -> Iterator[Dict[str, Any]]:
+        page = 1
+        while True:
+            r = self.session.get(url, params={"per_page": 100, "page": page}, timeout=30)
+            r.raise_for_status()
+            items = r.json()
+            if not items:
+                return
+            yield from items
+            page += 1
+
+    def _release(self, generation: str, create: bool = False) -> Dict[str, Any]:
+        if generation in self._releases:
+            return self._releases[generation]
+        tag = self.tag_prefix + generation
+        r = self.session.get(f"{self.api}/releases/tags/{tag}", timeout=30)
+        if r.status_code == 404 and create:
+            r = self.session.post(f"{self.api}/releases", json={
+                "tag_name": tag,
+                "name": f"DB WAL {generation}",
+                "body": "Base snapshot and WAL segments shipped by db_shipper.py",
+                "prerelease": True,
+            }, timeout=30)
+        r.raise_for_status()
+        self._releases[generation] = r.json()
+        return self._releases[generation]
+
+    def generations(self) -> List[str]:
+        return sorted(rel["tag_name"][len(self.tag_prefix):] for rel in self._paged(f"{self.api}/releases")
+                      if rel["tag_name"].startswith(self.tag_prefix))
+
+    def _assets(self, generation: str) -> Dict[str, Dict[str, Any]]:
+        release = self._release(generation)
+        return {a["name"]: a for a in self._paged(f"{self.api}/releases/{release['id']}/assets")}
+
+    def names(self, generation: str) -> List[str]:
+        return sorted(self._assets(generation))
+
+    def put(self, generation: str, name: str, fh, size: int):
+        upload_url = self._release(generation, create=True)["upload_url"].replace("{?name,label}", "")
+        r = self.session.post(upload_url, params={"name": name}, data=fh, timeout=120, headers={
+            "Content-Type": "application/octet-stream",
+            "Content-Length": str(size),
+        })
+        r.raise_for_status()
+
+    def get(self, generation: str, name: str) -> Iterator[bytes]:
+        asset = self._assets(generation)[name]
+        with self.session.get(f"{self.api}/releases/assets/{asset['id']}", stream=True, timeout=120,
+                              headers={"Accept": "application/octet-stream"}) as r:
+            r.raise_for_status()
+            yield from r.iter_content(1024 * 1024)
+
+    def delete(self, generation: str):
+        release = self._release(generation)
+        self.session.delete(f"{self.api}/releases/{release['id']}", timeout=30)
+        self.session.delete(f"{self.api}/git/refs/tags/{self.tag_prefix}{generation}", timeout=30)
+        self._releases.pop(generation, None)
+
+
+def storage_from_env(kind: str = DB_SHIP_STORAGE, directory: str = DB_SHIP_DIR):
+    """Storage target named by DB_SHIP_STORAGE ("local", "github" or "off" -> None)."""
+    if kind == "off":
+        return None
+    if kind == "github":
+        if not GITHUB_TOKEN:
+            raise RuntimeError("DB_SHIP_STORAGE=github needs GITHUB_TOKEN")
+        return GitHubReleaseStorage()
+    if kind == "local":
+        return LocalStorage(directory)
+    raise ValueError(f"Unknown DB_SHIP_STORAGE: {kind}")
+
+
+def _put_file(storage, generation: str, name: str, path: str):
+    with open(path, "rb") as fh:
+        storage.put(generation, name, fh, os.path.getsize(path))
+
+
+# --- SHIPPER ---
+class WalShipper:
+    """Ships committed WAL frames of one database to a storage target."""
+
+    def __init__(self, db_path: str, storage, checkpoint_frames: int = DB_SHIP_CHECKPOINT_FRAMES,
+                 generation_hours: float = DB_SHIP_GENERATION_HOURS, max_segments: int = DB_SHIP_MAX_SEGMENTS,
+                 retain_generations: int = DB_SHIP_RETAIN_GENERATIONS):
+        self.db_path = db_path
+        self.wal_path = db_path + "-wal"
+        self.storage = storage
+        self.checkpoint_frames = checkpoint_frames
+        self.generation_seconds = generation_hours * 3600
+        self.max_segments = max_segments
+        self.retain_generations = retain_generations
+        self.encoding = default_encoding()
+
+        self._conns: List[sqlite3.Connection] = []
+        self._hold: Optional[sqlite3.Connection] = None  # connection holding the read transaction
+        self._file_id = None
+        self._generation: Optional[str] = None
+        self._generation_started = 0.0
+        self._seq = 0
+        self._position: Optional[WalPosition] = None
+        # Open segment: (raw temp file, its start position, last read time)
+        self._segment = None
+        self._pending: List[Tuple[str, str, str]] = []  # (generation, name, temp path) awaiting upload
+        self._stats = {"generations": 0, "segments": 0, "frames": 0, "bytes_shipped": 0,
+                       "checkpoints": 0, "last_sync": None}
+        # sync() runs on the shipping thread, pause()/resume() on whoever swaps the file
+        self._lock = threading.RLock()
+        self._pauses = 0
+        self._needs_generation = False  # set by pause(): the content may be replaced
+
+    # --- CONNECTIONS / READ HOLD ---
+    def _open(self):
+        self._close_connections()
+        self._conns = [sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+                       for _ in range(3)]
+        mode = self._conns[0].execute("PRAGMA journal_mode").fetchone()[0]
+        if mode.lower() != "wal":
+            raise RuntimeError(f"{self.db_path} is in {mode} mode; WAL shipping needs journal_mode=WAL")
+        self._file_id = _file_id(self.db_path)
+        self._hold = self._conns[0]
+        self._begin_read(self._hold)
+
+    def _close_connections(self):
+        for conn in self._conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._conns, self._hold = [], None
+
+    @staticmethod
+    def _begin_read(conn: sqlite3.Connection):
+        conn.execute("BEGIN")
+        conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+
+    @staticmethod
+    def _end_read(conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.execute("COMMIT")
+
+    def _hand_over_hold(self):
+        """Move the read hold to the other connection without ever dropping it."""
+        old = self._hold
+        new = self._conns[1] if old is self._conns[0] else self._conns[0]
+        self._begin_read(new)
+        self._hold = new
+        # Frames committed before the new hold began may be checkpointed (and the
+        # WAL restarted) once the old hold goes, so they are shipped first.
+        self._ship()
+        self._end_read(old)
+
+    # --- SEGMENTS ---
+    def _ship(self) -> int:
+        """Copy frames committed since the last call into the open segment."""
+        header = read_wal_header(self.wal_path)
+        if header is None:
+            return 0
+        if self._position is None or self._position.salt != header.salt:
+            # First pass of a generation, or the WAL was restarted after our checkpoint
+            self._close_segment()
+            start = WalPosition(header.salt, 0, header.cksum)
+        else:
+            start = self._position
+        if self._segment is None:
+            fd, raw_path = tempfile.mkstemp(prefix=".segment-", dir=os.path.dirname(os.path.abspath(self.db_path)))
+            fh = os.fdopen(fd, "w+b")
+            fh.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, header.raw, start.index, *start.cksum))
+            self._segment = [fh, raw_path, start, 0.0]
+
+        frame_size = FRAME_HEADER.size + header.page_size
+        with open(self.wal_path, "rb") as src:
+            available = (os.fstat(src.fileno()).st_size - WAL_HEADER.size) // frame_size - start.index
+            src.seek(WAL_HEADER.size + start.index * frame_size)
+            end = copy_committed_frames(src, header, start, self._segment[0], available)
+        frames = end.index - start.index
+        if frames:
+            self._position = end
+            self._segment[3] = time.time()
+            self._stats["frames"] += frames
+        elif self._position is None:
+            self._position = start
+        return frames
+
+    def _close_segment(self):
+        """Compress the open segment and queue it for upload (dropped if empty)."""
+        if self._segment is None:
+            return
+        fh, raw_path, start, observed_at = self._segment
+        self._segment = None
+        empty = fh.tell() <= SEGMENT_HEADER.size
+        fh.close()
+        try:
+            if empty:
+                return
+            name = f"{self._seq:08d}-{int(observed_at * 1000)}.wal{ENCODINGS[self.encoding]}"
+            packed_path = raw_path + ENCODINGS[self.encoding]
+            compress_file(raw_path, packed_path, self.encoding)
+            self._pending.append((self._generation, name, packed_path))
+            self._seq += 1
+        finally:
+            os.remove(raw_path)
+
+    def _upload_pending(self):
+        """Upload queued segments in order; stops at the first failure and retries next sync."""
+        while self._pending:
+            generation, name, path = self._pending[0]
+            size = os.path.getsize(path)
+            _put_file(self.storage, generation, name, path)
+            self._pending.pop(0)
+            os.remove(path)
+            self._stats["segments"] += 1
+            self._stats["bytes_shipped"] += size
+
+    # --- CHECKPOINT ---
+    def _checkpoint(self):
+        """Checkpoint with everything shipped, so the WAL can restart without losing frames.
+
+        Writers are held off with BEGIN IMMEDIATE while the remaining frames
+        are shipped and the checkpoint runs; the read hold is re-taken before
+        they are let go.
+        """
+        writer, spare = self._conns[2], (self._conns[1] if self._hold is self._conns[0] else self._conns[0])
+        writer.execute("BEGIN IMMEDIATE")
+        try:
+            self._ship()
+            self._end_read(self._hold)
+            try:
+                busy, log_frames, checkpointed = spare.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+            finally:
+                self._begin_read(self._hold)
+        finally:
+            writer.execute("ROLLBACK")
+        self._stats["checkpoints"] += 1
+        logger.debug(f"WAL checkpoint: {checkpointed}/{log_frames} frames (busy={busy})")
+
+    # --- GENERATIONS ---
+    def start_generation(self):
+        """Upload a fresh base snapshot and start numbering segments from 0."""
+        self._close_segment()
+        self._upload_pending()
+        self._open()
+
+        generation = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        if generation == self._generation:
+            time.sleep(1)
+            generation = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        created_at = time.time()
+        packed_path, entry = create_backup(self.db_path, self.encoding)
+        try:
+            _put_file(self.storage, generation, f"snapshot.db{ENCODINGS[entry['encoding']]}", packed_path)
+        finally:
+            os.remove(packed_path)
+        meta = json.dumps(dict(entry, created_at=created_at), indent=2).encode("utf-8")
+        self.storage.put(generation, SNAPSHOT_META, io.BytesIO(meta), len(meta))
+
+        self._generation, self._generation_started = generation, time.monotonic()
+        self._seq, self._position = 0, None
+        self._needs_generation = False
+        self._stats["generations"] += 1
+        logger.info(f"WAL shipping: generation {generation} started ({entry['compressed_size']} byte snapshot)")
+        self._prune()
+
+    def _generation_due(self) -> bool:
+        return (self._generation is None
+                or self._needs_generation
+                or _file_id(self.db_path) != self._file_id
+                or time.monotonic() - self._generation_started >= self.generation_seconds
+                or self._seq >= self.max_segments)
+
+    def _prune(self):
+        for generation in self.storage.generations()[:-self.retain_generations or None]:
+            if generation != self._generation:
+                self.storage.delete(generation)
+                logger.info(f"WAL shipping: pruned generation {generation}")
+
+    # --- PUBLIC ---
+    def sync(self) -> int:
+        """One shipping pass; returns the number of frames shipped (0 while paused)."""
+        with self._lock:
+            if self._pauses:
+                return 0
+            if self._generation_due():
+                self.start_generation()
+            before = self._stats["frames"]
+            self._ship()
+            self._hand_over_hold()
+            if self._position and self._position.index >= self.checkpoint_frames:
+                self._checkpoint()
+            self._close_segment()
+            self._upload_pending()
+            self._stats["last_sync"] = datetime.now().isoformat(timespec="seconds")
+            return self._stats["frames"] - before
+
+    def close(self):
+        """Ship what is left and release the read hold."""
+        with self._lock:
+            try:
+                if (self._generation is not None and not self._needs_generation
+                        and _file_id(self.db_path) == self._file_id):
+                    self._ship()
+                self._close_segment()
+                self._upload_pending()
+            finally:
+                self._close_connections()
+
+    def pause(self):
+        """Ship what is left and let go of the database until resume().
+
+        For code about to replace the database content: the shipper's read
+        hold would otherwise pin the old WAL. Calls nest.
+        """
+        with self._lock:
+            self._pauses += 1
+            if self._pauses == 1:
+                try:
+                    self.close()
+                except Exception as e:
+                    logger.error(f"WAL shipping: could not ship the tail before pausing: {e}")
+                # Whatever is written from now on belongs to a new generation
+                self._needs_generation = True
+
+    def resume(self):
+        """Undo pause(); the next sync starts a new generation from a fresh snapshot."""
+        with self._lock:
+            self._pauses -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._stats, generation=self._generation, pending_uploads=len(self._pending),
+                    position=self._position.index if self._position else None)
+
+
+# Shippers running in this process (see shipping_paused)
+_running: List[WalShipper] = []
+_running_lock = threading.Lock()
+
+
+def run_shipper(db_path: str, storage=None, interval: float = DB_SHIP_INTERVAL, stop: threading.Event = None):
+    """Ship ``db_path`` every ``interval`` seconds until ``stop`` is set."""
+    storage = storage or storage_from_env()
+    stop = stop or threading.Event()
+    shipper = WalShipper(db_path, storage)
+    with _running_lock:
+        _running.append(shipper)
+    try:
+        while not stop.is_set():
+            try:
+                shipper.sync()
+            except Exception as e:
+                logger.error(f"WAL shipping pass failed: {e}")
+            stop.wait(interval)
+    finally:
+        with _running_lock:
+            _running.remove(shipper)
+        shipper.close()
+
+
+@contextmanager
+def shipping_paused(db_path: str):
+    """Pause every shipper of ``db_path`` in this process for the duration of the block.
+
+    Wrap anything that imports or restores over the live database. The
+    shippers release their connections first and, afterwards, start a new
+    generation from a fresh base snapshot of whatever the file now holds.
+    """
+    target = os.path.abspath(db_path)
+    with _running_lock:
+        shippers = [s for s in _running if os.path.abspath(s.db_path) == target]
+    paused = []
+    try:
+        for shipper in shippers:
+            shipper.pause()
+            paused.append(shipper)
+        yield
+    finally:
+        for shipper in paused:
+            shipper.resume()
+
+
+# --- RESTORE ---
+class SegmentGap(Exception):
+    """A segment does not continue where the previous one ended."""
+
+
+def _read_segment(path: str, previous: Optional[WalPosition]):
+    """Verify a segment file; returns (header, frames as (offset, pgno, commit), end position)."""
+    with open(path, "rb") as fh:
+        magic, raw_header, index, c1, c2 = SEGMENT_HEADER.unpack(fh.read(SEGMENT_HEADER.size))
+        header = parse_wal_header(raw_header)
+        if magic != SEGMENT_MAGIC or header is None:
+            raise ValueError(f"{os.path.basename(path)} is not a WAL segment")
+        start = WalPosition(header.salt, index, (c1, c2))
+        continues = previous is not None and previous.salt == header.salt and previous == start
+        fresh_wal = (previous is None or previous.salt != header.salt) and index == 0 and start.cksum == header.cksum
+        if not (continues or fresh_wal):
+            raise SegmentGap(f"expected to continue at frame {previous.index if previous else 0}, "
+                             f"segment starts at frame {index}")
+        frame_size = FRAME_HEADER.size + header.page_size
+        frames, cksum, end = [], start.cksum, start
+        while True:
+            offset = fh.tell()
+            frame = fh.read(frame_size)
+            if not frame:
+                break
+            if len(frame) < frame_size:
+                raise ValueError(f"{os.path.basename(path)}: truncated frame at {offset}")
+            pgno, commit, salt1, salt2, f1, f2 = FRAME_HEADER.unpack_from(frame)
+            cksum = wal_checksum(frame[:8] + frame[FRAME_HEADER.size:], *cksum, header.big_endian)
+            if (salt1, salt2) != header.salt or cksum != (f1, f2):
+                raise ValueError(f"{os.path.basename(path)}: bad frame at {offset}")
+            frames.append((offset, pgno, commit))
+            if commit:
+                end = WalPosition(header.salt, index + len(frames), cksum)
+        if frames and not frames[-1][2]:
+            raise ValueError(f"{os.path.basename(path)} ends inside a transaction")
+    return header, frames, end
+
+
+def _apply_segment(path: str, frames, page_size: int, db_fh) -> int:
+    """Write the verified frames of a segment into the database file; returns the db size in pages."""
+    db_pages = 0
+    with open(path, "rb") as fh:
+        for offset, pgno, commit in frames:
+            fh.seek(offset + FRAME_HEADER.size)
+            db_fh.seek((pgno - 1) * page_size)
+            db_fh.write(fh.read(page_size))
+            if commit:
+                db_pages = commit
+    return db_pages
+
+
+def list_generations(storage) -> List[Dict[str, Any]]:
+    result = []
+    for generation in storage.generations():
+        segments = segment_names(storage.names(generation))
+        result.append({
+            "generation": generation,
+            "snapshot_at": generation_time(generation),
+            "segments": len(segments),
+            "last_segment_at": segments[-1][1] if segments else None,
+        })
+    return result
+
+
+def restore(storage, output: str, target_time: float = None) -> Dict[str, Any]:
+    """Rebuild the database as of ``target_time`` (unix seconds, default: latest) into ``output``.
+
+    Uses the newest generation whose snapshot is not newer than the target and
+    replays its segments observed up to it. A gap or damaged segment stops the
+    replay there (the result is still consistent, just older) and is reported.
+    """
+    target_time = target_time if target_time is not None else time.time()
+    candidates = [g for g in storage.generations() if generation_time(g) <= target_time]
+    if not candidates:
+        raise RuntimeError("No shipped generation is older than the requested time")
+    generation = candidates[-1]
+    names = storage.names(generation)
+    meta = json.loads(b"".join(storage.get(generation, SNAPSHOT_META)))
+    snapshot_name = next(n for n in names if n.startswith("snapshot.db"))
+
+    workdir = os.path.dirname(os.path.abspath(output))
+    fd, tmp_path = tempfile.mkstemp(prefix=".pitr-", suffix=".db", dir=workdir)
+    os.close(fd)
+    report = {"generation": generation, "segments_applied": 0, "frames_applied": 0,
+              "restored_to": meta["created_at"], "stopped_early": None}
+    try:
+        restore_stream(storage.get(generation, snapshot_name), tmp_path, encoding_for(snapshot_name), meta)
+        with open(tmp_path, "rb") as fh:
+            page_size = struct.unpack(">H", fh.read(18)[16:18])[0]
+        page_size = 65536 if page_size == 1 else page_size
+
+        previous, db_pages = None, None
+        with open(tmp_path, "r+b") as db_fh:
+            for seq, observed_at, name in segment_names(names):
+                if observed_at > target_time:
+                    break
+                fd, seg_path = tempfile.mkstemp(prefix=".seg-", dir=workdir)
+                os.close(fd)
+                try:
+                    restore_stream(storage.get(generation, name), seg_path, encoding_for(name))
+                    header, frames, end = _read_segment(seg_path, previous)
+                    if header.page_size != page_size:
+                        raise ValueError(f"{name}: page size {header.page_size} != {page_size}")
+                    pages = _apply_segment(seg_path, frames, page_size, db_fh)
+                except (SegmentGap, ValueError) as e:
+                    report["stopped_early"] = f"{name}: {e}"
+                    logger.error(f"PITR: stopping replay at {name}: {e}")
+                    break
+                finally:
+                    os.remove(seg_path)
+                previous, db_pages = end, pages or db_pages
+                report["segments_applied"] += 1
+                report["frames_applied"] += len(frames)
+                report["restored_to"] = observed_at
+            if db_pages:
+                db_fh.truncate(db_pages * page_size)
+            db_fh.flush()
+            os.fsync(db_fh.fileno())
+
+        check_database(tmp_path)
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(output + suffix):
+                os.remove(output + suffix)
+        os.replace(tmp_path, output)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return report
+
+
+def _parse_time(value: str) -> float:
+    """Unix seconds, or an ISO date/time (local time unless it carries an offset)."""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def _fmt(ts: Optional[float]) -> str:
+    return datetime.fromtimestamp(ts).isoformat(sep=" ", timespec="seconds") if ts else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("run", "Ship WAL frames continuously"),
+                            ("list", "List shipped generations"),
+                            ("restore", "Rebuild the database as of a point in time")):
+        cmd = sub.add_parser(name, help=help_text)
+        cmd.add_argument("--storage", default=DB_SHIP_STORAGE if DB_SHIP_STORAGE != "off" else "local",
+                         choices=("local", "github"))
+        cmd.add_argument("--dir", default=DB_SHIP_DIR, help="Directory for --storage local")
+        if name == "run":
+            cmd.add_argument("--db", default="islamic_library.db")
+            cmd.add_argument("--interval", type=float, default=DB_SHIP_INTERVAL)
+        if name == "restore":
+            cmd.add_argument("--to", help="Point in time: ISO local time or unix seconds (default: latest)")
+            cmd.add_argument("--output", default="islamic_library.restored.db")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    storage = storage_from_env(args.storage, args.dir)
+    if args.command == "run":
+        try:
+            run_shipper(args.db, storage, args.interval)
+        except KeyboardInterrupt:
+            pass
+    elif args.command == "list":
+        for g in list_generations(storage):
+            print(f"{g['generation']}  snapshot {_fmt(g['snapshot_at'])}  "
+                  f"{g['segments']} segments, last {_fmt(g['last_segment_at'])}")
+    else:
+        report = restore(storage, args.output, _parse_time(args.to) if args.to else None)
+        print(f"Restored {args.output} from generation {report['generation']}: "
+              f"{report['segments_applied']} segments, {report['frames_applied']} frames, "
+              f"state as of {_fmt(report['restored_to'])}")
+        if report["stopped_early"]:
+            print(f"Replay stopped early: {report['stopped_early']}")
+
+
+if __name__ == "__main__":
+    main()
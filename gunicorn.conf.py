@@ -0,0 +1,47 @@
+"""
+Gunicorn settings for the brain backend (``gunicorn -c gunicorn.conf.py brain:app``).
+
+start.py launches this automatically when BRAIN_SERVER is "gunicorn" (the
+default where gunicorn is installed). Tunables come from the environment:
+
+    PORT                 listen port (default 5000)
+    BRAIN_WORKERS        worker processes (default 2)
+    BRAIN_THREADS        threads per worker (default 4)
+    BRAIN_TIMEOUT        seconds before a stuck worker is killed (default 60)
+    BRAIN_MAX_REQUESTS   recycle a worker after this many requests (default 2000)
+
+Send SIGHUP to the master for a graceful reload: new workers start, old ones
+finish their in-flight requests (up to graceful_timeout) and exit.
+"""
+
+import os
+
+bind = f"0.0.0.0:{int(os.environ.get('PORT', 5000))}"
+workers = int(os.environ.get("BRAIN_WORKERS", 2))
+threads = int(os.environ.get("BRAIN_THREADS", 4))
+worker_class = "gthread"
+
+timeout = int(os.environ.get("BRAIN_TIMEOUT", 60))
+graceful_timeout = 30
+keepalive = 5
+max_requests = int(os.environ.get("BRAIN_MAX_REQUESTS", 2000))
+max_requests_jitter = max_requests // 10
+
+# The app is loaded in each worker after fork, and on_starting closes the
+# master's connections, so no SQLite connection is carried across fork.
+preload_app = False
+accesslog = None
+errorlog = "-"
+loglevel = os.environ.get("BRAIN_LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    """Prepare the database once, in the master, before any worker starts."""
+    if os.environ.get("BRAIN_DB_READY") == "1":
+        return  # start.py already restored and migrated it
+    from brain import db_pool, init_db, restore_db_from_github
+
+    restore_db_from_github()
+    init_db()
+    # Workers fork from this process; don't hand them open connections.
+    db_pool.close_all()
@@ -0,0 +1,204 @@
+"""
+Resized student photo variants, generated once and kept on disk.
+
+images/ holds full-resolution originals (1600px, ~300 KB each). Clients
+rarely need that: the bot uploads a profile-sized picture and list views
+want thumbnails. PhotoCache renders each variant on first request (or
+ahead of time with ``python photo_cache.py warm``) into images/cache/variants
+and serves the stored file from then on.
+
+Variant files carry the source photo's version (mtime + size) in their
+name, so replacing an original makes its old variants unreachable; they
+are deleted the next time that variant is rendered.
+
+Pillow is optional. Without it every variant falls back to the original
+file.
+
+Usage:
+    python photo_cache.py warm [--images images] [--variants thumb,profile]
+"""
+
+import argparse
+import glob
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Tuple
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; originals are served instead
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+SOURCE_EXTS = (".jpg", ".png", ".JPG", ".PNG")
+# name -> (max edge in px, square crop)
+PHOTO_VARIANTS = {
+    "thumb": (160, True),
+    "profile": (640, False),
+    "full": (1280, False),
+}
+JPEG_QUALITY = 82
+
+
+def source_version(st: os.stat_result) -> str:
+    """Short token that changes whenever the source file is replaced."""
+    return f"{st.st_mtime_ns:x}{st.st_size:x}"
+
+
+class PhotoCache:
+    """On-disk cache of resized JPEG variants of the photos in ``images_dir``."""
+
+    def __init__(self, images_dir: str, cache_dir: str = None, variants=PHOTO_VARIANTS):
+        self.images_dir = images_dir
+        self.cache_dir = cache_dir or os.path.join(images_dir, "cache", "variants")
+        self.variants = variants
+
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._stats = {
+            "hits": 0,
+            "renders": 0,
+            "render_ms": 0.0,
+            "fallbacks": 0,
+            "errors": 0,
+        }
+
+    # --- LOOKUP ---
+    def find_source(self, student_id: str) -> Tuple[str, os.stat_result]:
+        """Path and stat of a student's original photo, or (None, None)."""
+        if not re.fullmatch(r"[\w-]+", student_id or ""):
+            return None, None
+        for ext in SOURCE_EXTS:
+            path = os.path.join(self.images_dir, f"{student_id}{ext}")
+            try:
+                return path, os.stat(path)
+            except OSError:
+                continue
+        return None, None
+
+    def variant_path(self, student_id: str, variant: str, version: str) -> str:
+        return os.path.join(self.cache_dir, f"{student_id}_{variant}_{version}.jpg")
+
+    def get(self, student_id: str, variant: str) -> Tuple[str, str]:
+        """(path, version) of the requested variant, rendering it if needed.
+
+        ``variant`` is a PHOTO_VARIANTS name or "original". Returns
+        (None, None) when the student has no photo. If the variant cannot be
+        rendered (no Pillow, unreadable image) the original is returned.
+        """
+        if variant != "original" and variant not in self.variants:
+            raise ValueError(f"Unknown photo variant: {variant}")
+        source, st = self.find_source(student_id)
+        if not source:
+            return None, None
+        version = source_version(st)
+        if variant == "original":
+            return source, version
+
+        target = self.variant_path(student_id, variant, version)
+        if os.path.exists(target):
+            self._count("hits")
+            return target, version
+        if Image is None:
+            self._count("fallbacks")
+            return source, version
+
+        with self._key_lock(student_id, variant):
+            if not os.path.exists(target):
+                try:
+                    self._render(source, target, *self.variants[variant])
+                except Exception as e:
+                    logger.error(f"Could not render {variant} photo for {student_id}: {e}")
+                    self._count("errors")
+                    return source, version
+                self._remove_stale(student_id, variant, target)
+        return target, version
+
+    # --- RENDERING ---
+    def _key_lock(self, student_id: str, variant: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault((student_id, variant), threading.Lock())
+
+    def _render(self, source: str, target: str, edge: int, square: bool):
+        """Resize ``source`` into a JPEG at ``target`` (written atomically)."""
+        start = time.perf_counter()
+        with Image.open(source) as img:
+            img = ImageOps.exif_transpose(img)
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            if square:
+                img = ImageOps.fit(img, (edge, edge), Image.Resampling.LANCZOS)
+            else:
+                img.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    img.save(f, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+                os.replace(tmp, target)
+            except Exception:
+                os.unlink(tmp)
+                raise
+        with self._lock:
+            self._stats["renders"] += 1
+            self._stats["render_ms"] += (time.perf_counter() - start) * 1000
+
+    def _remove_stale(self, student_id: str, variant: str, keep: str):
+        """Delete variants rendered from earlier versions of the source."""
+        for path in glob.glob(os.path.join(self.cache_dir, f"{glob.escape(student_id)}_{variant}_*.jpg")):
+            if path != keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def warm(self, variants=None) -> int:
+        """Render every missing variant for every photo; returns the count rendered."""
+        before = self._stats["renders"]
+        names = variants or list(self.variants)
+        for entry in sorted(os.listdir(self.images_dir)):
+            student_id, ext = os.path.splitext(entry)
+            if ext not in SOURCE_EXTS:
+                continue
+            for variant in names:
+                self.get(student_id, variant)
+        return self._stats["renders"] - before
+
+    # --- STATS ---
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of cache counters."""
+        with self._lock:
+            snapshot = dict(self._stats)
+        snapshot["render_ms"] = round(snapshot["render_ms"], 1)
+        snapshot["pillow"] = Image is not None
+        return snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    warm = sub.add_parser("warm", help="Render all missing photo variants")
+    warm.add_argument("--images", default="images")
+    warm.add_argument("--variants", help="Comma-separated subset of " + ",".join(PHOTO_VARIANTS))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if Image is None:
+        parser.error("Pillow is not installed; nothing to render")
+    cache = PhotoCache(args.images)
+    start = time.perf_counter()
+    rendered = cache.warm(args.variants.split(",") if args.variants else None)
+    print(f"Rendered {rendered} variants in {time.perf_counter() - start:.1f}s into {cache.cache_dir}")
+
+
+if __name__ == "__main__":
+    main()
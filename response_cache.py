@@ -0,0 +1,83 @@
+"""
+In-process response cache for the brain's read endpoints.
+
+Entries are bounded by count (LRU) and age (TTL) and are tagged with the
+versions of the tables they were built from. The versions live in the
+table_versions table and are bumped by triggers (see db_migrations), so a
+write from any process, the desktop app included, makes the affected
+entries stale on their next lookup while entries built from other tables
+keep serving.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class ResponseCache:
+    """Thread-safe LRU + TTL cache validated against table versions."""
+
+    def __init__(self, max_entries: int = 512, ttl: float = 60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        # key -> (expires_at, versions, value)
+        self._entries: "OrderedDict[Hashable, Tuple[float, Tuple, Any]]" = OrderedDict()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "stale": 0,
+            "expired": 0,
+            "evictions": 0,
+        }
+
+    def get(self, key: Hashable, versions: Tuple) -> Optional[Any]:
+        """Return the cached value if it is fresh and built from ``versions``."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            expires_at, entry_versions, value = entry
+            if entry_versions != versions:
+                del self._entries[key]
+                self._stats["stale"] += 1
+                self._stats["misses"] += 1
+                return None
+            if expires_at <= now:
+                del self._entries[key]
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def put(self, key: Hashable, versions: Tuple, value: Any, ttl: Optional[float] = None):
+        """Store ``value`` as built from ``versions``, evicting the LRU entry if full."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, versions, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        """Drop every entry, e.g. after the database file was replaced."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of cache counters, including the hit rate."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["entries"] = len(self._entries)
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = round(snapshot["hits"] / lookups, 4) if lookups else 0.0
+        snapshot["max_entries"] = self.max_entries
+        snapshot["ttl"] = self.ttl
+        return snapshot
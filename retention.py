@@ -0,0 +1,200 @@
+"""
+Retention for the bot audit trail: old rows move to an archive database.
+
+bot_user_actions gains a row per bot tap and is never pruned. The retention
+run moves rows older than a per-table age from islamic_library.db into
+islamic_library_archive.db (same tables, same ids), in batches, so the hot
+tables stay small while history is kept. The brain ATTACHes the archive as
+``archive`` and /get_user_actions and /get_admin_actions page across both
+(see audit_source), so admins scrolling back far enough continue into
+archived rows without noticing.
+
+Each batch is copied first (INSERT OR IGNORE into the archive, committed)
+and deleted from the hot table second, only for ids the archive holds. In
+WAL mode a transaction spanning two database files is not atomic across
+both, so this ordering is what keeps a crash mid-run from losing rows: at
+worst a batch exists in both files, which readers skip and the next run
+cleans up.
+
+Usage:
+    python retention.py archive [--db islamic_library.db] [--user-days 90] [--admin-days 365]
+"""
+
+import argparse
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_ALIAS = "archive"
+AUDIT_RETENTION_DAYS = int(os.environ.get("AUDIT_RETENTION_DAYS", 90))
+ADMIN_AUDIT_RETENTION_DAYS = int(os.environ.get("ADMIN_AUDIT_RETENTION_DAYS", 365))
+ARCHIVE_BATCH_ROWS = int(os.environ.get("AUDIT_ARCHIVE_BATCH", 5000))
+
+ARCHIVE_SCHEMA = {
+    "bot_user_actions": (
+        """CREATE TABLE IF NOT EXISTS {db}.bot_user_actions (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            name TEXT,
+            username TEXT,
+            action TEXT,
+            details TEXT,
+            created_at TEXT
+        )""",
+        "CREATE INDEX IF NOT EXISTS {db}.idx_bot_user_actions_created ON bot_user_actions(created_at, id)",
+        "CREATE INDEX IF NOT EXISTS {db}.idx_bot_user_actions_user_created ON bot_user_actions(user_id, created_at)",
+    ),
+    "bot_admin_actions": (
+        """CREATE TABLE IF NOT EXISTS {db}.bot_admin_actions (
+            id INTEGER PRIMARY KEY,
+            admin_id INTEGER,
+            action TEXT,
+            target_user_id INTEGER,
+            details TEXT,
+            created_at TEXT
+        )""",
+        "CREATE INDEX IF NOT EXISTS {db}.idx_bot_admin_actions_created ON bot_admin_actions(created_at, id)",
+        "CREATE INDEX IF NOT EXISTS {db}.idx_bot_admin_actions_action_created ON bot_admin_actions(action, created_at)",
+    ),
+}
+
+
+def archive_path_for(db_path: str) -> str:
+    """islamic_library.db -> islamic_library_archive.db, next to it."""
+    root, ext = os.path.splitext(db_path)
+    return f"{root}_archive{ext or '.db'}"
+
+
+def archive_attached(conn: sqlite3.Connection) -> bool:
+    return any(row[1] == ARCHIVE_ALIAS for row in conn.execute("PRAGMA database_list"))
+
+
+def attach_archive(conn: sqlite3.Connection, archive_path: str, create: bool = False) -> bool:
+    """ATTACH the archive to ``conn`` if present (or ``create``); True if attached.
+
+    ATTACH is not allowed inside a transaction, so an open one means the
+    connection is used as-is.
+    """
+    if archive_attached(conn):
+        return True
+    if conn.in_transaction or (not create and not os.path.exists(archive_path)):
+        return False
+    conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_ALIAS}", (archive_path,))
+    if create:
+        for statements in ARCHIVE_SCHEMA.values():
+            for sql in statements:
+                conn.execute(sql.format(db=ARCHIVE_ALIAS))
+    return True
+
+
+def audit_source(conn: sqlite3.Connection, table: str, columns) -> str:
+    """FROM-clause source for ``table`` covering hot and archived rows.
+
+    Without an attached archive this is just the table. Rows present in both
+    files (a batch caught between copy and delete) are taken from the hot
+    table only.
+    """
+    if not archive_attached(conn):
+        return table
+    cols = ", ".join(columns)
+    return f"""(
+        SELECT {cols} FROM main.{table}
+        UNION ALL
+        SELECT {cols} FROM {ARCHIVE_ALIAS}.{table} a
+        WHERE NOT EXISTS (SELECT 1 FROM main.{table} h WHERE h.id = a.id)
+    )"""
+
+
+def archive_table(conn: sqlite3.Connection, table: str, max_age_days: int,
+                  batch_rows: int = ARCHIVE_BATCH_ROWS) -> int:
+    """Move rows of ``table`` older than ``max_age_days`` into the archive.
+
+    Works in batches of ``batch_rows`` so the hot database is never locked
+    for long; returns the number of rows moved.
+    """
+    cutoff = (datetime.now() - timedelta(days=max_age_days)).strftime("%Y-%m-%d %H:%M:%S")
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS archive_batch (id INTEGER PRIMARY KEY)")
+    moved = 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM temp.archive_batch")
+            conn.execute(f"""
+                INSERT INTO temp.archive_batch
+                SELECT id FROM main.{table} WHERE created_at < ? ORDER BY created_at, id LIMIT ?
+            """, (cutoff, batch_rows))
+            count = conn.execute("SELECT COUNT(*) FROM temp.archive_batch").fetchone()[0]
+            conn.execute(f"""
+                INSERT OR IGNORE INTO {ARCHIVE_ALIAS}.{table}
+                SELECT t.* FROM main.{table} t JOIN temp.archive_batch b ON b.id = t.id
+            """)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if not count:
+            return moved
+
+        # Second transaction: drop from the hot table only what the archive now holds
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(f"""
+                DELETE FROM main.{table} WHERE id IN (
+                    SELECT b.id FROM temp.archive_batch b
+                    JOIN {ARCHIVE_ALIAS}.{table} a ON a.id = b.id
+                )
+            """)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        moved += count
+        if count < batch_rows:
+            return moved
+
+
+def run_retention(db_path: str, archive_path: str = None, user_days: int = AUDIT_RETENTION_DAYS,
+                  admin_days: int = ADMIN_AUDIT_RETENTION_DAYS,
+                  batch_rows: int = ARCHIVE_BATCH_ROWS) -> Dict[str, int]:
+    """Archive old audit rows of ``db_path``; returns rows moved per table."""
+    archive_path = archive_path or archive_path_for(db_path)
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        attach_archive(conn, archive_path, create=True)
+        conn.execute(f"PRAGMA {ARCHIVE_ALIAS}.journal_mode=WAL")
+        start = time.perf_counter()
+        moved = {
+            "bot_user_actions": archive_table(conn, "bot_user_actions", user_days, batch_rows),
+            "bot_admin_actions": archive_table(conn, "bot_admin_actions", admin_days, batch_rows),
+        }
+        if any(moved.values()):
+            logger.info(f"Archived audit rows {moved} in {time.perf_counter() - start:.1f}s")
+        return moved
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("archive", help="Move old audit rows into the archive database")
+    run.add_argument("--db", default="islamic_library.db")
+    run.add_argument("--archive", help="Archive database (default: <db>_archive.db)")
+    run.add_argument("--user-days", type=int, default=AUDIT_RETENTION_DAYS)
+    run.add_argument("--admin-days", type=int, default=ADMIN_AUDIT_RETENTION_DAYS)
+    run.add_argument("--batch", type=int, default=ARCHIVE_BATCH_ROWS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    moved = run_retention(args.db, args.archive, args.user_days, args.admin_days, args.batch)
+    for table, count in moved.items():
+        print(f"{table}: {count} rows archived")
+
+
+if __name__ == "__main__":
+    main()
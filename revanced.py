@@ -24,6 +24,7 @@ from PIL import Image, ImageDraw, ImageFont, ImageOps
 
 # Import shared Telegram utilities
 from telegram_utils import send_message, send_photo
+from db_migrations import run_migrations, read_counters, local_epoch_sql, overdue_sql, NOW_EPOCH_SQL
 
 class GlassButton(ctk.CTkFrame):
     """Liquid Glass Button with hover effects"""
@@ -374,62 +375,8 @@ class IslamicLibraryApp(ctk.CTk):
         c = conn.cursor()
         c.execute("PRAGMA journal_mode=WAL;")
         
-        # Create tables with all required columns
-        c.execute('''CREATE TABLE IF NOT EXISTS books
-                     (id TEXT PRIMARY KEY,
-                      title TEXT NOT NULL,
-                      author TEXT,
-                      category TEXT,
-                      total_copies INTEGER DEFAULT 1,
-                      available_copies INTEGER DEFAULT 1,
-                      shelf TEXT,
-                      row TEXT,
-                      area TEXT,
-                      added_date TEXT DEFAULT CURRENT_TIMESTAMP)''')
-        
-        c.execute('''CREATE TABLE IF NOT EXISTS members
-                     (student_id TEXT PRIMARY KEY,
-                      name TEXT NOT NULL,
-                      batch TEXT,
-                      join_date TEXT DEFAULT CURRENT_TIMESTAMP,
-                      type TEXT DEFAULT 'student')''')  # Added type column
-        
-        c.execute('''CREATE TABLE IF NOT EXISTS transactions
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      book_id TEXT,
-                      member_id TEXT,
-                      issue_date TEXT,
-                      due_date TEXT,
-                      return_date TEXT,
-                      status TEXT DEFAULT 'issued',
-                      librarian TEXT,
-                      FOREIGN KEY(book_id) REFERENCES books(id),
-                      FOREIGN KEY(member_id) REFERENCES members(student_id))''')
-        
-        c.execute('''CREATE TABLE IF NOT EXISTS librarians
-                     (username TEXT PRIMARY KEY,
-                      password TEXT NOT NULL,
-                      full_name TEXT)''')
-        
-        # Create attendance table
-        c.execute('''CREATE TABLE IF NOT EXISTS attendance
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      librarian_id TEXT NOT NULL,
-                      login_time DATETIME DEFAULT CURRENT_TIMESTAMP,
-                      logout_time DATETIME,
-                      duration REAL,
-                      books_issued INTEGER DEFAULT 0,
-                      FOREIGN KEY(librarian_id) REFERENCES librarians(username))''')
-        
-        # Create ratings table
-        c.execute('''CREATE TABLE IF NOT EXISTS ratings
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      book_id TEXT NOT NULL,
-                      member_id TEXT NOT NULL,
-                      rating INTEGER,  -- 1 for like, 0 for dislike
-                      timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
-                      FOREIGN KEY(book_id) REFERENCES books(id),
-                      FOREIGN KEY(member_id) REFERENCES members(student_id))''')
+        # Create/upgrade all tables through the shared migration steps
+        run_migrations(conn)
         
         # Insert librarian data if not exists
         librarians = [
@@ -1319,7 +1266,7 @@ class IslamicLibraryApp(ctk.CTk):
                             FROM transactions t
                             JOIN books b ON t.book_id = b.id
                             WHERE t.member_id=?
-                            ORDER BY t.issue_date DESC''', (member_id,))
+                            ORDER BY t.issue_ts DESC''', (member_id,))
                 history = c.fetchall()
                 
                 # Get ratings
@@ -1465,7 +1412,7 @@ class IslamicLibraryApp(ctk.CTk):
                                 FROM transactions t
                                 JOIN members m ON t.member_id = m.student_id
                                 WHERE t.book_id=? AND t.status='issued' 
-                                ORDER BY t.issue_date DESC''', (book_id,))
+                                ORDER BY t.issue_ts DESC''', (book_id,))
                     issued_to = c.fetchall()
                     
                     conn.close()
@@ -1743,23 +1690,17 @@ class IslamicLibraryApp(ctk.CTk):
             conn = sqlite3.connect("islamic_library.db", timeout=10)
             c = conn.cursor()
             
-            c.execute("SELECT COUNT(*) FROM books")
-            total_books = c.fetchone()[0]
-            
-            c.execute("SELECT COUNT(*) FROM transactions WHERE status='issued'")
-            issued_books = c.fetchone()[0]
-            
-            c.execute("SELECT COUNT(*) FROM transactions WHERE status='issued' AND due_date < datetime('now')")
-            overdue_books = c.fetchone()[0]
-            
-            c.execute("SELECT COUNT(DISTINCT member_id) FROM transactions")
-            active_members = c.fetchone()[0]
+            counters = read_counters(conn)
+            total_books = counters["total_books"]
+            issued_books = counters["issued"]
+            overdue_books = counters["overdue"]
+            active_members = counters["active_members"]
             
             # Fetch last interaction
             c.execute('''SELECT b.title, m.name FROM transactions t 
                         JOIN books b ON t.book_id = b.id 
                         JOIN members m ON t.member_id = m.student_id 
-                        ORDER BY t.issue_date DESC LIMIT 1''')
+                        ORDER BY t.issue_ts DESC LIMIT 1''')
             last_tx = c.fetchone()
             
             conn.close()
@@ -2907,7 +2848,7 @@ class IslamicLibraryApp(ctk.CTk):
                 # Check if transaction exists
                 c.execute('''SELECT id FROM transactions 
                             WHERE book_id=? AND member_id=? AND status='issued' 
-                            ORDER BY issue_date DESC LIMIT 1''',
+                            ORDER BY issue_ts DESC LIMIT 1''',
                          (book_id, student_id))
                 transaction = c.fetchone()
                 
@@ -3130,7 +3071,7 @@ class IslamicLibraryApp(ctk.CTk):
                            FROM transactions t
                            JOIN books b ON t.book_id = b.id
                            WHERE t.member_id = ?
-                           ORDER BY t.issue_date DESC'''
+                           ORDER BY t.issue_ts DESC'''
                 
                 df = pd.read_sql(query, conn, params=(student_id,))
                 conn.close()
@@ -3273,14 +3214,14 @@ class IslamicLibraryApp(ctk.CTk):
             try:
                 conn = sqlite3.connect("islamic_library.db", timeout=10, check_same_thread=False)
                 # Get issued books with member and book details
-                query = '''SELECT t.id, b.title, m.name, m.student_id, 
+                query = f'''SELECT t.id, b.title, m.name, m.student_id, 
                                   t.issue_date, t.due_date, t.librarian,
-                                  julianday(t.due_date) - julianday('now') as days_remaining
+                                  (t.due_ts - {NOW_EPOCH_SQL}) / 86400.0 as days_remaining
                            FROM transactions t
                            JOIN books b ON t.book_id = b.id
                            JOIN members m ON t.member_id = m.student_id
                            WHERE t.status='issued'
-                           ORDER BY t.due_date'''
+                           ORDER BY t.due_ts'''
                 df = pd.read_sql(query, conn)
                 conn.close()
                 self.after(0, lambda: self._populate_issued_ui(df, scroll_frame, loading_label))
@@ -3368,17 +3309,17 @@ class IslamicLibraryApp(ctk.CTk):
         """Export issued books list to Excel"""
         conn = sqlite3.connect("islamic_library.db", timeout=10, check_same_thread=False)
         try:
-            query = '''SELECT b.title, m.name, m.student_id, 
+            query = f'''SELECT b.title, m.name, m.student_id, 
                               t.issue_date, t.due_date, t.librarian,
                               CASE 
-                                  WHEN t.due_date < datetime('now') THEN 'OVERDUE'
+                                  WHEN t.due_ts < {NOW_EPOCH_SQL} THEN 'OVERDUE'
                                   ELSE 'On Time'
                               END as status
                        FROM transactions t
                        JOIN books b ON t.book_id = b.id
                        JOIN members m ON t.member_id = m.student_id
                        WHERE t.status='issued'
-                       ORDER BY t.due_date'''
+                       ORDER BY t.due_ts'''
             
             df = pd.read_sql(query, conn)
             
@@ -3440,14 +3381,14 @@ class IslamicLibraryApp(ctk.CTk):
             try:
                 conn = sqlite3.connect("islamic_library.db", timeout=10, check_same_thread=False)
                 # Get overdue books
-                query = '''SELECT t.id, b.title, m.name, m.student_id, 
+                query = f'''SELECT t.id, b.title, m.name, m.student_id, 
                                   t.issue_date, t.due_date, t.librarian,
-                                  julianday('now') - julianday(t.due_date) as days_overdue
+                                  ({NOW_EPOCH_SQL} - t.due_ts) / 86400.0 as days_overdue
                            FROM transactions t
                            JOIN books b ON t.book_id = b.id
                            JOIN members m ON t.member_id = m.student_id
-                           WHERE t.status='issued' AND t.due_date < datetime('now')
-                           ORDER BY t.due_date'''
+                           WHERE {overdue_sql("t")}
+                           ORDER BY t.due_ts'''
                 df = pd.read_sql(query, conn)
                 conn.close()
                 self.after(0, lambda: self._populate_overdue_ui(df, scroll_frame, loading_label))
@@ -3528,14 +3469,14 @@ class IslamicLibraryApp(ctk.CTk):
         """Export overdue books list to Excel"""
         conn = sqlite3.connect("islamic_library.db", timeout=10, check_same_thread=False)
         try:
-            query = '''SELECT b.title, m.name, m.student_id, 
+            query = f'''SELECT b.title, m.name, m.student_id, 
                               t.issue_date, t.due_date, t.librarian,
-                              julianday('now') - julianday(t.due_date) as days_overdue
+                              ({NOW_EPOCH_SQL} - t.due_ts) / 86400.0 as days_overdue
                        FROM transactions t
                        JOIN books b ON t.book_id = b.id
                        JOIN members m ON t.member_id = m.student_id
-                       WHERE t.status='issued' AND t.due_date < datetime('now')
-                       ORDER BY t.due_date'''
+                       WHERE {overdue_sql("t")}
+                       ORDER BY t.due_ts'''
             
             df = pd.read_sql(query, conn)
             
@@ -3658,9 +3599,9 @@ class IslamicLibraryApp(ctk.CTk):
         # Determine date filter
         date_filter = ""
         if period == "7days":
-            date_filter = "AND date(t.issue_date) >= date('now', '-7 days')"
+            date_filter = f"AND t.issue_ts >= {local_epoch_sql('start of day', '-7 days')}"
         elif period == "30days":
-            date_filter = "AND date(t.issue_date) >= date('now', '-30 days')"
+            date_filter = f"AND t.issue_ts >= {local_epoch_sql('start of day', '-30 days')}"
         
         # Determine batch filter
         batch_filter = ""
@@ -3682,7 +3623,7 @@ class IslamicLibraryApp(ctk.CTk):
                        JOIN books b ON t.book_id = b.id
                        JOIN members m ON t.member_id = m.student_id
                        WHERE 1=1 {date_filter} {batch_filter}
-                       ORDER BY t.issue_date DESC'''
+                       ORDER BY t.issue_ts DESC'''
             
             df = pd.read_sql(query, conn)
             
@@ -3717,9 +3658,9 @@ class IslamicLibraryApp(ctk.CTk):
         # Determine date filter
         date_filter = ""
         if period == "7days":
-            date_filter = "AND date(t.issue_date) >= date('now', '-7 days')"
+            date_filter = f"AND t.issue_ts >= {local_epoch_sql('start of day', '-7 days')}"
         elif period == "30days":
-            date_filter = "AND date(t.issue_date) >= date('now', '-30 days')"
+            date_filter = f"AND t.issue_ts >= {local_epoch_sql('start of day', '-30 days')}"
         
         # Determine batch filter
         batch_filter = ""
@@ -3742,7 +3683,7 @@ class IslamicLibraryApp(ctk.CTk):
                        JOIN books b ON t.book_id = b.id
                        JOIN members m ON t.member_id = m.student_id
                        WHERE 1=1 {date_filter} {batch_filter}
-                       ORDER BY t.issue_date DESC'''
+                       ORDER BY t.issue_ts DESC'''
             
             df = pd.read_sql(query, conn)
             
@@ -4023,48 +3964,40 @@ class IslamicLibraryApp(ctk.CTk):
                 
                 # Stats
                 c = conn.cursor()
-                c.execute("SELECT COUNT(*) FROM books")
-                total_books = c.fetchone()[0]
-                
-                c.execute("SELECT COUNT(*) FROM members")
-                total_members = c.fetchone()[0]
-                
-                c.execute("SELECT SUM(available_copies) FROM books")
-                available_books = c.fetchone()[0] or 0
-                
-                c.execute("SELECT COUNT(*) FROM transactions WHERE status='issued'")
-                issued_books = c.fetchone()[0]
-                
-                c.execute("SELECT COUNT(*) FROM transactions WHERE status='issued' AND due_date < datetime('now')")
-                overdue_books = c.fetchone()[0]
+                counters = read_counters(conn)
+                total_books = counters["total_books"]
+                total_members = counters["total_members"]
+                available_books = counters["available_copies"]
+                issued_books = counters["issued"]
+                overdue_books = counters["overdue"]
                 
                 # Extended Stats
-                c.execute("SELECT COUNT(DISTINCT member_id) FROM transactions")
-                active_members = c.fetchone()[0]
+                active_members = counters["active_members"]
                 inactive_members = total_members - active_members
 
                 # Chart Data
                 df_batch = pd.read_sql('''SELECT m.batch, COUNT(*) as count FROM transactions t 
                                         JOIN members m ON t.member_id = m.student_id GROUP BY m.batch''', conn)
-                df_monthly = pd.read_sql('''SELECT strftime('%Y-%m', issue_date) as month, COUNT(*) as count 
+                df_monthly = pd.read_sql('''SELECT strftime('%Y-%m', issue_ts, 'unixepoch') as month, COUNT(*) as count 
                                           FROM transactions GROUP BY month ORDER BY month''', conn)
-                c.execute('''SELECT SUM(CASE WHEN return_date <= due_date THEN 1 ELSE 0 END), 
-                            SUM(CASE WHEN return_date > due_date THEN 1 ELSE 0 END) 
+                c.execute('''SELECT SUM(CASE WHEN return_ts <= due_ts THEN 1 ELSE 0 END), 
+                            SUM(CASE WHEN return_ts > due_ts THEN 1 ELSE 0 END) 
                             FROM transactions WHERE return_date IS NOT NULL''')
                 res = c.fetchone()
                 discipline = res if res and res[0] is not None else (0, 0)
 
                 # Table Data
-                df_most = pd.read_sql('''SELECT b.id as "Book Code", b.title as "Title", COUNT(*) as "Issues" 
-                                       FROM transactions t JOIN books b ON t.book_id = b.id 
-                                       GROUP BY b.id, b.title ORDER BY "Issues" DESC LIMIT 10''', conn)
-                df_least = pd.read_sql('''SELECT b.id as "Book Code", b.title as "Title", COUNT(*) as "Issues" 
-                                        FROM transactions t JOIN books b ON t.book_id = b.id 
-                                        GROUP BY b.id, b.title ORDER BY "Issues" ASC LIMIT 10''', conn)
-                df_teachers = pd.read_sql('''SELECT m.name as "Teacher Name", COUNT(*) as "Activity" 
-                                           FROM transactions t JOIN members m ON t.member_id = m.student_id 
-                                           WHERE m.type = 'teacher' GROUP BY m.student_id, m.name 
-                                           ORDER BY "Activity" DESC''', conn)
+                # Issue-count rollups are trigger-maintained (db_migrations)
+                df_most = pd.read_sql('''SELECT r.book_id as "Book Code", b.title as "Title", r.issue_count as "Issues" 
+                                       FROM book_issue_counts r CROSS JOIN books b ON b.id = r.book_id 
+                                       ORDER BY r.issue_count DESC, r.book_id DESC LIMIT 10''', conn)
+                df_least = pd.read_sql('''SELECT r.book_id as "Book Code", b.title as "Title", r.issue_count as "Issues" 
+                                        FROM book_issue_counts r CROSS JOIN books b ON b.id = r.book_id 
+                                        ORDER BY r.issue_count ASC, r.book_id ASC LIMIT 10''', conn)
+                df_teachers = pd.read_sql('''SELECT m.name as "Teacher Name", r.issue_count as "Activity" 
+                                           FROM member_issue_counts r CROSS JOIN members m ON m.student_id = r.member_id 
+                                           WHERE m.type = 'teacher' 
+                                           ORDER BY r.issue_count DESC, r.member_id DESC''', conn)
                 df_rated = pd.read_sql('''SELECT b.title as "Book Name", AVG(r.rating) as "Rating" 
                                         FROM ratings r JOIN books b ON r.book_id = b.id 
                                         GROUP BY b.id, b.title ORDER BY "Rating" DESC LIMIT 10''', conn)
@@ -4228,20 +4161,20 @@ class IslamicLibraryApp(ctk.CTk):
         
         # Determine date filter based on time period
         if time_period == "today":
-            date_filter = "AND date(issue_date) = date('now')"
-            group_by = "strftime('%H', issue_date)"
+            date_filter = f"AND issue_ts >= {local_epoch_sql('start of day')}"
+            group_by = "strftime('%H', issue_ts, 'unixepoch')"
             x_label = "Hour of Day"
         elif time_period == "week":
-            date_filter = "AND date(issue_date) >= date('now', '-7 days')"
-            group_by = "date(issue_date)"
+            date_filter = f"AND issue_ts >= {local_epoch_sql('start of day', '-7 days')}"
+            group_by = "date(issue_ts, 'unixepoch')"
             x_label = "Day"
         elif time_period == "month":
-            date_filter = "AND date(issue_date) >= date('now', '-30 days')"
-            group_by = "date(issue_date)"
+            date_filter = f"AND issue_ts >= {local_epoch_sql('start of day', '-30 days')}"
+            group_by = "date(issue_ts, 'unixepoch')"
             x_label = "Day"
         else:  # all time
             date_filter = ""
-            group_by = "strftime('%Y-%m', issue_date)"
+            group_by = "strftime('%Y-%m', issue_ts, 'unixepoch')"
             x_label = "Month"
         
         try:
@@ -1,43 +1,203 @@
 import threading
+import subprocess
+import signal
 import sys
 import time
 import os
+import urllib.request
 
-def start_flask():
-    """Start Flask backend in a background thread."""
-    from brain import app, init_db, IMAGES_DIR, restore_db_from_github
+# How brain is served: "gunicorn" (separate pre-fork process, Linux/Railway),
+# "uvicorn" (separate process, ASGI front end in brain_asgi), "waitress"
+# (threaded WSGI server in this process, works on Windows), "dev" (Flask's
+# built-in server) or "auto" (first of gunicorn/waitress/dev installed).
+BRAIN_SERVER = os.environ.get("BRAIN_SERVER", "auto").lower()
+BRAIN_THREADS = int(os.environ.get("BRAIN_THREADS", 4))
+GUNICORN_CONF = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gunicorn.conf.py")
+
+def resolve_server_mode(mode=BRAIN_SERVER):
+    """Pick the WSGI server for brain, falling back when one isn't installed."""
+    if mode != "auto":
+        return mode
+    if os.name == "posix":
+        try:
+            import gunicorn  # noqa: F401
+            return "gunicorn"
+        except ImportError:
+            pass
+    try:
+        import waitress  # noqa: F401
+        return "waitress"
+    except ImportError:
+        return "dev"
+
+def prepare_backend(wait_for_archive=False):
+    """Restore/migrate the DB once, before any server process or thread starts."""
+    from brain import init_db, db_pool, IMAGES_DIR, restore_db_from_github
     import logging
 
     logger = logging.getLogger(__name__)
 
     # Restore DB from GitHub Releases if missing (Railway ephemeral storage)
-    restore_db_from_github()
+    restore_db_from_github(wait_for_archive=wait_for_archive)
 
     init_db()
+    # Don't leave connections open in a process that may fork a server
+    db_pool.close_all()
 
     if not os.path.exists(IMAGES_DIR):
         os.makedirs(IMAGES_DIR)
         logger.info(f"Created images directory: {IMAGES_DIR}")
 
+def retention_loop():
+    """Archive old audit rows now and then every AUDIT_RETENTION_INTERVAL_HOURS."""
+    from brain import DB_PATH, archive_restored
+    from retention import run_retention
+    import logging
+
+    logger = logging.getLogger(__name__)
+    interval = float(os.environ.get("AUDIT_RETENTION_INTERVAL_HOURS", 24)) * 3600
+    archive_restored.wait()
+    while True:
+        try:
+            run_retention(DB_PATH)
+        except Exception as e:
+            logger.error(f"Audit retention run failed: {e}")
+        time.sleep(interval)
+
+def shipper_loop():
+    """Ship WAL frames of the DB to DB_SHIP_STORAGE continuously (see db_shipper)."""
+    from brain import DB_PATH
+    from db_shipper import run_shipper, storage_from_env
+    import logging
+
+    logger = logging.getLogger(__name__)
+    try:
+        storage = storage_from_env()
+    except Exception as e:
+        logger.error(f"WAL shipping disabled: {e}")
+        return
+    if storage is not None:
+        run_shipper(DB_PATH, storage)
+
+def gunicorn_command():
+    return [sys.executable, "-m", "gunicorn", "-c", GUNICORN_CONF, "brain:app"]
+
+def uvicorn_command():
+    return [sys.executable, "-m", "uvicorn", "brain_asgi:app",
+            "--host", "0.0.0.0", "--port", str(int(os.environ.get("PORT", 5000))),
+            "--workers", str(int(os.environ.get("BRAIN_WORKERS", 1))), "--no-access-log"]
+
+def server_command(mode):
+    return uvicorn_command() if mode == "uvicorn" else gunicorn_command()
+
+def start_server_process(mode):
+    """Start brain under gunicorn/uvicorn as a child process (own workers, own GILs)."""
+    env = dict(os.environ, BRAIN_DB_READY="1")
+    return subprocess.Popen(server_command(mode), env=env)
+
+def start_waitress():
+    """Serve brain with waitress's thread pool (blocks)."""
+    from brain import app
+    from waitress import serve
+
+    port = int(os.environ.get("PORT", 5000))
+    print(f"Python Brain Backend (waitress, {BRAIN_THREADS} threads) starting on port {port}...")
+    serve(app, host='0.0.0.0', port=port, threads=BRAIN_THREADS)
+
+def start_flask():
+    """Start Flask's development server (blocks)."""
+    from brain import app
+    import logging
+
+    logger = logging.getLogger(__name__)
     port = int(os.environ.get("PORT", 5000))
     logger.info(f"Python Brain Backend starting on port {port}...")
     app.run(host='0.0.0.0', port=port, debug=False)
 
+def wait_for_backend(timeout=30):
+    """Poll /health until brain answers (or give up after `timeout` seconds)."""
+    url = f"http://127.0.0.1:{int(os.environ.get('PORT', 5000))}/health"
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=2) as r:
+                if r.status == 200:
+                    return True
+        except OSError:
+            pass
+        time.sleep(0.5)
+    return False
+
+# Set once the service starts stopping its children on purpose
+shutting_down = threading.Event()
+
+def watch_child(proc):
+    """Exit the whole service if the brain server dies, so the platform restarts it."""
+    code = proc.wait()
+    if shutting_down.is_set():
+        return
+    print(f"❌ Brain server exited with code {code}; shutting down")
+    os._exit(1)
+
+def stop_child(proc):
+    """Graceful stop: gunicorn/uvicorn let in-flight requests finish on SIGTERM."""
+    if proc.poll() is None:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=35)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
 def start_services():
     print("🚀 Starting Library System Services...")
+    mode = resolve_server_mode()
+    prepare_backend()
+
+    # Start the backend: gunicorn/uvicorn in their own processes, the others in a thread
+    brain_proc = None
+    if mode in ("gunicorn", "uvicorn"):
+        brain_proc = start_server_process(mode)
+        threading.Thread(target=watch_child, args=(brain_proc,), daemon=True).start()
+    else:
+        target = start_waitress if mode == "waitress" else start_flask
+        threading.Thread(target=target, daemon=True).start()
 
-    # Start Flask Backend in background thread
-    flask_thread = threading.Thread(target=start_flask, daemon=True)
-    flask_thread.start()
+    # Move old audit rows to the archive DB in the background (one process only)
+    threading.Thread(target=retention_loop, daemon=True).start()
+    # Continuous WAL shipping for point-in-time restores (one process only)
+    threading.Thread(target=shipper_loop, daemon=True).start()
 
-    # Wait for Flask to initialize
-    time.sleep(3)
+    # Wait for the backend to answer before the bot starts calling it
+    if not wait_for_backend():
+        print("⚠️ Brain backend did not answer /health yet; starting bot anyway")
+    print(f"🧠 Brain backend up ({mode})")
 
     # Start Telegram Bot in main thread (required for signal handlers)
     print("🤖 Starting Telegram Bot...")
     from telegram_bot import init_bot, Update
     app = init_bot()
-    app.run_polling(drop_pending_updates=True, allowed_updates=Update.ALL_TYPES)
+    try:
+        app.run_polling(drop_pending_updates=True, allowed_updates=Update.ALL_TYPES)
+    finally:
+        shutting_down.set()
+        if brain_proc is not None:
+            stop_child(brain_proc)
+
+def run_brain_only():
+    """`python start.py brain`: run just the backend in the foreground."""
+    mode = resolve_server_mode()
+    # execv below would cut a background archive restore short
+    prepare_backend(wait_for_archive=mode in ("gunicorn", "uvicorn"))
+    if mode in ("gunicorn", "uvicorn"):
+        os.environ["BRAIN_DB_READY"] = "1"
+        os.execv(sys.executable, server_command(mode))
+    elif mode == "waitress":
+        start_waitress()
+    else:
+        start_flask()
 
 if __name__ == "__main__":
-    start_services()
+    if sys.argv[1:] == ["brain"]:
+        run_brain_only()
+    else:
+        start_services()
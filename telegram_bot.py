@@ -3,12 +3,13 @@ import asyncio
 import json
 import logging
 import threading
+import time
 from datetime import datetime
+from collections import OrderedDict
 from typing import Set, Dict, Any
 import httpx
 import base64
 import sqlite3
-import shutil
 
 # For python-telegram-bot v20+
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup
@@ -26,7 +27,7 @@ from telegram.constants import ChatAction
 from telegram_utils import get_bot_token, get_admin_chat_id
 
 # DB backup/restore (from brain module)
-from brain import backup_db_to_github
+from brain import backup_db_to_github, import_database
 
 # --- CONFIGURATION ---
 TOKEN = get_bot_token()
@@ -153,6 +154,7 @@ USER_STATES = {}  # {user_id: state_name}
 SEARCH_CONTEXT = {}  # {user_id: {"term": str, "page": int}}
 USER_PAGINATION_CONTEXT = {}  # {user_id: {"page": int}}
 ANALYTICS_CONTEXT = {}  # {user_id: {"type": str, "page": int}}
+PAGE_CURSORS = {}  # {(user_id, view): {"scope": str, "page": int, "next": str, "prev": str}}
 # --- CLEANUP CONFIGURATION ---
 QUICK_DELETE_SECONDS = 5
 LONG_DELETE_SECONDS = 300
@@ -194,6 +196,119 @@ def clear_user_state(user_id: int):
     """Clear state for user."""
     USER_STATES.pop(user_id, None)
 
+# --- KEYSET PAGINATION HELPERS ---
+# Brain returns opaque next/prev cursors with every page. Telegram caps
+# callback_data at 64 bytes, so buttons keep their short page payloads and
+# the cursors for the page on screen are kept here per user and view.
+def page_request(user_id: int, view: str, scope: str, page: int) -> dict:
+    """Request body fields for `page`: a cursor when stepping to an adjacent page."""
+    body = {"page": page}
+    state = PAGE_CURSORS.get((user_id, view))
+    if state and state["scope"] == scope:
+        if page == state["page"] + 1 and state["next"]:
+            body["cursor"] = state["next"]
+        elif page == state["page"] - 1 and state["prev"]:
+            body["cursor"] = state["prev"]
+    return body
+
+def remember_cursors(user_id: int, view: str, scope: str, page: int, payload: dict):
+    """Store the cursors returned for the page now on screen."""
+    PAGE_CURSORS[(user_id, view)] = {
+        "scope": scope,
+        "page": page,
+        "next": payload.get("next_cursor"),
+        "prev": payload.get("prev_cursor"),
+    }
+
+def clear_cursors(user_id: int):
+    """Forget all stored cursors for a user."""
+    for key in [k for k in PAGE_CURSORS if k[0] == user_id]:
+        PAGE_CURSORS.pop(key, None)
+
+# --- BACKEND API CLIENT ---
+# One keep-alive client for every brain call. Read endpoints answer with an
+# ETag; the last body per method + path + request body is kept so repeat
+# calls (refresh taps, paging back) revalidate and reuse it on a 304.
+API_ETAG_CACHE_SIZE = 256
+_api_client = None
+_api_etags: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+def get_api_client() -> httpx.AsyncClient:
+    """Shared AsyncClient for the brain API, created on first use.
+
+    httpx advertises and transparently decodes gzip (and br when the brotli
+    package is installed), which brain uses for larger JSON bodies.
+    """
+    global _api_client
+    if _api_client is None or _api_client.is_closed:
+        _api_client = httpx.AsyncClient(base_url=API_BASE, timeout=10.0)
+    return _api_client
+
+async def close_api_client(application=None):
+    """Close the shared client (registered as the bot's post_shutdown hook)."""
+    global _api_client
+    if _api_client is not None and not _api_client.is_closed:
+        await _api_client.aclose()
+    _api_client = None
+
+async def api_request(method: str, path: str, payload: dict = None, timeout: float = 10.0) -> dict:
+    """Call a brain endpoint and return its decoded JSON body."""
+    key = (method, path, json.dumps(payload, sort_keys=True) if payload is not None else "")
+    cached = _api_etags.get(key)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    response = await get_api_client().request(method, path, json=payload, headers=headers, timeout=timeout)
+
+    if response.status_code == 304 and cached:
+        _api_etags.move_to_end(key)
+        return json.loads(cached[1])
+    etag = response.headers.get("ETag")
+    if etag and response.status_code == 200:
+        _api_etags[key] = (etag, response.content)
+        _api_etags.move_to_end(key)
+        while len(_api_etags) > API_ETAG_CACHE_SIZE:
+            _api_etags.popitem(last=False)
+    else:
+        _api_etags.pop(key, None)
+    return response.json()
+
+async def api_batch(calls: list, atomic: bool = False, timeout: float = 10.0) -> list:
+    """Run several brain calls in one /batch round trip.
+
+    `calls` is a list of (path, body) pairs; returns each call's JSON body in
+    order. Raises RuntimeError if the batch itself (or, when atomic, any call
+    in it) failed.
+    """
+    res = await api_request("POST", "/batch", {
+        "atomic": atomic,
+        "requests": [{"path": path, "body": body} for path, body in calls]
+    }, timeout=timeout)
+    if res.get("status") != "ok":
+        raise RuntimeError(res.get("message", "Batch request failed"))
+    return [r["body"] for r in res["results"]]
+
+# Student photos by versioned URL (the version changes when the file does),
+# so a cached photo never needs revalidating.
+PHOTO_CACHE_SIZE = 64
+_photo_cache: "OrderedDict[str, bytes]" = OrderedDict()
+
+async def api_fetch_photo(photo_url: str, timeout: float = 5.0) -> bytes:
+    """Raw bytes of a brain /student_photo URL, or None if it can't be fetched."""
+    if not photo_url:
+        return None
+    if photo_url in _photo_cache:
+        _photo_cache.move_to_end(photo_url)
+        return _photo_cache[photo_url]
+    try:
+        response = await get_api_client().get(photo_url, timeout=timeout)
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        logger.error(f"Error fetching student photo {photo_url}: {e}")
+        return None
+    _photo_cache[photo_url] = response.content
+    while len(_photo_cache) > PHOTO_CACHE_SIZE:
+        _photo_cache.popitem(last=False)
+    return response.content
+
 def ensure_user_context(user_id: int):
     """Ensures the user has a valid entry in CLEANUP_CONTEXT with all keys."""
     if user_id not in CLEANUP_CONTEXT:
@@ -423,40 +538,56 @@ def is_authorized(user_id: int) -> bool:
 async def log_user_action(user, action, details=""):
     """Logs a user action to the backend audit trail."""
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            await client.post(f"{API_BASE}/log_user_action", json={
-                "user_id": user.id,
-                "name": user.full_name,
-                "username": user.username,
-                "action": action,
-                "details": details
-            })
+        await api_request("POST", "/log_user_action", {
+            "user_id": user.id,
+            "name": user.full_name,
+            "username": user.username,
+            "action": action,
+            "details": details
+        }, timeout=5.0)
     except Exception as e:
         logger.error(f"Failed to log user action: {e}")
 
 async def log_admin_action(admin_id, action, target_user_id=None, details=""):
     """Logs an admin action to the backend audit trail."""
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            await client.post(f"{API_BASE}/log_admin_action", json={
-                "admin_id": admin_id,
-                "action": action,
-                "target_user_id": target_user_id,
-                "details": details
-            })
+        await api_request("POST", "/log_admin_action", {
+            "admin_id": admin_id,
+            "action": action,
+            "target_user_id": target_user_id,
+            "details": details
+        }, timeout=5.0)
     except Exception as e:
         logger.error(f"Failed to log admin action: {e}")
 
+# last_active only needs minute-level accuracy: write it at most once per
+# user per window, unless the user's name or username changed.
+UPSERT_DEBOUNCE_SECONDS = 180
+UPSERT_DEBOUNCE_MAX_USERS = 10000
+_last_upserts: "OrderedDict[int, tuple]" = OrderedDict()
+
 async def upsert_bot_user(user):
-    """Update user's last active status and info in the DB."""
+    """Update user's last active status and info in the DB (debounced)."""
+    now = time.monotonic()
+    profile = (user.full_name, user.username)
+    last = _last_upserts.get(user.id)
+    if last and last[1] == profile and now - last[0] < UPSERT_DEBOUNCE_SECONDS:
+        return
+    # Claim the window before awaiting so a burst of messages sends one upsert
+    _last_upserts[user.id] = (now, profile)
+    _last_upserts.move_to_end(user.id)
+    while len(_last_upserts) > UPSERT_DEBOUNCE_MAX_USERS:
+        _last_upserts.popitem(last=False)
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            await client.post(f"{API_BASE}/upsert_user", json={
-                "chat_id": user.id,
-                "name": user.full_name,
-                "username": user.username
-            })
+        res = await api_request("POST", "/upsert_user", {
+            "chat_id": user.id,
+            "name": user.full_name,
+            "username": user.username
+        }, timeout=5.0)
+        if res.get("status") != "ok":
+            raise RuntimeError(res.get("message"))
     except Exception as e:
+        _last_upserts.pop(user.id, None)  # retry on the next message
         logger.error(f"Failed to upsert bot user {user.id}: {e}")
 
 async def request_admin_approval(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -792,13 +923,11 @@ async def send_search_page(update: Update, context: ContextTypes.DEFAULT_TYPE, u
     term = context_data["term"]
     
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(f"{API_BASE}/search_book", json={
-                "term": term,
-                "page": page,
-                "page_size": PAGE_SIZE
-            })
-            data = response.json()
+        data = await api_request("POST", "/search_book", {
+            "term": term,
+            "page_size": PAGE_SIZE,
+            **page_request(user_id, "search", term, page)
+        })
         
         if data["status"] != "ok":
             msg = f"⚠️ *Error*\n\n{data.get('message', 'An unknown error occurred.')}"
@@ -811,6 +940,7 @@ async def send_search_page(update: Update, context: ContextTypes.DEFAULT_TYPE, u
         books = data["data"]["books"]
         total_pages = data["data"]["total_pages"]
         total_count = data["data"]["total_count"]
+        remember_cursors(user_id, "search", term, page, data["data"])
         
         if not books:
             msg = "📭 *No Results*\n\nNo books found matching your search term.\nPlease try a different keyword or code."
@@ -877,9 +1007,7 @@ async def handle_book_status(update: Update, context: ContextTypes.DEFAULT_TYPE)
     await update.effective_chat.send_action(ChatAction.TYPING)
 
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(f"{API_BASE}/book_status", json={"book_id": book_id})
-            data = response.json()
+        data = await api_request("POST", "/book_status", {"book_id": book_id})
         
         if data["status"] != "ok":
             await send_and_track_message(update, context, text="📭 *Not Found*\n\nNo book found with that code.\nPlease verify the code and try again.")
@@ -924,9 +1052,7 @@ async def handle_student_details(update: Update, context: ContextTypes.DEFAULT_T
     await update.effective_chat.send_action(ChatAction.TYPING)
 
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(f"{API_BASE}/student_details", json={"student_id": student_id})
-            data = response.json()
+        data = await api_request("POST", "/student_details", {"student_id": student_id})
         
         if data["status"] != "ok":
             await send_and_track_message(update, context, text="📭 *Not Found*\n\nNo student found with that ID or name.\nPlease verify and try again.")
@@ -936,13 +1062,9 @@ async def handle_student_details(update: Update, context: ContextTypes.DEFAULT_T
         
         student = data["data"]
         
-        # 1. Photo Handling
-        photo_bytes = None
-        if student["has_photo"] and student["photo"]:
-            try:
-                photo_bytes = base64.b64decode(student["photo"])
-            except Exception as e:
-                logger.error(f"Error decoding student photo: {e}")
+        # 1. Photo Handling (served by /student_photo; if it can't be fetched
+        # the profile is sent without it)
+        photo_bytes = await api_fetch_photo(student.get("photo_url"))
 
         # 2. Construct Message
         issued_books = student["issued"]
@@ -999,9 +1121,7 @@ async def handle_issue_history(update: Update, context: ContextTypes.DEFAULT_TYP
     await update.effective_chat.send_action(ChatAction.TYPING)
 
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(f"{API_BASE}/issue_history", json={"book_id": book_id})
-            data = response.json()
+        data = await api_request("POST", "/issue_history", {"book_id": book_id})
         
         if data["status"] != "ok":
             await send_and_track_message(update, context, text="⚠️ *Error*\n\nFailed to fetch transaction history.")
@@ -1039,9 +1159,7 @@ async def handle_book_count(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.effective_chat.send_action(ChatAction.TYPING)
     
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(f"{API_BASE}/library_stats")
-            data = response.json()
+        data = await api_request("GET", "/library_stats")
         
         if data["status"] != "ok":
             await send_and_track_message(update, context, text="⚠️ *Error*\n\nFailed to fetch library statistics.")
@@ -1426,7 +1544,7 @@ BOT_RUNNING = False
 
 def init_bot():
     """Main function to initialize the bot application."""
-    application = ApplicationBuilder().token(TOKEN).build()
+    application = ApplicationBuilder().token(TOKEN).post_shutdown(close_api_client).build()
 
     # Add simple handlers instead of ConversationHandler
     application.add_handler(CommandHandler('start', start))
@@ -1440,9 +1558,10 @@ def init_bot():
 async def send_bot_users_page(update: Update, context: ContextTypes.DEFAULT_TYPE, admin_id: int, page: int):
     """Displays a paginated list of bot users."""
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(f"{API_BASE}/get_bot_users", json={"page": page, "page_size": PAGE_SIZE})
-            res_data = response.json()
+        res_data = await api_request("POST", "/get_bot_users", {
+            "page_size": PAGE_SIZE,
+            **page_request(admin_id, "users", "all", page)
+        })
             
         if res_data["status"] != "ok":
             await send_and_track_message(update, context, text="⚠️ *Error*\n\nFailed to fetch bot users.")
@@ -1450,6 +1569,7 @@ async def send_bot_users_page(update: Update, context: ContextTypes.DEFAULT_TYPE
 
         users = res_data["data"]["users"]
         total_pages = res_data["data"]["total_pages"]
+        remember_cursors(admin_id, "users", "all", page, res_data["data"])
         
         msg = f"👥 *Registered Users*\n\nPage {page} of {total_pages}\n\n"
         keyboard = []
@@ -1478,12 +1598,15 @@ async def send_bot_users_page(update: Update, context: ContextTypes.DEFAULT_TYPE
         logger.error(f"Error in send_bot_users_page: {e}")
         await send_and_track_message(update, context, text="⚠️ *Error*\n\nFailed to load bot users.")
 
-async def show_user_details(update: Update, context: ContextTypes.DEFAULT_TYPE, target_id: int):
-    """Shows full details and management actions for a user."""
+async def show_user_details(update: Update, context: ContextTypes.DEFAULT_TYPE, target_id: int, res_data: dict = None):
+    """Shows full details and management actions for a user.
+
+    `res_data` is a /get_user_details response already fetched by the caller
+    (e.g. as part of a batch); otherwise it is fetched here.
+    """
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(f"{API_BASE}/get_user_details", json={"chat_id": target_id})
-            res_data = response.json()
+        if res_data is None:
+            res_data = await api_request("POST", "/get_user_details", {"chat_id": target_id})
             
         if res_data["status"] != "ok":
             await update.callback_query.answer("❌ User not found", show_alert=True)
@@ -1533,17 +1656,21 @@ async def show_role_options(update: Update, context: ContextTypes.DEFAULT_TYPE,
 async def update_user_role_api(update: Update, context: ContextTypes.DEFAULT_TYPE, target_id: int, role: str):
     try:
         admin_id = update.effective_user.id
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(f"{API_BASE}/update_user_role", json={
-                "chat_id": target_id,
-                "role": role,
-                "admin_id": admin_id
-            })
-            res_data = response.json()
-            
-        if res_data["status"] == "ok":
+        # Role change, audit entry and refreshed details in one round trip;
+        # atomic, so a failed update is neither logged nor half-applied.
+        try:
+            _, _, details = await api_batch([
+                ("/update_user_role", {"chat_id": target_id, "role": role, "admin_id": admin_id}),
+                ("/log_admin_action", {"admin_id": admin_id, "action": "Change Role",
+                                       "target_user_id": target_id, "details": f"New role: {role}"}),
+                ("/get_user_details", {"chat_id": target_id}),
+            ], atomic=True)
+        except RuntimeError as e:
+            logger.error(f"Role update batch failed: {e}")
+            details = None
+
+        if details is not None:
             await update.callback_query.answer(f"✅ Role updated to {role}")
-            await log_admin_action(admin_id, "Change Role", target_id, f"New role: {role}")
             # Update in-memory set and persist to file
             if role == "Approved":
                 APPROVED_USERS.add(target_id)
@@ -1551,7 +1678,7 @@ async def update_user_role_api(update: Update, context: ContextTypes.DEFAULT_TYP
                 APPROVED_USERS.discard(target_id)
             _save_approved_users()
                 
-            await show_user_details(update, context, target_id)
+            await show_user_details(update, context, target_id, details)
         else:
             await update.callback_query.answer("❌ Failed to update role")
     except Exception as e:
@@ -1561,9 +1688,7 @@ async def update_user_role_api(update: Update, context: ContextTypes.DEFAULT_TYP
 async def show_admin_health(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Shows system health dashboard."""
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(f"{API_BASE}/health")
-            data = response.json()
+        data = await api_request("GET", "/health")
 
         status = "🟢 Running" if data["status"] == "ok" else "🔴 Down"
         db_status = "🟢 Present" if data["database_present"] else "🔴 Missing"
@@ -1631,15 +1756,17 @@ async def show_admin_logs(update: Update, context: ContextTypes.DEFAULT_TYPE, le
 async def show_admin_audit(update: Update, context: ContextTypes.DEFAULT_TYPE, filter_type: str, page: int):
     """Shows admin action audit log."""
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(f"{API_BASE}/get_admin_actions", json={"page": page, "filter": filter_type})
-            res_data = response.json()
+        res_data = await api_request("POST", "/get_admin_actions", {
+            "filter": filter_type,
+            **page_request(update.effective_user.id, "audit", filter_type, page)
+        })
 
         if res_data["status"] != "ok":
             await send_and_track_message(update, context, text="⚠️ *Error*\n\nFailed to fetch audit log.")
             return
 
         actions = res_data["data"]
+        remember_cursors(update.effective_user.id, "audit", filter_type, page, res_data)
         msg = f"🛡 *Audit Trail* — {filter_type.capitalize()} ({page})\n━━━━━━━━━━━━━━━\n\n"
 
         if not actions:
@@ -1653,7 +1780,7 @@ async def show_admin_audit(update: Update, context: ContextTypes.DEFAULT_TYPE, f
         nav_row = []
         if page > 1:
             nav_row.append(InlineKeyboardButton("⬅️", callback_data=f"audit_{filter_type}_{page-1}"))
-        if len(actions) == 10:
+        if res_data.get("next_cursor"):
             nav_row.append(InlineKeyboardButton("➡️", callback_data=f"audit_{filter_type}_{page+1}"))
         if nav_row:
             keyboard.append(nav_row)
@@ -1676,15 +1803,17 @@ async def show_admin_audit(update: Update, context: ContextTypes.DEFAULT_TYPE, f
 async def show_user_history(update: Update, context: ContextTypes.DEFAULT_TYPE, target_id: int, page: int = 1):
     """Shows action history for a specific user."""
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(f"{API_BASE}/get_user_actions", json={"user_id": target_id, "page": page})
-            res_data = response.json()
+        res_data = await api_request("POST", "/get_user_actions", {
+            "user_id": target_id,
+            **page_request(update.effective_user.id, "uhist", str(target_id), page)
+        })
             
         if res_data["status"] != "ok":
             await send_and_track_message(update, context, text="⚠️ *Error*\n\nFailed to fetch user action history.")
             return
 
         actions = res_data["data"]
+        remember_cursors(update.effective_user.id, "uhist", str(target_id), page, res_data)
         msg = f"📜 *User Action History*\n\n👤 User: `{target_id}`\n\n"
         
         if not actions:
@@ -1697,7 +1826,7 @@ async def show_user_history(update: Update, context: ContextTypes.DEFAULT_TYPE,
         nav_row = []
         if page > 1:
             nav_row.append(InlineKeyboardButton("⏮ Prev", callback_data=f"uhist_{target_id}_{page-1}"))
-        if len(actions) == 10:
+        if res_data.get("next_cursor"):
             nav_row.append(InlineKeyboardButton("⏭ Next", callback_data=f"uhist_{target_id}_{page+1}"))
         if nav_row:
             keyboard.append(nav_row)
@@ -1720,6 +1849,7 @@ async def handle_admin_reset_user(update: Update, context: ContextTypes.DEFAULT_
         SEARCH_CONTEXT.pop(target_id, None)
         USER_PAGINATION_CONTEXT.pop(target_id, None)
         ANALYTICS_CONTEXT.pop(target_id, None)
+        clear_cursors(target_id)
         
         # 2. Cancel Deletion Tasks
         for key in list(DELETION_TASKS.keys()):
@@ -1838,32 +1968,23 @@ async def handle_db_file_upload(update: Update, context: ContextTypes.DEFAULT_TY
             await send_and_track_message(update, context, text=f"⚠️ *Invalid Schema*\n\nThe database is missing required tables: {', '.join(missing)}")
             return
 
-        # 3. Atomic Replace with Backup
-        if os.path.exists(DB_PATH):
-            shutil.copy2(DB_PATH, backup_path)
-        
+        # 3. Copy into the live database (one transaction, current data kept in backup_path)
+        await asyncio.to_thread(import_database, temp_path, backup_path)
+        os.remove(temp_path)
+        await send_and_track_message(update, context, text="✅ *Import Complete*\n\nDatabase has been replaced successfully.\nLibrary data has been updated.")
+        await log_admin_action(user_id, "DB_IMPORT", details=f"File: {doc.file_name}, Size: {doc.file_size}")
+        set_user_state(user_id, CHOOSING)
+        # Auto-backup to GitHub Releases so data survives Railway restarts
         try:
-            shutil.move(temp_path, DB_PATH)
-            await send_and_track_message(update, context, text="✅ *Import Complete*\n\nDatabase has been replaced successfully.\nLibrary data has been updated.")
-            await log_admin_action(user_id, "DB_IMPORT", details=f"File: {doc.file_name}, Size: {doc.file_size}")
-            set_user_state(user_id, CHOOSING)
-            # Auto-backup to GitHub Releases so data survives Railway restarts
-            try:
-                import threading
-                threading.Thread(target=backup_db_to_github, daemon=True).start()
-            except Exception as be:
-                logger.error(f"DB auto-backup failed: {be}")
-        except Exception as e:
-            # Rollback
-            if os.path.exists(backup_path):
-                shutil.move(backup_path, DB_PATH)
-            raise e
+            threading.Thread(target=backup_db_to_github, daemon=True).start()
+        except Exception as be:
+            logger.error(f"DB auto-backup failed: {be}")
 
     except Exception as e:
         logger.error(f"Error importing database: {e}")
         if os.path.exists(temp_path):
             os.remove(temp_path)
-        await send_and_track_message(update, context, text="⚠️ *Import Failed*\n\nFailed to import database. Rollback performed if possible.")
+        await send_and_track_message(update, context, text="⚠️ *Import Failed*\n\nFailed to import database. The current database was left unchanged.")
 
 async def send_analytics_page(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
     """Fetches and displays a specific page of analytics."""
@@ -1884,12 +2005,10 @@ async def send_analytics_page(update: Update, context: ContextTypes.DEFAULT_TYPE
             "ana_overdue": "analytics_overdue"
         }.get(ana_type)
         
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            response = await client.post(f"{API_BASE}/{endpoint}", json={
-                "page": page,
-                "page_size": ANALYTICS_PAGE_SIZE
-            })
-            res_data = response.json()
+        res_data = await api_request("POST", f"/{endpoint}", {
+            "page_size": ANALYTICS_PAGE_SIZE,
+            **page_request(user_id, "analytics", ana_type, page)
+        }, timeout=15.0)
         
         if res_data["status"] != "ok":
             await query.message.edit_text(f"⚠️ *Error*\n\n{res_data.get('message', 'An unknown error occurred.')}")
@@ -1899,6 +2018,7 @@ async def send_analytics_page(update: Update, context: ContextTypes.DEFAULT_TYPE
         items = result_data["items"]
         total_pages = result_data["total_pages"]
         total_count = result_data["total_count"]
+        remember_cursors(user_id, "analytics", ana_type, page, result_data)
 
         if not items:
             msg = "📊 *Analytics Report*\n\nNo data available for this category."